@@ -0,0 +1,151 @@
+"""
+Connection pool shared by the api/*.py handlers.
+
+Vercel keeps a function's module state between warm invocations, so
+connections opened here are reused instead of paying TCP, TLS and auth
+round trips to Neon on every request. Files starting with "_" are not
+deployed as endpoints.
+
+Works with Neon's pgbouncer ("-pooler") endpoint: every checkout ends in
+COMMIT or ROLLBACK and no session state (SET, prepared statements, LISTEN)
+is relied on, which is what transaction pooling requires.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+
+
+class ConnectionPool:
+    """Small LIFO pool with a size cap and a liveness check for idle connections"""
+
+    def __init__(self, dsn, max_size=4, check_after=30.0, timeout=10.0, connect=None):
+        self.dsn = dsn
+        self.max_size = max_size
+        self.check_after = check_after
+        self.timeout = timeout
+        self._connect = connect or psycopg2.connect
+        self._idle = []  # (connection, last_used), most recently used last
+        self._open = 0
+        self._cond = threading.Condition()
+        self.connects = 0
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while not self._idle and self._open >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise psycopg2.OperationalError(f"Connection pool exhausted ({self.max_size} connections)")
+                self._cond.wait(remaining)
+            if self._idle:
+                conn, last_used = self._idle.pop()
+            else:
+                conn, last_used = None, None
+                self._open += 1
+
+        if conn is not None:
+            if self._healthy(conn, last_used):
+                return conn
+            # Replace the dead connection within the same pool slot
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+
+        try:
+            conn = self._connect(
+                self.dsn,
+                connect_timeout=10,
+                keepalives=1,
+                keepalives_idle=30,
+            )
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        self.connects += 1
+        return conn
+
+    def putconn(self, conn, discard=False):
+        if discard or conn.closed:
+            self._close(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for one transaction: commit on success, roll back on error"""
+        conn = self.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception as e:
+            broken = isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)) or conn.closed
+            if not broken:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+            self.putconn(conn, discard=broken)
+            raise
+        else:
+            self.putconn(conn)
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close(conn)
+
+    def _healthy(self, conn, last_used):
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.check_after:
+            return True
+        # Idle long enough for Neon or pgbouncer to have dropped it: ping first
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    os.getenv('NEON_DATABASE_URL'),
+                    max_size=int(os.getenv('DB_POOL_MAX_SIZE', '4')),
+                    check_after=float(os.getenv('DB_POOL_CHECK_AFTER', '30')),
+                )
+    return _pool
+
+
+def connection():
+    """Pooled connection context manager for the module-level pool"""
+    return get_pool().connection()
@@ -1,13 +1,174 @@
 from http.server import BaseHTTPRequestHandler
+import importlib
 import json
 import os
-import requests
-import psycopg2
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from psycopg2.extras import RealDictCursor
 
+# The repo root is needed when this file is run directly as a script
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+from api._db import connection
+
+BACKEND = os.path.join(ROOT, 'backend')
+
+def use_backend():
+    """Make the shared helpers in backend/ importable, behind everything already on sys.path.
+
+    Done on first use rather than at import, so importing this module (tests,
+    tooling) doesn't let backend/ingest.py shadow api/ingest.py.
+    """
+    if BACKEND not in sys.path:
+        sys.path.append(BACKEND)
+
+class _BackendModule:
+    """A backend/ module imported on first attribute access"""
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        use_backend()
+        return getattr(importlib.import_module(self._name), attr)
+
+context = _BackendModule('context')
+http_client = _BackendModule('http_client')
+tracing = _BackendModule('tracing')
+
+# Embedding, DB checkout and lexical search overlap on these threads
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """The pipeline's thread pool, started by the first request that needs it"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=int(os.getenv('CHAT_PIPELINE_THREADS', '8')),
+                                               thread_name_prefix='chat')
+    return _executor
+
+_WORD = re.compile(r'\w+')
+
+# Both can point at a local stand-in such as backend/fake_inference_server.py
+EMBEDDING_API_URL = os.getenv('EMBEDDING_API_URL', 'https://api-inference.huggingface.co/models/BAAI/bge-small-en-v1.5')
+GEMINI_API_BASE = os.getenv('GEMINI_API_BASE', 'https://generativelanguage.googleapis.com/v1beta')
+
+FALLBACK_ANSWER = "I apologize, but I'm having trouble generating a response right now."
+
+# Precomputed query embeddings (backend/embedding_cache.py snapshot), memory-mapped
+EMBEDDING_SNAPSHOT_PATH = os.getenv('EMBEDDING_SNAPSHOT_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'embedding_snapshot.bin'))
+EMBEDDING_MODEL = 'BAAI/bge-small-en-v1.5'
+
+_local_model = None
+_embedding_snapshot = None
+
+def get_embedding_snapshot():
+    """The shipped embedding snapshot, mapped on first use; False if there is none"""
+    global _embedding_snapshot
+    if _embedding_snapshot is None:
+        try:
+            use_backend()
+            from embedding_cache import EmbeddingSnapshot
+            _embedding_snapshot = EmbeddingSnapshot(EMBEDDING_SNAPSHOT_PATH)
+        except FileNotFoundError:
+            _embedding_snapshot = False
+        except Exception as e:
+            # A bad file means no snapshot, not a failed request
+            tracing.log_event('embedding_snapshot_error', path=EMBEDDING_SNAPSHOT_PATH, error=str(e))
+            _embedding_snapshot = False
+    return _embedding_snapshot
+
+def get_local_model():
+    """In-process bge-small model, loaded on first use and kept for warm invocations"""
+    global _local_model
+    if _local_model is None:
+        use_backend()
+        from local_embeddings import LocalEmbeddingModel
+        _local_model = LocalEmbeddingModel(os.getenv('EMBEDDING_MODEL_DIR', 'models/bge-small-en-v1.5'))
+    return _local_model
+
+def timed(timings, stage, fn, *args, **kwargs):
+    """Run one pipeline stage, recording its wall time in ms under timings[stage]"""
+    start = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        tracing.observe(stage, elapsed)
+        timings[stage] = round(elapsed * 1000, 1)
+
+def cosine_similarity(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = (sum(x * x for x in a) * sum(y * y for y in b)) ** 0.5
+    return dot / norm if norm else 0.0
+
+class AnswerCache:
+    """Exact-match (normalized query + filters) answers kept across warm invocations.
+
+    /api/ingest runs in another function instance and can't invalidate this,
+    so entries only live for ANSWER_CACHE_TTL seconds.
+    """
+
+    def __init__(self, max_entries=256, ttl_seconds=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, query, filters):
+        return json.dumps([' '.join(_WORD.findall(query.lower())), filters or {}], sort_keys=True)
+
+    def get(self, query, filters=None):
+        key = self.key(query, filters)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, query, filters, response):
+        key = self.key(query, filters)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+answer_cache = AnswerCache(
+    max_entries=int(os.getenv('ANSWER_CACHE_SIZE', '256')),
+    ttl_seconds=float(os.getenv('ANSWER_CACHE_TTL', '300'))
+) if os.getenv('ANSWER_CACHE', '1') == '1' else None
+
 class handler(BaseHTTPRequestHandler):
     def do_POST(self):
         try:
+            # Read request body
+            content_length = int(self.headers['Content-Length'])
+            post_data = self.rfile.read(content_length)
+            data = json.loads(post_data.decode('utf-8'))
+            
+            query = data.get('query', '').strip()
+            # Optional metadata filters, e.g. {"crop": "sugarcane"}
+            filters = data.get('filters') or {}
+            if not isinstance(filters, dict):
+                filters = {}
+            
+            if query and data.get('stream'):
+                self.stream_response(query, filters)
+                return
+            
             # Set CORS headers
             self.send_response(200)
             self.send_header('Access-Control-Allow-Origin', '*')
@@ -16,36 +177,38 @@ class handler(BaseHTTPRequestHandler):
             self.send_header('Content-Type', 'application/json')
             self.end_headers()
             
-            # Read request body
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode('utf-8'))
-            
-            query = data.get('query', '').strip()
-            
             if not query:
                 self.wfile.write(json.dumps({'error': 'Query is required'}).encode())
                 return
             
-            # Step 1: Generate embedding for query
-            query_embedding = self.get_embedding(query)
-            if not query_embedding:
+            start = time.perf_counter()
+            timings = {}
+            
+            # Steps 1-2: embed the query and search, overlapped (see retrieve)
+            cached, similar_docs = self.retrieve(query, filters, timings)
+            if cached is not None:
+                timings['total'] = round((time.perf_counter() - start) * 1000, 1)
+                tracing.log_event('chat', stream=False, cached=True, **{f'{k}_ms': v for k, v in timings.items()})
+                self.wfile.write(json.dumps({**cached, 'cached': True, 'timings': timings}).encode())
+                return
+            if similar_docs is None:
                 self.wfile.write(json.dumps({'error': 'Failed to generate embedding'}).encode())
                 return
             
-            # Step 2: Search for similar documents
-            similar_docs = self.search_documents(query_embedding)
-            
             # Step 3: Generate response with context
-            ai_response = self.generate_response(query, similar_docs)
+            ai_response = timed(timings, 'generate', self.generate_response, query, similar_docs)
             
             response = {
                 'response': ai_response,
                 'sources': len(similar_docs),
                 'model': 'BAAI/bge-small-en-v1.5'
             }
+            if answer_cache is not None and ai_response != FALLBACK_ANSWER:
+                answer_cache.put(query, filters, response)
             
-            self.wfile.write(json.dumps(response).encode())
+            timings['total'] = round((time.perf_counter() - start) * 1000, 1)
+            tracing.log_event('chat', stream=False, sources=len(similar_docs), **{f'{k}_ms': v for k, v in timings.items()})
+            self.wfile.write(json.dumps({**response, 'timings': timings}).encode())
             
         except Exception as e:
             self.send_response(500)
@@ -53,6 +216,111 @@ class handler(BaseHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(json.dumps({'error': f'Server error: {str(e)}'}).encode())
 
+    def stream_response(self, query, filters=None):
+        """Server-Sent Events: metadata once retrieval is done, then token chunks as Gemini generates, then done"""
+        self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        
+        try:
+            start = time.perf_counter()
+            timings = {}
+            cached, similar_docs = self.retrieve(query, filters, timings)
+            if cached is not None:
+                tracing.log_event('chat', stream=True, cached=True, **{f'{k}_ms': v for k, v in timings.items()})
+                self.send_event('metadata', {'sources': cached['sources'], 'documents': [],
+                                             'model': cached['model'], 'cached': True, 'timings': timings})
+                self.send_event('token', {'text': cached['response']})
+                self.send_event('done', {})
+                return
+            if similar_docs is None:
+                self.send_event('error', {'error': 'Failed to generate embedding'})
+                return
+            
+            self.send_event('metadata', {
+                'sources': len(similar_docs),
+                'documents': [
+                    {'product_name': (doc.get('doc_metadata') or {}).get('product_name', 'Unknown'),
+                     'similarity': doc['similarity']}
+                    for doc in similar_docs
+                ],
+                'model': 'BAAI/bge-small-en-v1.5',
+                'timings': timings
+            })
+            
+            # Leaving the with-block closes the upstream connection, which is
+            # how a client disconnect (BrokenPipeError below) cancels Gemini
+            generate_start = time.perf_counter()
+            answer = []
+            with http_client.post(
+                f'{GEMINI_API_BASE}/models/gemini-1.5-flash:streamGenerateContent?alt=sse&key={os.getenv("GEMINI_API_KEY")}',
+                headers={'Content-Type': 'application/json'},
+                json={'contents': [{'parts': [{'text': self.build_prompt(query, similar_docs)}]}]},
+                stream=True,
+                timeout=30
+            ) as response:
+                if response.status_code != 200:
+                    tracing.log_event('gemini_error', status=response.status_code)
+                    self.send_event('error', {'error': FALLBACK_ANSWER})
+                    return
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith('data:'):
+                        continue
+                    candidates = json.loads(line[5:]).get('candidates') or [{}]
+                    text = ''.join(part.get('text', '') for part in candidates[0].get('content', {}).get('parts', []))
+                    if text:
+                        answer.append(text)
+                        self.send_event('token', {'text': text})
+            
+            if answer_cache is not None and answer:
+                answer_cache.put(query, filters, {'response': ''.join(answer), 'sources': len(similar_docs),
+                                                  'model': 'BAAI/bge-small-en-v1.5'})
+            timings['generate'] = round((time.perf_counter() - generate_start) * 1000, 1)
+            timings['total'] = round((time.perf_counter() - start) * 1000, 1)
+            tracing.log_event('chat', stream=True, sources=len(similar_docs), completion_chars=sum(map(len, answer)),
+                              **{f'{k}_ms': v for k, v in timings.items()})
+            self.send_event('done', {'timings': timings})
+        
+        except (BrokenPipeError, ConnectionResetError):
+            tracing.log_event('client_disconnected', stage='generate')
+        except Exception as e:
+            tracing.log_event('chat_error', stream=True, error=str(e))
+            try:
+                self.send_event('error', {'error': f'Server error: {str(e)}'})
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    def send_event(self, event, data):
+        self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode())
+        self.wfile.flush()
+
+    def retrieve(self, query, filters, timings):
+        """Embed the query and search, overlapping every stage that doesn't need the embedding.
+
+        While the embedding request is in flight a pool thread checks out and
+        warms a DB connection and runs the full-text search, so retrieval
+        takes about max(embed, connect + lexical) + vector search. Returns
+        (cached_response, None) on a cache hit, (None, None) if embedding
+        failed, else (None, docs).
+        """
+        if answer_cache is not None:
+            # In-process and microseconds, so checked before fanning out
+            # rather than spending an embedding call and a connection on hits
+            cached = timed(timings, 'cache_lookup', answer_cache.get, query, filters)
+            if cached is not None:
+                return cached, None
+        executor = get_executor()
+        embedding = executor.submit(timed, timings, 'embed', self.get_embedding, query)
+        docs = executor.submit(self.search_documents, embedding, filters=filters, query=query, timings=timings)
+        if not embedding.result():
+            docs.result()
+            return None, None
+        return None, docs.result()
+
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
@@ -62,14 +330,28 @@ class handler(BaseHTTPRequestHandler):
 
     def get_embedding(self, text):
         """Generate embedding using BAAI/bge-small-en-v1.5 model"""
+        snapshot = get_embedding_snapshot()
+        if snapshot:
+            embedding = snapshot.get(EMBEDDING_MODEL, text)
+            if embedding is not None:
+                tracing.incr('embedding_snapshot_hits')
+                return embedding
+
+        if os.getenv('EMBEDDING_BACKEND') == 'local':
+            try:
+                return get_local_model().embed([text])[0].tolist()
+            except Exception as e:
+                tracing.log_event('embedding_error', backend='local', error=str(e))
+                return None
+
         headers = {
             'Authorization': f'Bearer {os.getenv("HUGGINGFACE_API_TOKEN")}',
             'Content-Type': 'application/json'
         }
         
         try:
-            response = requests.post(
-                'https://api-inference.huggingface.co/models/BAAI/bge-small-en-v1.5',
+            response = http_client.post(
+                EMBEDDING_API_URL,
                 headers=headers,
                 json={'inputs': text},
                 timeout=30
@@ -80,55 +362,104 @@ class handler(BaseHTTPRequestHandler):
                 if isinstance(embedding, list) and len(embedding) == 384:
                     return embedding
                 else:
-                    print(f"Unexpected embedding format: {type(embedding)}")
+                    tracing.log_event('embedding_error', backend='api', error=f'unexpected format {type(embedding).__name__}')
                     return None
             else:
-                print(f"Embedding API error: {response.status_code}")
+                tracing.log_event('embedding_error', backend='api', status=response.status_code)
                 return None
                 
         except Exception as e:
-            print(f"Embedding generation error: {e}")
+            tracing.log_event('embedding_error', backend='api', error=str(e))
             return None
 
-    def search_documents(self, query_embedding, limit=3):
-        """Search for similar documents using cosine similarity"""
+    def search_documents(self, query_embedding, limit=3, filters=None, query=None, timings=None):
+        """Search for similar documents using cosine similarity, optionally only those whose metadata contains filters.
+
+        query_embedding may be a Future: the connection is checked out and, if
+        query is given, the full-text candidates fetched before waiting on it.
+        Full-text hits the approximate vector index missed are scored by exact
+        cosine similarity and merged in.
+        """
+        timings = {} if timings is None else timings
         try:
-            conn = psycopg2.connect(os.getenv('NEON_DATABASE_URL'))
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            
-            # Convert embedding to string format for PostgreSQL
-            embedding_str = '[' + ','.join(map(str, query_embedding)) + ']'
-            
-            query = """
-            SELECT content, doc_metadata, 
-                   1 - (embedding <=> %s::vector) as similarity
-            FROM documents 
-            ORDER BY embedding <=> %s::vector 
-            LIMIT %s
-            """
-            
-            cursor.execute(query, (embedding_str, embedding_str, limit))
-            results = cursor.fetchall()
+            filters_json = json.dumps(filters or {})
+            start = time.perf_counter()
+            with connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                # Per transaction, since the pool may sit behind pgbouncer
+                for setting, env in (('hnsw.ef_search', 'PGVECTOR_EF_SEARCH'), ('ivfflat.probes', 'PGVECTOR_PROBES')):
+                    if os.getenv(env):
+                        cursor.execute(f"SET LOCAL {setting} = %s", (int(os.getenv(env)),))
+                timings['db_connect'] = round((time.perf_counter() - start) * 1000, 1)
+                
+                lexical = []
+                words = ' or '.join(dict.fromkeys(_WORD.findall(query.lower()))) if query else ''
+                if words:
+                    lexical = timed(timings, 'lexical_search', self.lexical_search, cursor, words, filters_json, limit)
+                
+                if isinstance(query_embedding, Future):
+                    query_embedding = query_embedding.result()
+                if not query_embedding:
+                    return []
+                
+                # Convert embedding to string format for PostgreSQL
+                embedding_str = '[' + ','.join(map(str, query_embedding)) + ']'
+                
+                sql = """
+                SELECT id, content, doc_metadata, 
+                       1 - (embedding <=> %s::vector) as similarity
+                FROM documents 
+                WHERE %s::jsonb = '{}' OR doc_metadata @> %s::jsonb
+                ORDER BY embedding <=> %s::vector 
+                LIMIT %s
+                """
+                start = time.perf_counter()
+                cursor.execute(sql, (embedding_str, filters_json, filters_json, embedding_str, limit))
+                results = cursor.fetchall()
+                timings['vector_search'] = round((time.perf_counter() - start) * 1000, 1)
+                cursor.close()
             
-            cursor.close()
-            conn.close()
+            docs = {row['id']: dict(row) for row in results}
+            for row in lexical:
+                if row['id'] not in docs:
+                    docs[row['id']] = {'id': row['id'], 'content': row['content'], 'doc_metadata': row['doc_metadata'],
+                                       'similarity': cosine_similarity(query_embedding, json.loads(row['embedding']))}
+            docs = sorted(docs.values(), key=lambda doc: -doc['similarity'])[:limit]
             
-            return [dict(row) for row in results]
+            # Drop near-duplicate passages and keep the prompt within its token budget
+            keep = context.context_builder.select([doc['content'] for doc in docs], [doc['similarity'] for doc in docs])
+            return [dict(docs[i], content=text) for i, text in keep]
             
         except Exception as e:
-            print(f"Database search error: {e}")
+            tracing.log_event('search_error', error=str(e))
             return []
 
-    def generate_response(self, query, context_docs):
-        """Generate response using Gemini with context"""
-        try:
-            # Prepare context from retrieved documents
-            context = "\n\n".join([
-                f"Document: {doc.get('doc_metadata', {}).get('product_name', 'Unknown')}\nContent: {doc['content']}"
-                for doc in context_docs
-            ])
-            
-            prompt = f"""Based on the following context documents, please answer the user's question. 
+    def lexical_search(self, cursor, words, filters_json, limit):
+        """Full-text candidates (OR of the query's words); needs no embedding, so it runs while that is in flight.
+
+        The match uses the GIN index on to_tsvector('english', content) from
+        setup_database(); websearch_to_tsquery() never fails to parse, so odd
+        input can't abort the transaction the vector search runs in.
+        """
+        cursor.execute("""
+            SELECT id, content, doc_metadata, embedding::text AS embedding
+            FROM documents, websearch_to_tsquery('english', %s) AS q
+            WHERE embedding IS NOT NULL
+              AND to_tsvector('english', content) @@ q
+              AND (%s::jsonb = '{}' OR doc_metadata @> %s::jsonb)
+            ORDER BY ts_rank_cd(to_tsvector('english', content), q) DESC
+            LIMIT %s
+        """, (words, filters_json, filters_json, limit))
+        return cursor.fetchall()
+
+    def build_prompt(self, query, context_docs):
+        # Prepare context from retrieved documents
+        context = "\n\n".join([
+            f"Document: {doc.get('doc_metadata', {}).get('product_name', 'Unknown')}\nContent: {doc['content']}"
+            for doc in context_docs
+        ])
+        
+        return f"""Based on the following context documents, please answer the user's question. 
 If the answer is not in the context, say so politely.
 
 Context:
@@ -138,9 +469,14 @@ Question: {query}
 
 Answer:"""
 
+    def generate_response(self, query, context_docs):
+        """Generate response using Gemini with context"""
+        try:
+            prompt = self.build_prompt(query, context_docs)
+
             # Call Gemini API
-            response = requests.post(
-                f'https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={os.getenv("GEMINI_API_KEY")}',
+            response = http_client.post(
+                f'{GEMINI_API_BASE}/models/gemini-1.5-flash:generateContent?key={os.getenv("GEMINI_API_KEY")}',
                 headers={'Content-Type': 'application/json'},
                 json={
                     'contents': [{
@@ -155,11 +491,11 @@ Answer:"""
                 if 'candidates' in result and len(result['candidates']) > 0:
                     return result['candidates'][0]['content']['parts'][0]['text']
                 else:
-                    return "I apologize, but I'm having trouble generating a response right now."
+                    return FALLBACK_ANSWER
             else:
-                print(f"Gemini API error: {response.status_code}")
-                return "I apologize, but I'm having trouble generating a response right now."
+                tracing.log_event('gemini_error', status=response.status_code)
+                return FALLBACK_ANSWER
                 
         except Exception as e:
-            print(f"Gemini error: {e}")
-            return "I apologize, but I'm having trouble generating a response right now."
+            tracing.log_event('gemini_error', error=str(e))
+            return FALLBACK_ANSWER
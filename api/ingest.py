@@ -1,9 +1,21 @@
 import os
-import requests
-import psycopg2
+import sys
 import json
 from typing import List, Dict
 
+# Shared helpers live in backend/ (same approach as test_system.py); the repo
+# root is needed too when this file is run directly as a script
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'backend'))
+from api._db import connection
+from bulk_ingest import bulk_ingest
+from manage_index import ensure_vector_index
+from shared_state import bump_corpus_version
+import http_client
+import tracing
+
 def get_embedding(text):
     """Generate embedding using BAAI/bge-small-en-v1.5 model"""
     headers = {
@@ -12,7 +24,7 @@ def get_embedding(text):
     }
     
     try:
-        response = requests.post(
+        response = http_client.post(
             'https://api-inference.huggingface.co/models/BAAI/bge-small-en-v1.5',
             headers=headers,
             json={'inputs': text},
@@ -24,45 +36,64 @@ def get_embedding(text):
             embedding = result[0] if isinstance(result[0], list) else result
             return embedding[:384]  # Ensure 384 dimensions
         else:
-            print(f"Embedding API error: {response.status_code}: {response.text}")
+            tracing.log_event('embedding_error', status=response.status_code, body=response.text[:200])
             return None
             
     except Exception as e:
-        print(f"Embedding error: {e}")
+        tracing.log_event('embedding_error', error=str(e))
         return None
 
+def get_embeddings(texts: List[str]) -> List[List[float]]:
+    """Generate embeddings for a batch of texts with one API request"""
+    response = http_client.post(
+        'https://api-inference.huggingface.co/models/BAAI/bge-small-en-v1.5',
+        headers={
+            'Authorization': f'Bearer {os.getenv("HUGGINGFACE_API_TOKEN")}',
+            'Content-Type': 'application/json'
+        },
+        json={'inputs': texts},
+        timeout=60
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"Embedding API error: {response.status_code}: {response.text}")
+    return [(item[0] if isinstance(item[0], list) else item)[:384] for item in response.json()]
+
 def setup_database():
     """Initialize database with required tables and extensions"""
     try:
-        db_url = os.getenv('NEON_DATABASE_URL')
-        
-        conn = psycopg2.connect(db_url)
-        cursor = conn.cursor()
-        
-        # Enable vector extension
-        cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
-        
-        # Create documents table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS documents (
-                id SERIAL PRIMARY KEY,
-                content TEXT NOT NULL,
-                embedding vector(384),
-                doc_metadata JSONB,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        
-        # Create index for vector similarity search
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS documents_embedding_idx 
-            ON documents USING ivfflat (embedding vector_cosine_ops)
-            WITH (lists = 100);
-        """)
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with connection() as conn:
+            cursor = conn.cursor()
+            
+            # Enable vector extension
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+            
+            # Create documents table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    id SERIAL PRIMARY KEY,
+                    content TEXT NOT NULL,
+                    embedding vector(384),
+                    doc_metadata JSONB,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+            """)
+            
+            # The vector index is built after loading (ensure_vector_index),
+            # sized to the rows that exist
+            
+            # Metadata filters in /api/chat use JSONB containment (@>)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS documents_metadata_idx
+                ON documents USING GIN (doc_metadata jsonb_path_ops);
+            """)
+            
+            # Full-text candidates in /api/chat; the expression must match the query's
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS documents_content_fts_idx
+                ON documents USING GIN (to_tsvector('english', content));
+            """)
+            
+            cursor.close()
         
         print("✅ Database setup complete!")
         return True
@@ -74,17 +105,12 @@ def setup_database():
 def clear_database():
     """Clear all documents from database"""
     try:
-        db_url = os.getenv('NEON_DATABASE_URL')
-        
-        conn = psycopg2.connect(db_url)
-        cursor = conn.cursor()
-        
-        cursor.execute("DELETE FROM documents;")
-        cursor.execute("ALTER SEQUENCE documents_id_seq RESTART WITH 1;")
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM documents;")
+            cursor.execute("ALTER SEQUENCE documents_id_seq RESTART WITH 1;")
+            cursor.close()
+        bump_corpus_version()
         
         print("✅ Database cleared!")
         return True
@@ -102,20 +128,15 @@ def ingest_document(content: str, metadata: Dict = None):
             print(f"❌ Failed to generate embedding for: {content[:50]}...")
             return False
         
-        # Store in database
-        db_url = os.getenv('NEON_DATABASE_URL')
-        
-        conn = psycopg2.connect(db_url)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO documents (content, embedding, doc_metadata)
-            VALUES (%s, %s, %s)
-        """, (content, embedding, json.dumps(metadata or {})))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        # Store in database, reusing the pooled connection across documents
+        with connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO documents (content, embedding, doc_metadata)
+                VALUES (%s, %s, %s)
+            """, (content, embedding, json.dumps(metadata or {})))
+            cursor.close()
+        bump_corpus_version()
         
         print(f"✅ Added: {content[:50]}...")
         return True
@@ -164,10 +185,18 @@ def ingest_navyakosh_data():
     
     print("🚀 Starting Navyakosh data ingestion...")
     
+    # One batched embedding request and one COPY in a single transaction
     success_count = 0
-    for doc in documents:
-        if ingest_document(doc["content"], doc["metadata"]):
-            success_count += 1
+    try:
+        with tracing.request_trace('ingest', documents=len(documents)):
+            with connection() as conn:
+                with tracing.span('bulk_ingest'):
+                    success_count = bulk_ingest(conn, documents, get_embeddings)["documents"]
+                bump_corpus_version()
+                with tracing.span('vector_index'):
+                    ensure_vector_index(conn)
+    except Exception as e:
+        print(f"❌ Bulk ingest error: {e}")
     
     print(f"\n📊 Ingestion Summary:")
     print(f"✅ Successfully added: {success_count}/{len(documents)} documents")
@@ -0,0 +1,147 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from shared_state import bump_corpus_version, current_corpus_version  # noqa: F401 (re-exported)
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+
+
+def normalize_query(query: str) -> str:
+    """Case, punctuation and spacing don't change the answer"""
+    return " ".join(_NON_WORD.sub(" ", query.lower()).split())
+
+
+class AnswerCache:
+    """LRU + TTL cache of final RAG answers.
+
+    Looked up first by normalized query text, then by cosine similarity of
+    the query embedding against every cached query (one matmul over a
+    preallocated matrix), so paraphrases above `similarity_threshold` hit.
+    Entries only match within their `scope` (e.g. the metadata filters the
+    answer was retrieved with).
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600.0,
+                 similarity_threshold: float = 0.95, dim: int = 384):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[str, Tuple[int, str, List[Dict[str, Any]]]]" = OrderedDict()
+        self._keys: List[Optional[str]] = [None] * max_entries
+        self._matrix = np.zeros((max_entries, dim), dtype=np.float32)
+        self._versions = np.full(max_entries, -1, dtype=np.int64)
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._scopes = np.zeros(max_entries, dtype=np.int64)
+        self._scope_ids: Dict[str, int] = {"": 0}
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def get(self, query: str, embedding: Optional[Sequence[float]] = None, scope: str = ""
+            ) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+        """Return (answer, sources) for a cached equivalent query, or None"""
+        key = self._key(query, scope)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._exact(key, now)
+            if cached is not None:
+                return cached
+
+            if embedding is not None and self._entries:
+                q = np.asarray(embedding, dtype=np.float32)
+                q = q / max(float(np.linalg.norm(q)), 1e-12)
+                scores = self._matrix @ q
+                live = ((self._versions == current_corpus_version()) & (self._expires > now)
+                        & (self._scopes == self._scope_ids.get(scope, -1)))
+                scores[~live] = -np.inf
+                slot = int(np.argmax(scores))
+                if scores[slot] >= self.similarity_threshold:
+                    match = self._keys[slot]
+                    self._entries.move_to_end(match)
+                    self.semantic_hits += 1
+                    _, answer, sources = self._entries[match]
+                    return answer, sources
+
+            self.misses += 1
+            return None
+
+    def get_exact(self, query: str, scope: str = "") -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+        """Normalized-text match only; a miss isn't counted, so get() can follow with an embedding"""
+        with self._lock:
+            return self._exact(self._key(query, scope), time.monotonic())
+
+    def put(self, query: str, embedding: Optional[Sequence[float]], answer: str,
+            sources: Optional[List[Dict[str, Any]]] = None, version: Optional[int] = None,
+            scope: str = ""):
+        """Store an answer computed against corpus `version` (default: the current one)"""
+        key = self._key(query, scope)
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+            while not self._free:
+                self._evict(next(iter(self._entries)))  # Least recently used
+            slot = self._free.pop()
+            self._keys[slot] = key
+            self._versions[slot] = current_corpus_version() if version is None else version
+            self._expires[slot] = time.monotonic() + self.ttl
+            self._scopes[slot] = self._scope_ids.setdefault(scope, len(self._scope_ids))
+            if embedding is not None:
+                vector = np.asarray(embedding, dtype=np.float32)
+                self._matrix[slot] = vector / max(float(np.linalg.norm(vector)), 1e-12)
+            else:
+                self._matrix[slot] = 0.0  # Exact lookups only
+            self._entries[key] = (slot, answer, sources or [])
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._evict(key)
+
+    def stats(self) -> Dict[str, int]:
+        return {"exact_hits": self.exact_hits, "semantic_hits": self.semantic_hits,
+                "misses": self.misses, "entries": len(self._entries)}
+
+    def _key(self, query: str, scope: str) -> str:
+        return f"{scope}\x00{normalize_query(query)}" if scope else normalize_query(query)
+
+    def _exact(self, key: str, now: float) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if not self._live(entry[0], now):
+            self._evict(key)
+            return None
+        self._entries.move_to_end(key)
+        self.exact_hits += 1
+        return entry[1], entry[2]
+
+    def _live(self, slot: int, now: float) -> bool:
+        return self._versions[slot] == current_corpus_version() and self._expires[slot] > now
+
+    def _evict(self, key: str):
+        slot = self._entries.pop(key)[0]
+        self._keys[slot] = None
+        self._versions[slot] = -1
+        self._matrix[slot] = 0.0
+        self._free.append(slot)
+
+
+def answer_cache_from_env() -> Optional[AnswerCache]:
+    if os.getenv("ANSWER_CACHE", "1") != "1":
+        return None
+    return AnswerCache(
+        max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "1000")),
+        ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+        similarity_threshold=float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+    )
+
+
+answer_cache = answer_cache_from_env()
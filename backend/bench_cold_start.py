@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Cold-start report for the Vercel handlers: how long a fresh interpreter
+takes to import api/chat.py (everything a cold instance runs before it can
+serve the first request), which packages that time goes to, and what the
+memory-mapped embedding snapshot costs to open and query.
+
+    python bench_cold_start.py
+    python bench_cold_start.py --module api.ingest --runs 30 --output cold.json
+    python bench_cold_start.py --compare cold.json
+
+Import times come from `python -X importtime` in a new process per run, so
+nothing is already in sys.modules. Interpreter startup and `site` are
+reported apart; on Vercel the runtime has paid those (and http.server)
+before it imports the handler. bench_suite.py records the same numbers
+with every run.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+from typing import Any, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(stderr: str, module: str) -> Tuple[float, Dict[str, float]]:
+    """(cumulative ms of module, self ms per top-level package it pulled in)"""
+    entries = []  # (depth, name, self_us, cumulative_us) in completion order
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        head, cumulative_us, name = line.split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2  # "| " then two spaces per level
+        entries.append((depth, name.strip(), int(head.rsplit(":", 1)[1]), int(cumulative_us)))
+
+    for end, (depth, name, _, cumulative_us) in enumerate(entries):
+        if name == module and depth == 0:
+            break
+    else:
+        raise ValueError(f"{module} not found in -X importtime output")
+
+    packages: Dict[str, float] = {}
+    start = end
+    while start > 0 and entries[start - 1][0] > 0:
+        start -= 1
+    for _, name, self_us, _ in entries[start:end + 1]:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0.0) + self_us / 1000
+    return cumulative_us / 1000, packages
+
+
+def import_once(module: str) -> Tuple[float, float, Dict[str, float]]:
+    """(process wall ms, module import ms, per-package ms) in a fresh interpreter"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    import_ms, packages = parse_importtime(result.stderr, module)
+    return wall_ms, import_ms, packages
+
+
+def bench_snapshot(entries: int = 20_000, dim: int = 384, lookups: int = 1000) -> Dict[str, Any]:
+    """Open and query a synthetic snapshot; opening is a header read whatever the size"""
+    from embedding_cache import EmbeddingSnapshot, cache_key, write_snapshot
+
+    model = "BAAI/bge-small-en-v1.5"
+    texts = [f"query {i}" for i in range(entries)]
+    vector = array("f", [random.random() for _ in range(dim)]).tobytes()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "snapshot.bin")
+        write_snapshot(path, model, {cache_key(model, text)[1]: vector for text in texts})
+        start = time.perf_counter()
+        snapshot = EmbeddingSnapshot(path)
+        open_ms = (time.perf_counter() - start) * 1000
+        sample = random.Random(0).sample(texts, lookups)
+        start = time.perf_counter()
+        found = sum(snapshot.get(model, text) is not None for text in sample)
+        lookup_us = (time.perf_counter() - start) / lookups * 1e6
+        size_mb = os.path.getsize(path) / 1e6
+        del snapshot
+    return {"entries": entries, "size_mb": round(size_mb, 1), "open_ms": round(open_ms, 3),
+            "lookup_us": round(lookup_us, 1), "found": found == lookups}
+
+
+def measure_cold_start(module: str = "api.chat", runs: int = 10) -> Dict[str, Any]:
+    walls: List[float] = []
+    imports: List[float] = []
+    breakdowns: List[Dict[str, float]] = []
+    for _ in range(runs):
+        wall_ms, import_ms, packages = import_once(module)
+        walls.append(wall_ms)
+        imports.append(import_ms)
+        breakdowns.append(packages)
+    median_run = breakdowns[imports.index(sorted(imports)[len(imports) // 2])]
+    return {
+        "module": module,
+        "runs": runs,
+        "import_p50_ms": round(statistics.median(imports), 1),
+        "import_min_ms": round(min(imports), 1),
+        "process_p50_ms": round(statistics.median(walls), 1),
+        "packages_ms": {name: round(ms, 1) for name, ms in sorted(median_run.items(), key=lambda item: -item[1])},
+        "snapshot": bench_snapshot(),
+    }
+
+
+def print_report(report: Dict[str, Any], top: int = 12):
+    print(f"   import {report['module']}: p50 {report['import_p50_ms']:.1f} ms, min {report['import_min_ms']:.1f} ms "
+          f"({report['runs']} fresh interpreters; whole process p50 {report['process_p50_ms']:.0f} ms)")
+    for name, ms in list(report["packages_ms"].items())[:top]:
+        print(f"     {name:<24} {ms:>7.1f} ms")
+    snapshot = report["snapshot"]
+    print(f"   embedding snapshot ({snapshot['entries']} entries, {snapshot['size_mb']} MB): "
+          f"open {snapshot['open_ms']:.2f} ms, lookup {snapshot['lookup_us']:.1f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time profile of a Vercel handler")
+    parser.add_argument("--module", default="api.chat")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--output", help="Save the report as JSON")
+    parser.add_argument("--compare", help="Earlier report to diff against")
+    args = parser.parse_args()
+
+    print(f"🧊 COLD START: {args.module}")
+    print("=" * 60)
+    report = measure_cold_start(args.module, args.runs)
+    print_report(report)
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        change = (report["import_p50_ms"] - previous["import_p50_ms"]) / previous["import_p50_ms"]
+        print(f"\n📊 import p50 {previous['import_p50_ms']:.1f} -> {report['import_p50_ms']:.1f} ms ({change:+.1%})")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Report saved to {args.output}")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Benchmark metadata-filtered vector search against Postgres.
+
+    python bench_filtered_search.py [num_docs]
+
+Loads num_docs (default 1,000,000) synthetic chunks into a scratch schema
+with the same table, HNSW index and metadata indexes the app uses, then
+times the queries search.py issues with no filter, a broad filter (crop,
+~5% of rows) and a narrow one (product_name, ~0.05%). For each it reports
+latency, shared buffers touched, and recall against an exact scan of the
+same slice. Needs DATABASE_URL (or NEON_DATABASE_URL); the schema is
+dropped afterwards.
+"""
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from sqlalchemy import create_engine, text
+from sqlalchemy.dialects import postgresql
+
+from bulk_ingest import bulk_ingest
+from db import MIGRATIONS, Base, check_pgvector_version, iterative_scan_mode
+from search import vector_statement
+
+SCHEMA = "bench_filtered"
+NUM_QUERIES = 50
+TOP_K = 5
+CROPS = [f"crop-{i}" for i in range(20)]
+PRODUCTS = [f"product-{i}" for i in range(2000)]
+SCENARIOS = [
+    ("no filter", None),
+    ("crop (1/20)", lambda rng: {"crop": CROPS[rng.integers(len(CROPS))]}),
+    ("product_name (1/2000)", lambda rng: {"product_name": PRODUCTS[rng.integers(len(PRODUCTS))]}),
+]
+
+rng = np.random.default_rng(0)
+centers = rng.standard_normal((100, 384)).astype(np.float32)
+
+
+def synthetic_embeddings(texts):
+    return centers[rng.integers(0, 100, len(texts))] + rng.standard_normal((len(texts), 384)).astype(np.float32)
+
+
+def synthetic_documents(count):
+    for i in range(count):
+        yield {
+            "content": f"Synthetic chunk {i}",
+            "metadata": {"crop": CROPS[i % len(CROPS)], "product_name": PRODUCTS[i % len(PRODUCTS)],
+                         "type": ("dosage", "timing", "storage", "safety", "product_info")[i % 5]}
+        }
+
+
+def _percentiles(timings):
+    timings = sorted(timings)
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+
+
+def _sql(statement):
+    """Inline the parameters so the timing covers exactly what Postgres plans and runs"""
+    return str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def load(engine, count):
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        Base.metadata.create_all(conn.execution_options(schema_translate_map={None: SCHEMA}))
+
+    raw = engine.raw_connection()
+    try:
+        stats = bulk_ingest(raw, synthetic_documents(count), synthetic_embeddings,
+                            batch_size=2000, commit_every=100000, embed_workers=1)
+    finally:
+        raw.close()
+    print(f"   Loaded {stats['documents']} rows in {stats['seconds']} s")
+
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        for statement in MIGRATIONS:
+            conn.execute(text(statement))
+        conn.execute(text("CREATE INDEX ON documents USING hnsw (embedding vector_cosine_ops)"))
+        conn.execute(text("ANALYZE documents"))
+        check_pgvector_version(conn)
+    print(f"   Built indexes in {time.perf_counter() - start:.0f} s")
+
+
+def run_scenario(engine, name, make_filters):
+    query_rng = np.random.default_rng(1)
+    queries = synthetic_embeddings([""] * NUM_QUERIES)
+    timings, recalls, buffers = [], [], []
+    with engine.connect() as conn:
+        for query in queries:
+            filters = make_filters(query_rng) if make_filters else None
+            sql = _sql(vector_statement(query.tolist(), TOP_K, filters))
+            with conn.begin():
+                if filters and iterative_scan_mode():
+                    conn.execute(text("SELECT set_config('hnsw.iterative_scan', :mode, true)"),
+                                 {"mode": iterative_scan_mode()})
+                start = time.perf_counter()
+                found = [row[0] for row in conn.exec_driver_sql(sql)]
+                timings.append((time.perf_counter() - start) * 1000)
+
+                plan = conn.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}").scalar()
+                plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+                buffers.append(plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0))
+
+                # Exact answer for the same slice: no index scans, only the metadata bitmap or a full scan
+                conn.execute(text("SET LOCAL enable_indexscan = off"))
+                exact = [row[0] for row in conn.exec_driver_sql(sql)]
+            recalls.append(len(set(found) & set(exact)) / max(len(exact), 1))
+
+    p50, p95 = _percentiles(timings)
+    print(f"   {name:<24} p50 {p50:7.2f} ms  p95 {p95:7.2f} ms  "
+          f"buffers {int(np.median(buffers)):>7}  recall@{TOP_K} {np.mean(recalls):.3f}")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    database_url = os.getenv("DATABASE_URL", os.getenv("NEON_DATABASE_URL"))
+    if not database_url:
+        sys.exit("❌ Set DATABASE_URL or NEON_DATABASE_URL")
+
+    print(f"🏁 FILTERED SEARCH BENCHMARK ({count} docs, {NUM_QUERIES} queries per filter, top {TOP_K})")
+    print("=" * 60)
+    engine = create_engine(database_url, connect_args={"options": f"-c search_path={SCHEMA},public"})
+    try:
+        load(engine, count)
+        for name, make_filters in SCENARIOS:
+            run_scenario(engine, name, make_filters)
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        engine.dispose()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the hashing-trick fallback embedder.
+
+Measures chunks/second on one core against the previous per-element
+SHA-256 fallback and checks that similar texts actually score higher.
+
+    python bench_hash_embeddings.py [num_chunks]
+"""
+import hashlib
+import random
+import sys
+import time
+
+from hash_embeddings import HashingEmbedder
+
+WORDS = ("navyakosh fertilizer sugarcane organic apply acre planting ratoon harvest soil nutrients "
+         "npk nitrogen phosphorus potassium storage moisture compost yield root irrigation kg "
+         "season field crop cane sugar micronutrients broadcast furrow microbial").split()
+
+
+def legacy_hash_embedding(text):
+    """The old fallback: one SHA-256 digest repeated over 384 floats"""
+    hash_ints = [b for b in hashlib.sha256(text.encode()).digest()]
+    embedding = []
+    for i in range(384):
+        embedding.append((hash_ints[i % len(hash_ints)] - 128) / 128.0)
+    return embedding
+
+
+def make_chunks(count, words_per_chunk=25):
+    rng = random.Random(0)
+    return [" ".join(rng.choice(WORDS) for _ in range(words_per_chunk)) + f" ({i})." for i in range(count)]
+
+
+def bench_throughput(count):
+    chunks = make_chunks(count)
+    embedder = HashingEmbedder()
+    embedder.embed(chunks[:100])  # Warm up
+
+    vectorized = 0.0
+    for _ in range(3):  # Best of three: the first pass also pays for page faults
+        start = time.perf_counter()
+        embedder.embed(chunks)
+        vectorized = max(vectorized, count / (time.perf_counter() - start))
+
+    sample = chunks[:min(count, 20000)]
+    start = time.perf_counter()
+    for chunk in sample:
+        legacy_hash_embedding(chunk)
+    legacy = len(sample) / (time.perf_counter() - start)
+
+    avg_chars = sum(len(c) for c in chunks) / count
+    print(f"📏 {count} chunks, {avg_chars:.0f} chars on average")
+    print(f"   Vectorized hashing embedder: {vectorized:,.0f} chunks/s ({vectorized / legacy:.1f}x)")
+    print(f"   Legacy SHA-256 fallback:     {legacy:,.0f} chunks/s")
+    return vectorized
+
+
+def check_similarity():
+    """Lexically related texts must be closer than unrelated ones"""
+    embedder = HashingEmbedder()
+    query, related, unrelated = embedder.embed([
+        "How to apply Navyakosh?",
+        "Navyakosh application method for sugarcane",
+        "Storage instructions: keep in a cool dry place",
+    ])
+    close, far = float(query @ related), float(query @ unrelated)
+    ok = close > far
+    print(f"{'✅' if ok else '❌'} Similarity: related {close:.2f} vs unrelated {far:.2f}")
+    return ok
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    print("🏁 HASH EMBEDDING BENCHMARK")
+    print("=" * 40)
+    rate = bench_throughput(count)
+    ok = check_similarity() and rate >= 10000
+    print("\n🎉 Benchmark passed!" if ok else "\n⚠️ Benchmark below target (10,000 chunks/s).")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark the latency reranking adds per query, and the prompt tokens it saves.
+
+    python bench_rerank.py [num_queries]
+
+Reranks RERANK_CANDIDATES synthetic ~150-token chunks per query, one query
+at a time and as one batched call. The cross-encoder runs too when
+RERANKER_MODEL_DIR points at an exported model.
+"""
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+
+from chunking import count_tokens
+from rerank import RERANK_CANDIDATES, BM25Reranker, CrossEncoderReranker
+
+Doc = namedtuple("Doc", "content")
+
+SENTENCES = [
+    "Navyakosh is a specialized organic fertilizer designed for sugarcane cultivation.",
+    "Apply 25-30 kg per acre during planting season and 20-25 kg for ratoon crops.",
+    "Balanced NPK nutrients along with micronutrients improve soil structure.",
+    "Store in a cool, dry place away from direct sunlight and use within two years.",
+    "It is compatible with vermicompost, neem cake and beneficial microorganisms.",
+    "Apply during land preparation 15-20 days before planting for best results.",
+]
+QUERIES = ["How much Navyakosh per acre for ratoon?", "What nutrients does it contain?",
+           "How should I store the fertilizer?", "When should I apply it?"]
+TOP_K = 3
+TOKEN_BUDGET = 600
+
+
+def make_candidates(rng):
+    candidates = []
+    for _ in range(RERANK_CANDIDATES):
+        text = ""
+        while count_tokens(text) < 150:
+            text += " " + rng.choice(SENTENCES)
+        candidates.append((Doc(text.strip()), rng.uniform(0.3, 0.8)))
+    return sorted(candidates, key=lambda c: -c[1])
+
+
+def bench(name, reranker, queries, candidate_lists):
+    start = time.perf_counter()
+    for query, candidates in zip(queries, candidate_lists):
+        kept = reranker.rerank(query, candidates)
+    single_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    start = time.perf_counter()
+    reranker.rerank_batch(queries, candidate_lists)
+    batched_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    tokens = sum(count_tokens(doc.content) for doc, _ in kept)
+    print(f"   {name:<14} {single_ms:7.2f} ms/query  batched {batched_ms:7.2f} ms/query  "
+          f"context {len(kept)} chunks, {tokens} tokens")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rng = random.Random(0)
+    queries = [rng.choice(QUERIES) for _ in range(count)]
+    candidate_lists = [make_candidates(rng) for _ in range(count)]
+
+    print(f"🏁 RERANK BENCHMARK ({count} queries, {RERANK_CANDIDATES} candidates, top {TOP_K}, {TOKEN_BUDGET} tokens)")
+    print("=" * 60)
+    baseline = sum(count_tokens(doc.content) for doc, _ in candidate_lists[-1][:5])
+    print(f"   {'no reranker':<14} {0:7.2f} ms/query  {'':>24}context 5 chunks, {baseline} tokens")
+    bench("bm25", BM25Reranker(top_k=TOP_K, token_budget=TOKEN_BUDGET), queries, candidate_lists)
+
+    model_dir = os.getenv("RERANKER_MODEL_DIR")
+    if model_dir and os.path.isdir(model_dir):
+        reranker = CrossEncoderReranker(model_dir, top_k=TOP_K, token_budget=TOKEN_BUDGET)
+        reranker.rerank(queries[0], candidate_lists[0])  # Load the model outside the timing
+        bench("cross-encoder", reranker, queries, candidate_lists)
+    else:
+        print("   cross-encoder: skipped (set RERANKER_MODEL_DIR to an exported model)")
@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for the RAG pipeline. Results are written as JSON
+(bench_results/<time>-<commit>.json) so runs can be compared across commits.
+
+    python bench_suite.py
+    python bench_suite.py --sizes 1000,100000 --levels 1,8,32 --llm-latency-ms 300
+    python bench_suite.py --compare bench_results/<earlier run>.json
+
+Nothing leaves the machine. fake_inference_server.py stands in for the
+embedding API and Gemini, with configurable latency. Vectors live in the
+in-memory VectorStore, or in pgvector in a scratch schema (dropped afterwards)
+when DATABASE_URL is set. Stages:
+
+  ingest     docs/s through batched embedding requests and store writes
+  retrieval  top-5 search latency at each --sizes corpus size (synthetic vectors)
+  chat       end-to-end latency p50/p95/p99 and throughput at each --levels
+             concurrency: embed, search, context, prompt, generate, with
+             per-stage percentiles from tracing.py
+  cold start import time of api/chat.py in fresh interpreters, with a
+             per-package breakdown (bench_cold_start.py)
+
+--url measures POST /chat on a running server instead of the in-process
+pipeline (start it against the same fake server; see load_test.py).
+--compare exits 1 when a metric regressed by more than --threshold.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from bench_cold_start import measure_cold_start, print_report
+from fake_inference_server import start_fake_server
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_results")
+SCHEMA = "bench_suite"
+TOP_K = 5
+NUM_QUERIES = 50
+BLOCK = 100000  # Synthetic vectors are generated and loaded in blocks to cap memory
+
+FACTS = [
+    "Navyakosh is an organic fertilizer for {crop} that improves soil structure and organic matter.",
+    "Apply {n} kg of Navyakosh per acre for {crop} during land preparation.",
+    "For ratoon {crop}, apply {n} kg per acre within 30 days after harvest.",
+    "Store the {crop} fertilizer bags in a cool, dry place and use within {n} months.",
+    "Navyakosh for {crop} contains balanced NPK with micronutrients such as zinc and boron.",
+]
+CROPS = ["sugarcane", "wheat", "paddy", "cotton", "maize", "soybean", "potato", "onion"]
+
+
+def percentiles(timings: List[float]) -> Dict[str, float]:
+    timings = sorted(timings)
+    if not timings:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "mean_ms": 0.0}
+    pick = lambda q: timings[min(int(len(timings) * q), len(timings) - 1)]
+    return {"p50_ms": round(pick(0.50), 2), "p95_ms": round(pick(0.95), 2), "p99_ms": round(pick(0.99), 2),
+            "mean_ms": round(sum(timings) / len(timings), 2)}
+
+
+def documents(count: int):
+    for i in range(count):
+        crop = CROPS[i % len(CROPS)]
+        yield {"content": FACTS[i % len(FACTS)].format(crop=crop, n=10 + i % 40) + f" (ref {i})",
+               "metadata": {"crop": crop, "type": "faq"}}
+
+
+def synthetic_vectors(rng, centers, count):
+    return centers[rng.integers(0, len(centers), count)] + rng.standard_normal((count, centers.shape[1])).astype(np.float32)
+
+
+class MemoryStore:
+    """The in-process VectorStore behind SEARCH_BACKEND=numpy"""
+    name = "memory"
+
+    def __init__(self):
+        from vector_store import VectorStore
+
+        self.store = VectorStore(dtype=os.getenv("VECTOR_STORE_DTYPE", "float32"))
+        self.texts: Dict[str, str] = {}
+
+    def __len__(self):
+        return len(self.store)
+
+    def ingest(self, docs, embed) -> int:
+        from bulk_ingest import batched, embed_batches
+
+        for batch, embeddings in embed_batches(batched(docs, 64), embed):
+            ids = [str(len(self.store) + i) for i in range(len(batch))]
+            self.store.add_batch(ids, np.asarray(embeddings, dtype=np.float32))
+            self.texts.update(zip(ids, (doc["content"] for doc in batch)))
+        return len(self.store)
+
+    def add_vectors(self, vectors):
+        start = len(self.store)
+        self.store.add_batch([str(start + i) for i in range(len(vectors))], vectors)
+
+    def search(self, embedding, k: int = TOP_K) -> List[Tuple[str, float]]:
+        return [(self.texts.get(doc_id, f"Synthetic chunk {doc_id}"), score)
+                for doc_id, score in self.store.search(embedding, k)]
+
+    async def asearch(self, embedding, k: int = TOP_K):
+        return self.search(embedding, k)  # Milliseconds of numpy, same as search.py
+
+    def finish_loading(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class PgvectorStore:
+    """api/'s documents schema in a scratch schema, with the HNSW index the app builds"""
+    name = "pgvector"
+
+    def __init__(self, database_url: str):
+        import psycopg2
+        from psycopg2.pool import ThreadedConnectionPool
+
+        options = f"-c search_path={SCHEMA},public"
+        conn = psycopg2.connect(database_url, options=options)
+        conn.autocommit = True
+        cursor = conn.cursor()
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+        cursor.execute("""
+            CREATE TABLE documents (
+                id SERIAL PRIMARY KEY,
+                content TEXT NOT NULL,
+                embedding vector(384),
+                doc_metadata JSONB,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.close()
+        conn.autocommit = False
+        self.conn = conn
+        self.rows = 0
+        self.pool = ThreadedConnectionPool(1, 32, database_url, options=options)
+
+    def __len__(self):
+        return self.rows
+
+    def ingest(self, docs, embed) -> int:
+        from bulk_ingest import bulk_ingest
+
+        self.rows += bulk_ingest(self.conn, docs, embed, batch_size=64)["documents"]
+        self.finish_loading()
+        return self.rows
+
+    def add_vectors(self, vectors):
+        from bulk_ingest import bulk_ingest
+
+        start = self.rows
+        docs = ({"content": f"Synthetic chunk {start + i}"} for i in range(len(vectors)))
+        offset = [0]
+
+        def embed(texts):
+            batch = vectors[offset[0]:offset[0] + len(texts)]
+            offset[0] += len(texts)
+            return batch
+
+        self.rows += bulk_ingest(self.conn, docs, embed, batch_size=2000, commit_every=BLOCK, embed_workers=1)["documents"]
+
+    def finish_loading(self):
+        from manage_index import build_index
+
+        build_index(self.conn, "hnsw")
+        self.conn.autocommit = False
+
+    def search(self, embedding, k: int = TOP_K):
+        literal = "[" + ",".join(f"{float(v):.6f}" for v in embedding) + "]"
+        conn = self.pool.getconn()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT content, 1 - (embedding <=> %s::vector) FROM documents "
+                           "ORDER BY embedding <=> %s::vector LIMIT %s", (literal, literal, k))
+            rows = cursor.fetchall()
+            cursor.close()
+            conn.commit()
+            return rows
+        finally:
+            self.pool.putconn(conn)
+
+    async def asearch(self, embedding, k: int = TOP_K):
+        return await asyncio.to_thread(self.search, embedding, k)
+
+    def close(self):
+        self.pool.closeall()
+        self.conn.rollback()
+        self.conn.autocommit = True
+        cursor = self.conn.cursor()
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cursor.close()
+        self.conn.close()
+
+
+def open_store(database_url: Optional[str]):
+    return PgvectorStore(database_url) if database_url else MemoryStore()
+
+
+def bench_ingest(store, count: int) -> Dict[str, Any]:
+    from embeddings import generator
+
+    start = time.perf_counter()
+    store.ingest(documents(count), generator.get_embeddings)
+    elapsed = time.perf_counter() - start
+    result = {"documents": count, "seconds": round(elapsed, 2), "docs_per_second": round(count / elapsed, 1)}
+    print(f"   ingest      {count} docs in {elapsed:.2f} s ({result['docs_per_second']} docs/s)")
+    return result
+
+
+def bench_retrieval(database_url: Optional[str], sizes: List[int]) -> List[Dict[str, Any]]:
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((100, 384)).astype(np.float32)
+    queries = synthetic_vectors(np.random.default_rng(1), centers, NUM_QUERIES)
+    store = open_store(database_url)
+    results = []
+    try:
+        for size in sorted(sizes):
+            start = time.perf_counter()
+            while len(store) < size:
+                store.add_vectors(synthetic_vectors(rng, centers, min(BLOCK, size - len(store))))
+            store.finish_loading()
+            load_seconds = time.perf_counter() - start
+
+            store.search(queries[0])  # Warm caches outside the timing
+            timings = []
+            for query in queries:
+                start = time.perf_counter()
+                store.search(query)
+                timings.append((time.perf_counter() - start) * 1000)
+            result = {"documents": size, "load_seconds": round(load_seconds, 2), **percentiles(timings)}
+            print(f"   retrieval   {size:>8} docs  p50 {result['p50_ms']:7.2f} ms  p95 {result['p95_ms']:7.2f} ms  "
+                  f"p99 {result['p99_ms']:7.2f} ms")
+            results.append(result)
+    finally:
+        store.close()
+    return results
+
+
+async def chat_once(store, query: str) -> str:
+    """The /chat pipeline of chat.get_rag_response, with the store in place of the documents table"""
+    from context import context_builder
+    from embeddings import async_embedder
+    from llm import generate
+    from tracing import span
+
+    embedding = await async_embedder.aget_embedding(query)
+    with span("search"):
+        hits = await store.asearch(embedding)
+    hits = [(text, score) for text, score in hits if score > 0.3]
+    with span("context"):
+        keep = context_builder.select([text for text, _ in hits], [score for _, score in hits])
+    with span("prompt"):
+        context = "\n\n---\n\n".join(f"Document (relevance: {hits[i][1]:.2f}):\n{text}" for i, text in keep)
+        prompt = f"Context documents:\n{context}\n\nUser question: {query}\n\nAnswer:"
+    with span("generate"):
+        return await generate(prompt)
+
+
+async def run_chat_level(store, concurrency: int, total: int) -> Dict[str, Any]:
+    from load_test import QUERIES
+
+    timings: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            # Distinct queries, across levels too, so the embedding cache doesn't hide the pipeline
+            query = f"{QUERIES[i % len(QUERIES)]} (c{concurrency} request {i})"
+            start = time.perf_counter()
+            try:
+                await chat_once(store, query)
+                timings.append((time.perf_counter() - start) * 1000)
+            except Exception:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {"concurrency": concurrency, "requests": total, "throughput": round(len(timings) / elapsed, 2),
+            "errors": errors, **percentiles(timings)}
+
+
+async def bench_chat(store, levels: List[int], requests_per_level: int, url: Optional[str]) -> List[Dict[str, Any]]:
+    import tracing
+
+    results = []
+    client = None
+    if url:
+        import httpx
+        from load_test import run_level
+
+        client = httpx.AsyncClient(limits=httpx.Limits(max_connections=max(levels)), timeout=60.0)
+    try:
+        for concurrency in levels:
+            total = max(requests_per_level, concurrency * 4)
+            tracing.reset()
+            if client is not None:
+                result = await run_level(client, url, concurrency, total)
+                result = {"concurrency": concurrency, "requests": total, "throughput": round(result["throughput"], 2),
+                          "errors": result["errors"], **percentiles(result["timings"])}
+            else:
+                result = await run_chat_level(store, concurrency, total)
+                result["stages"] = {stage: {key: round(value, 2) for key, value in stats.items()}
+                                    for stage, stats in tracing.summary().items()}
+            print(f"   chat        conc {concurrency:>3}  {result['throughput']:7.1f} req/s  p50 {result['p50_ms']:7.1f} ms  "
+                  f"p95 {result['p95_ms']:7.1f} ms  p99 {result['p99_ms']:7.1f} ms  errors {result['errors']}")
+            results.append(result)
+    finally:
+        if client is not None:
+            await client.aclose()
+    return results
+
+
+def git_commit() -> Tuple[Optional[str], bool]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+
+
+def metrics(results: Dict[str, Any]) -> Dict[str, Tuple[float, bool]]:
+    """Flatten a run into {name: (value, higher_is_better)}"""
+    flat = {}
+    if results.get("ingest"):
+        flat["ingest docs/s"] = (results["ingest"]["docs_per_second"], True)
+    for row in results.get("retrieval", []):
+        flat[f"retrieval {row['documents']} p95 ms"] = (row["p95_ms"], False)
+    for row in results.get("chat", []):
+        flat[f"chat c{row['concurrency']} p95 ms"] = (row["p95_ms"], False)
+        flat[f"chat c{row['concurrency']} p99 ms"] = (row["p99_ms"], False)
+        flat[f"chat c{row['concurrency']} req/s"] = (row["throughput"], True)
+    if results.get("cold_start"):
+        flat["cold start import p50 ms"] = (results["cold_start"]["import_p50_ms"], False)
+    return flat
+
+
+def compare(previous: Dict[str, Any], current: Dict[str, Any], threshold: float) -> int:
+    """Print metric changes; returns how many got worse by more than threshold"""
+    before, after = metrics(previous), metrics(current)
+    print(f"\n📊 Compared with {previous.get('commit') or 'previous run'} ({previous.get('timestamp', '?')})")
+    regressions = 0
+    for name, (value, higher_is_better) in after.items():
+        if name not in before or not before[name][0]:
+            continue
+        change = (value - before[name][0]) / before[name][0]
+        worse = -change if higher_is_better else change
+        flag = "⚠️ " if worse > threshold else "  "
+        regressions += worse > threshold
+        print(f"   {flag}{name:<28} {before[name][0]:>10.2f} -> {value:>10.2f}  ({change:+.1%})")
+    return regressions
+
+
+async def main(args) -> Dict[str, Any]:
+    database_url = os.getenv("DATABASE_URL")
+    levels = [int(level) for level in args.levels.split(",")]
+    results: Dict[str, Any] = {}
+
+    store = open_store(database_url)
+    try:
+        results["ingest"] = bench_ingest(store, args.ingest_docs)
+        results["chat"] = await bench_chat(store, levels, args.requests, args.url)
+    finally:
+        store.close()
+    del store
+    results["retrieval"] = bench_retrieval(database_url, [int(size) for size in args.sizes.split(",")])
+    if args.cold_start_runs:
+        results["cold_start"] = measure_cold_start("api.chat", args.cold_start_runs)
+        print_report(results["cold_start"], top=5)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline RAG pipeline benchmarks, saved as JSON")
+    parser.add_argument("--sizes", default="1000,100000,1000000", help="Corpus sizes for retrieval latency")
+    parser.add_argument("--ingest-docs", type=int, default=2000)
+    parser.add_argument("--levels", default="1,8,32", help="Chat concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="Minimum chat requests per level")
+    parser.add_argument("--embed-latency-ms", type=float, default=20.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=150.0)
+    parser.add_argument("--url", help="Benchmark POST /chat on this server instead of in-process")
+    parser.add_argument("--cold-start-runs", type=int, default=10, help="Fresh interpreters timing api/chat.py imports (0 to skip)")
+    parser.add_argument("--output", help="Result file (default bench_results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="Earlier result file to diff against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    server, fake_url = start_fake_server(latency_ms=args.embed_latency_ms, llm_latency_ms=args.llm_latency_ms)
+    # Read by embeddings.py and llm.py at import, so set before they load
+    os.environ["EMBEDDING_API_URL"] = fake_url
+    os.environ["GEMINI_API_BASE"] = fake_url
+    os.environ.setdefault("GEMINI_API_KEY", "offline")
+    os.environ.setdefault("EMBEDDING_CACHE_PATH", ":memory:")
+
+    commit, dirty = git_commit()
+    print(f"🏁 RAG BENCHMARK SUITE ({'pgvector' if os.getenv('DATABASE_URL') else 'memory'} store, commit {commit or '?'}"
+          f"{' + local changes' if dirty else ''})")
+    print("=" * 60)
+    try:
+        results = asyncio.run(main(args))
+    finally:
+        server.shutdown()
+
+    results = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "dirty": dirty,
+        "store": "pgvector" if os.getenv("DATABASE_URL") else "memory",
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "threshold")},
+        **results,
+    }
+    path = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results saved to {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        if regressions:
+            print(f"\n⚠️ {regressions} metric(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark the exact NumPy VectorStore against the pgvector query path on
+the same synthetic corpus.
+
+    python bench_vector_store.py [num_docs]
+
+The pgvector part runs only when DATABASE_URL (or NEON_DATABASE_URL) is
+set; it loads the corpus into a temporary table and drops it afterwards.
+"""
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+from vector_store import VectorStore
+
+NUM_QUERIES = 50
+TOP_K = 5
+
+
+def make_corpus(count, dim=384):
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((100, dim)).astype(np.float32)
+    corpus = centers[rng.integers(0, 100, count)] + rng.standard_normal((count, dim)).astype(np.float32)
+    queries = centers[rng.integers(0, 100, NUM_QUERIES)] + rng.standard_normal((NUM_QUERIES, dim)).astype(np.float32)
+    return corpus, queries
+
+
+def _percentiles(timings):
+    timings = sorted(timings)
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+
+
+def bench_numpy(corpus, queries, exact):
+    ids = [str(i) for i in range(len(corpus))]
+    for dtype in ("float32", "float16", "int8"):
+        store = VectorStore(dtype=dtype)
+        store.add_batch(ids, corpus)
+
+        timings = []
+        hits = []
+        for query in queries:
+            start = time.perf_counter()
+            hits.append(store.search(query, TOP_K))
+            timings.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        store.search_batch(queries, TOP_K)
+        batch_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        recall = np.mean([len({int(d) for d, _ in h} & set(e.tolist())) / TOP_K for h, e in zip(hits, exact)])
+        p50, p95 = _percentiles(timings)
+        print(f"   numpy {dtype:<8} {store.nbytes / 2**20:7.1f} MB  p50 {p50:6.2f} ms  p95 {p95:6.2f} ms  "
+              f"batched {batch_ms:6.2f} ms/query  recall@{TOP_K} {recall:.3f}")
+
+
+def bench_pgvector(corpus, queries):
+    database_url = os.getenv("DATABASE_URL", os.getenv("NEON_DATABASE_URL"))
+    if not database_url:
+        print("   pgvector: skipped (set DATABASE_URL to compare against Postgres)")
+        return
+
+    import psycopg2
+
+    conn = psycopg2.connect(database_url)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        cursor.execute("CREATE TEMP TABLE bench_vectors (id INTEGER, embedding vector(384))")
+        buffer = io.StringIO()
+        for i, row in enumerate(corpus):
+            buffer.write(f"{i}\t[{','.join(f'{v:.6f}' for v in row)}]\n")
+        buffer.seek(0)
+        cursor.copy_expert("COPY bench_vectors (id, embedding) FROM STDIN", buffer)
+
+        timings = []
+        for query in queries:
+            literal = "[" + ",".join(f"{v:.6f}" for v in query) + "]"
+            start = time.perf_counter()
+            cursor.execute(
+                "SELECT id, 1 - (embedding <=> %s::vector) FROM bench_vectors ORDER BY embedding <=> %s::vector LIMIT %s",
+                (literal, literal, TOP_K)
+            )
+            cursor.fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+
+        p50, p95 = _percentiles(timings)
+        print(f"   pgvector (round trip + exact scan)      p50 {p50:6.2f} ms  p95 {p95:6.2f} ms")
+    finally:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print(f"🏁 VECTOR STORE BENCHMARK ({count} docs, {NUM_QUERIES} queries, top {TOP_K})")
+    print("=" * 60)
+    corpus, queries = make_corpus(count)
+    unit = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    exact = np.argsort(-(queries @ unit.T), axis=1)[:, :TOP_K]
+    bench_numpy(corpus, queries, exact)
+    bench_pgvector(corpus, queries)
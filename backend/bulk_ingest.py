@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Bulk document ingestion: stream JSONL/CSV, embed in batches, write with COPY.
+
+    python bulk_ingest.py chunks.jsonl
+    python bulk_ingest.py products.csv --content-column description --method values
+
+JSONL lines are {"content": ..., "metadata": {...}} (any other keys become
+metadata); CSV rows use --content-column and the remaining columns become
+metadata. Embedding runs on a thread pool while the previous batch is being
+written, and rows are committed every --commit-every documents.
+
+Works on both documents schemas in this repo: the backend's (UUID id,
+generated here) and api/'s (SERIAL id). Only psycopg2 is used so api/ and
+root scripts can import it too.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import struct
+import sys
+import time
+import uuid
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+Embedder = Callable[[List[str]], List[List[float]]]
+
+_COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+_COPY_TRAILER = struct.pack(">h", -1)
+_PG_EPOCH = datetime(2000, 1, 1)
+
+
+def iter_documents(f: TextIO, fmt: str = "jsonl", content_column: str = "content") -> Iterator[Dict[str, Any]]:
+    """Yield {"content", "metadata"} dicts from a JSONL or CSV stream without loading it all"""
+    if fmt == "csv":
+        rows = csv.DictReader(f)
+    else:
+        rows = (json.loads(line) for line in f if line.strip())
+
+    for row in rows:
+        content = (row.pop(content_column, None) or "").strip()
+        if not content:
+            continue
+        metadata = row.pop("metadata", None)
+        if not isinstance(metadata, dict):
+            metadata = {key: value for key, value in row.items() if value not in (None, "")}
+        yield {"content": content, "metadata": metadata}
+
+
+def detect_format(filename: str) -> str:
+    return "csv" if filename.lower().endswith(".csv") else "jsonl"
+
+
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def embed_batches(batches: Iterable[List[Dict[str, Any]]], embed: Embedder,
+                  workers: int = 4) -> Iterator[Tuple[List[Dict[str, Any]], List[List[float]]]]:
+    """Embed batches on a thread pool, in input order, with a bounded number in flight"""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append((batch, pool.submit(embed, [doc["content"] for doc in batch])))
+            if len(pending) >= 2 * workers:
+                batch, future = pending.popleft()
+                yield batch, future.result()
+        while pending:
+            batch, future = pending.popleft()
+            yield batch, future.result()
+
+
+def table_columns(cursor, table: str = "documents") -> Dict[str, str]:
+    cursor.execute(
+        "SELECT column_name, data_type FROM information_schema.columns "
+        "WHERE table_name = %s AND table_schema = current_schema()",
+        (table,)
+    )
+    return dict(cursor.fetchall())
+
+
+def insert_columns(types: Dict[str, str]) -> List[str]:
+    columns = ["content", "embedding", "doc_metadata"]
+    if types.get("id") == "uuid":
+        columns.insert(0, "id")  # The backend model has no server-side default
+    columns.extend(column for column in ("created_at", "updated_at") if column in types)
+    return columns
+
+
+def _vector_bytes(vector: Sequence[float]) -> bytes:
+    """Big-endian float32s; stdlib only, since api/ingest.py uses this without numpy"""
+    values = array("f", vector)
+    if sys.byteorder == "little":
+        values.byteswap()
+    return values.tobytes()
+
+
+def encode_copy(columns: List[str], types: Dict[str, str], rows: List[Dict[str, Any]],
+                embeddings: Sequence[Sequence[float]]) -> bytes:
+    """Rows in PostgreSQL's binary COPY format; vectors use pgvector's binary layout"""
+    jsonb = types.get("doc_metadata") == "jsonb"
+    field_count = struct.pack(">h", len(columns))
+
+    out = io.BytesIO()
+    out.write(_COPY_HEADER)
+    for row, vector in zip(rows, embeddings):
+        out.write(field_count)
+        for column in columns:
+            if column == "id":
+                value = row["id"].bytes
+            elif column == "content":
+                value = row["content"].encode("utf-8")
+            elif column == "embedding":
+                value = struct.pack(">HH", len(vector), 0) + _vector_bytes(vector)
+            elif column == "doc_metadata":
+                value = json.dumps(row["metadata"]).encode("utf-8")
+                if jsonb:
+                    value = b"\x01" + value  # jsonb binary format version
+            else:
+                value = struct.pack(">q", row["timestamp"])
+            out.write(struct.pack(">i", len(value)))
+            out.write(value)
+    out.write(_COPY_TRAILER)
+    return out.getvalue()
+
+
+def copy_rows(cursor, columns: List[str], types: Dict[str, str], rows: List[Dict[str, Any]], embeddings):
+    data = encode_copy(columns, types, rows, embeddings)
+    cursor.copy_expert(f"COPY documents ({', '.join(columns)}) FROM STDIN WITH (FORMAT binary)", io.BytesIO(data))
+
+
+def insert_rows(cursor, columns: List[str], types: Dict[str, str], rows: List[Dict[str, Any]], embeddings):
+    """Multi-row INSERT fallback for connections where COPY isn't available"""
+    from psycopg2.extras import execute_values
+
+    values = []
+    for row, embedding in zip(rows, embeddings):
+        record = []
+        for column in columns:
+            if column == "id":
+                record.append(str(row["id"]))
+            elif column == "content":
+                record.append(row["content"])
+            elif column == "embedding":
+                record.append("[" + ",".join(map(str, embedding)) + "]")
+            elif column == "doc_metadata":
+                record.append(json.dumps(row["metadata"]))
+            else:
+                record.append(row["created"])
+        values.append(record)
+    template = "(" + ", ".join("%s::vector" if column == "embedding" else "%s" for column in columns) + ")"
+    execute_values(cursor, f"INSERT INTO documents ({', '.join(columns)}) VALUES %s",
+                   values, template=template, page_size=1000)
+
+
+def bulk_ingest(conn, documents: Iterable[Dict[str, Any]], embed: Embedder, batch_size: int = 256,
+                commit_every: int = 10000, method: str = "copy", embed_workers: int = 4,
+                on_commit: Optional[Callable[[List[str], List[List[float]]], None]] = None) -> Dict[str, float]:
+    """Embed and write documents in large transactions; on_commit receives the new (ids, embeddings)"""
+    write = copy_rows if method == "copy" else insert_rows
+    cursor = conn.cursor()
+    types = table_columns(cursor)
+    columns = insert_columns(types)
+
+    inserted = 0
+    uncommitted_ids: List[str] = []
+    uncommitted_embeddings: List[List[float]] = []
+    start = time.perf_counter()
+
+    def commit():
+        conn.commit()
+        if on_commit is not None and uncommitted_ids:
+            on_commit(list(uncommitted_ids), list(uncommitted_embeddings))
+        uncommitted_ids.clear()
+        uncommitted_embeddings.clear()
+
+    try:
+        uncommitted = 0
+        for batch, embeddings in embed_batches(batched(documents, batch_size), embed, embed_workers):
+            created = datetime.utcnow()
+            timestamp = int((created - _PG_EPOCH).total_seconds() * 1_000_000)
+            rows = [
+                {"id": uuid.uuid4(), "content": doc["content"], "metadata": doc.get("metadata") or {},
+                 "created": created, "timestamp": timestamp}
+                for doc in batch
+            ]
+            write(cursor, columns, types, rows, embeddings)
+            inserted += len(rows)
+            uncommitted += len(rows)
+            if "id" in columns:
+                uncommitted_ids.extend(str(row["id"]) for row in rows)
+                uncommitted_embeddings.extend(embeddings)
+            if uncommitted >= commit_every:
+                commit()
+                uncommitted = 0
+                print(f"   {inserted} documents, {inserted / (time.perf_counter() - start):.0f} docs/s")
+        commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    elapsed = time.perf_counter() - start
+    return {"documents": inserted, "seconds": round(elapsed, 2),
+            "docs_per_second": round(inserted / elapsed, 1) if elapsed else 0.0}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-load documents from JSONL or CSV")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="Defaults to the file extension")
+    parser.add_argument("--content-column", default="content")
+    parser.add_argument("--batch-size", type=int, default=256, help="Texts per embedding request")
+    parser.add_argument("--commit-every", type=int, default=10000)
+    parser.add_argument("--method", choices=["copy", "values"], default="copy")
+    parser.add_argument("--embed-workers", type=int, default=4, help="Embedding requests in flight")
+    args = parser.parse_args()
+
+    import psycopg2
+    from answer_cache import bump_corpus_version
+    from embeddings import generator
+
+    database_url = os.getenv("DATABASE_URL", os.getenv("NEON_DATABASE_URL"))
+    if not database_url:
+        sys.exit("❌ Set DATABASE_URL or NEON_DATABASE_URL")
+
+    print(f"📥 BULK INGEST {args.path} ({args.method}, batches of {args.batch_size})")
+    print("=" * 60)
+    conn = psycopg2.connect(database_url)
+    try:
+        with open(args.path, newline="", encoding="utf-8") as f:
+            documents = iter_documents(f, args.format or detect_format(args.path), args.content_column)
+            stats = bulk_ingest(conn, documents, generator.get_embeddings, args.batch_size,
+                                args.commit_every, args.method, args.embed_workers)
+    finally:
+        conn.close()
+        bump_corpus_version()  # Also after a failure: earlier batches may have been committed
+    print(f"✅ Ingested {stats['documents']} documents in {stats['seconds']} s ({stats['docs_per_second']} docs/s)")
@@ -1,8 +1,17 @@
 import os
-import google.generativeai as genai
-import asyncio
-from sqlalchemy.orm import Session
-from search import search_similar_documents
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from db import AsyncSessionLocal, Document
+from search import Filters, asearch_similar_documents
+from embeddings import async_embedder
+from answer_cache import answer_cache, current_corpus_version
+from rerank import RERANK_CANDIDATES, reranker
+from context import context_builder
+from chunking import count_tokens
+from tracing import incr, observe, span
+from llm import generate, stream_generate
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,10 +20,6 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if not GEMINI_API_KEY:
     raise ValueError("GEMINI_API_KEY environment variable not set")
 
-# Configure Gemini API
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel('models/gemini-1.5-flash-latest')
-
 
 def is_meaningful_query(query: str) -> bool:
     """Check if the query is meaningful and complete enough to process"""
@@ -36,23 +41,45 @@ def is_meaningful_query(query: str) -> bool:
     
     return has_question_structure or len(words) >= 2
 
-async def get_rag_response(query: str, db: Session) -> str:
+async def retrieve_context(query: str, db: AsyncSession,
+                           query_embedding: Optional[List[float]] = None,
+                           filters: Optional[Filters] = None) -> Tuple[Optional[str], List[Tuple[Document, float]]]:
+    """Return (canned reply, []) when the model shouldn't be asked, else (None, relevant documents)"""
     # Validate query first
     if not is_meaningful_query(query):
-        return "Please ask a complete and clear question. Your query seems too short or incomplete."
+        return "Please ask a complete and clear question. Your query seems too short or incomplete.", []
     
-    # Search for similar documents using vector search
-    similar_docs = search_similar_documents(query, db, top_k=5)
+    # Search for similar documents using vector search. Every step awaits,
+    # so concurrent chats overlap and share batched embedding requests.
+    # With a reranker, over-fetch and let it pick the best few
+    top_k = RERANK_CANDIDATES if reranker is not None else 5
+    similar_docs = await asearch_similar_documents(query, db, top_k, query_embedding=query_embedding, filters=filters)
     
     if not similar_docs:
-        return "I don't have any documents in my knowledge base. Please upload some documents first."
+        return "I don't have any documents in my knowledge base. Please upload some documents first.", []
     
     # Filter documents by similarity threshold (only include if similarity > 0.3)
     relevant_docs = [(doc, score) for doc, score in similar_docs if score > 0.3]
     
     if not relevant_docs:
-        return "I don't have information about that topic in my knowledge base."
+        return "I don't have information about that topic in my knowledge base.", []
+    
+    if reranker is not None:
+        with span("rerank"):
+            relevant_docs = await reranker.arerank(query, relevant_docs)
     
+    # Near-duplicates out, best first, within the prompt token budget
+    with span("context"):
+        return None, context_builder.build(relevant_docs)
+
+def traced_prompt(query: str, relevant_docs: List[Tuple[Document, float]]) -> str:
+    """build_prompt() with its time and token count recorded"""
+    with span("prompt"):
+        prompt = build_prompt(query, relevant_docs)
+    incr("prompt_tokens", count_tokens(prompt))
+    return prompt
+
+def build_prompt(query: str, relevant_docs: List[Tuple[Document, float]]) -> str:
     # Build context from relevant documents only
     context_parts = []
     for doc, score in relevant_docs:
@@ -61,7 +88,7 @@ async def get_rag_response(query: str, db: Session) -> str:
     context = "\n\n---\n\n".join(context_parts)
     
     # Create a strict prompt for Gemini
-    prompt = f"""
+    return f"""
     You are an AI assistant that answers questions based ONLY on the provided context documents.
     
     Context documents:
@@ -79,10 +106,106 @@ async def get_rag_response(query: str, db: Session) -> str:
     
     Answer:
     """
-    
+
+def source_list(relevant_docs: List[Tuple[Document, float]]) -> List[Dict[str, Any]]:
+    return [
+        {"id": str(doc.id), "score": round(score, 4), "metadata": doc.doc_metadata or {}}
+        for doc, score in relevant_docs
+    ]
+
+def cache_scope(filters: Optional[Filters]) -> str:
+    """Answers retrieved under different metadata filters are cached separately"""
+    return json.dumps(filters, sort_keys=True) if filters else ""
+
+async def _cache_lookup(query: str, scope: str = "") -> Tuple[Optional[Tuple[str, List[Dict[str, Any]]]], Optional[List[float]]]:
+    """Check the answer cache by text, then by embedding; the embedding is returned for reuse by search.
+
+    The query is only embedded if the text lookup misses, and not at all
+    without a cache (search embeds it then).
+    """
+    if answer_cache is None or not is_meaningful_query(query):
+        return None, None
+    cached = answer_cache.get_exact(query, scope)
+    if cached is not None:
+        incr("answer_cache_hits")
+        return cached, None
+    query_embedding = await async_embedder.aget_embedding(query)
+    cached = answer_cache.get(query, query_embedding, scope)
+    incr("answer_cache_hits" if cached is not None else "answer_cache_misses")
+    return cached, query_embedding
+
+async def get_rag_response(query: str, db: AsyncSession, filters: Optional[Filters] = None) -> str:
+    version = current_corpus_version()
+    scope = cache_scope(filters)
+    cached, query_embedding = await _cache_lookup(query, scope)
+    if cached is not None:
+        return cached[0]
+    
+    reply, relevant_docs = await retrieve_context(query, db, query_embedding, filters)
+    if reply is not None:
+        return reply
+    
+    prompt = traced_prompt(query, relevant_docs)
     try:
-        response = await asyncio.to_thread(model.generate_content, prompt)
-        return response.text.strip()
+        with span("generate"):
+            response = await generate(prompt)
     except Exception as e:
         error_message = f"Error generating response: {str(e)}"
-        return error_message
\ No newline at end of file
+        return error_message
+    
+    answer = response.strip()
+    incr("completion_tokens", count_tokens(answer))
+    if answer_cache is not None:
+        answer_cache.put(query, query_embedding, answer, source_list(relevant_docs), version, scope)
+    return answer
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_rag_response(query: str, filters: Optional[Filters] = None) -> AsyncIterator[str]:
+    """Server-Sent Events: "metadata" with the retrieved sources, "token" per answer chunk, then "done".
+
+    The session is opened here and closed before generation starts, so a
+    long answer doesn't hold a database connection. If the client
+    disconnects, the generator is cancelled and leaving stream_generate()
+    closes the upstream Gemini request.
+    """
+    version = current_corpus_version()
+    scope = cache_scope(filters)
+    cached, query_embedding = await _cache_lookup(query, scope)
+    if cached is not None:
+        answer, sources = cached
+        yield sse_event("metadata", {"sources": sources, "cached": True})
+        yield sse_event("token", {"text": answer})
+        yield sse_event("done", {})
+        return
+    
+    async with AsyncSessionLocal() as db:
+        reply, relevant_docs = await retrieve_context(query, db, query_embedding, filters)
+    
+    sources = source_list(relevant_docs)
+    yield sse_event("metadata", {"sources": sources})
+    
+    if reply is not None:
+        yield sse_event("token", {"text": reply})
+    else:
+        parts = []
+        prompt = traced_prompt(query, relevant_docs)
+        start = time.perf_counter()
+        try:
+            async for text in stream_generate(prompt):
+                if not parts:
+                    observe("first_token", time.perf_counter() - start)
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+        except Exception as e:
+            parts = None
+            yield sse_event("error", {"error": f"Error generating response: {str(e)}"})
+        observe("generate", time.perf_counter() - start)
+        if parts:
+            incr("completion_tokens", count_tokens("".join(parts)))
+        # Only complete answers are cached; a disconnect cancels before this point
+        if parts is not None and answer_cache is not None:
+            answer_cache.put(query, query_embedding, "".join(parts).strip(), sources, version, scope)
+    
+    yield sse_event("done", {})
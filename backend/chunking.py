@@ -0,0 +1,135 @@
+import os
+import re
+from typing import Iterable, Iterator, List, Tuple
+
+_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+_WORD_SPAN = re.compile(r"\S+")
+_MAX_TAIL = 65536  # Longest run of text without a sentence boundary kept in memory
+
+
+def count_tokens(text: str) -> int:
+    """Estimate of the model's WordPiece token count: words, punctuation, and extra pieces for long words"""
+    return sum(1 + len(token) // 8 for token in _TOKEN.findall(text))
+
+
+def iter_pieces(text: str, size: int = 65536) -> Iterator[str]:
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+def iter_sentences(pieces: Iterable[str]) -> Iterator[str]:
+    """Split streamed text at sentence and paragraph boundaries, buffering only the unfinished tail"""
+    tail = ""
+    for piece in pieces:
+        buffer = tail + piece
+        start = 0
+        for match in _BOUNDARY.finditer(buffer):
+            sentence = buffer[start:match.start()].strip()
+            if sentence:
+                yield sentence
+            start = match.end()
+        tail = buffer[start:]
+        if len(tail) > _MAX_TAIL:
+            # No boundary for a long stretch (tables, code, logs): cut at a space
+            cut = tail.rfind(" ", 0, _MAX_TAIL)
+            cut = cut if cut > 0 else _MAX_TAIL
+            yield tail[:cut].strip()
+            tail = tail[cut:]
+    if tail.strip():
+        yield tail.strip()
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Leading sentences of text within max_tokens, or leading words if the first sentence alone is over"""
+    kept, size = [], 0
+    for sentence in iter_sentences(iter_pieces(text)):
+        tokens = count_tokens(sentence)
+        if size + tokens > max_tokens:
+            if not kept:
+                kept.append(_leading_words(sentence, max_tokens))
+            break
+        kept.append(sentence)
+        size += tokens
+    return " ".join(kept)
+
+
+def _leading_words(sentence: str, max_tokens: int) -> str:
+    end, size = 0, 0
+    for word in _WORD_SPAN.finditer(sentence):
+        size += count_tokens(word.group())
+        if size > max_tokens:
+            break
+        end = word.end()
+    # A string never has more tokens than characters
+    return sentence[:end] if end else sentence[:max(max_tokens, 0)]
+
+
+class Chunker:
+    """Packs sentences into chunks of at most max_tokens, repeating up to
+    overlap_tokens of trailing sentences at the start of the next chunk.
+    Sentences longer than a chunk are split at word boundaries.
+    """
+
+    def __init__(self, max_tokens: int = 256, overlap_tokens: int = 32):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def chunks(self, pieces: Iterable[str]) -> Iterator[str]:
+        window: List[Tuple[str, int]] = []
+        size = 0
+        fresh = False  # Whether the window holds anything beyond the carried-over overlap
+        for sentence in iter_sentences(pieces):
+            for part, tokens in self._fit(sentence):
+                if size + tokens > self.max_tokens:
+                    if fresh:
+                        yield " ".join(text for text, _ in window)
+                        window = self._overlap(window)
+                        size = sum(n for _, n in window)
+                        fresh = False
+                    while window and size + tokens > self.max_tokens:
+                        size -= window.pop(0)[1]
+                window.append((part, tokens))
+                size += tokens
+                fresh = True
+        if fresh:
+            yield " ".join(text for text, _ in window)
+
+    def _fit(self, sentence: str) -> Iterator[Tuple[str, int]]:
+        tokens = count_tokens(sentence)
+        if tokens <= self.max_tokens:
+            yield sentence, tokens
+            return
+        words, size = [], 0
+        for word in self._words(sentence):
+            n = count_tokens(word)
+            if words and size + n > self.max_tokens:
+                yield " ".join(words), size
+                words, size = [], 0
+            words.append(word)
+            size += n
+        if words:
+            yield " ".join(words), size
+
+    def _words(self, sentence: str) -> Iterator[str]:
+        step = max(self.max_tokens // 2, 1)  # Characters; even all-punctuation stays within max_tokens
+        for word in sentence.split():
+            for start in range(0, len(word), step):
+                yield word[start:start + step]
+
+    def _overlap(self, window: List[Tuple[str, int]]) -> List[Tuple[str, int]]:
+        carried, size = [], 0
+        for text, tokens in reversed(window):
+            if size + tokens > self.overlap_tokens:
+                break
+            carried.insert(0, (text, tokens))
+            size += tokens
+        return carried
+
+
+chunker = Chunker(
+    max_tokens=int(os.getenv("CHUNK_MAX_TOKENS", "256")),
+    overlap_tokens=int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+)
@@ -0,0 +1,138 @@
+"""
+Prompt context assembly: best passages first, near-duplicates dropped, and
+the total kept within CONTEXT_TOKEN_BUDGET (chunking.count_tokens estimate).
+
+Pure Python unless embeddings are passed, so the Vercel api/ handlers can
+use it without numpy.
+"""
+import os
+import re
+from typing import Any, Callable, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+from chunking import count_tokens, truncate_to_tokens
+
+_WORD = re.compile(r"\w+")
+
+
+def shingles(text: str, size: int = 3) -> FrozenSet[int]:
+    """Hashed word n-grams; passages sharing most of them are near-duplicates"""
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return frozenset([hash(tuple(words))]) if words else frozenset()
+    return frozenset(hash(tuple(words[i:i + size])) for i in range(len(words) - size + 1))
+
+
+def jaccard(a: FrozenSet[int], b: FrozenSet[int]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class Excerpt:
+    """A passage cut down to fit a token budget; other attributes come from the original"""
+
+    def __init__(self, passage: Any, content: str):
+        self._passage = passage
+        self.content = content
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._passage, name)
+
+
+def select_within_budget(texts: Sequence[str], order: Iterable[int], token_budget: int,
+                         limit: Optional[int] = None,
+                         accept: Optional[Callable[[int], bool]] = None) -> List[Tuple[int, str]]:
+    """(index, text) of the passages from `order` that fit in token_budget together.
+
+    accept(i) is only asked about passages that fit, and True keeps the
+    passage. A first passage that is alone over the budget is cut to its
+    leading sentences instead of overflowing it; every other text is
+    returned whole.
+    """
+    kept: List[Tuple[int, str]] = []
+    used = 0
+    for i in order:
+        text = texts[i]
+        tokens = count_tokens(text)
+        if used + tokens > token_budget:
+            if kept:
+                continue
+            text = truncate_to_tokens(text, token_budget)
+            tokens = count_tokens(text)
+            if not text:
+                continue
+        if accept is not None and not accept(i):
+            continue
+        kept.append((i, text))
+        used += tokens
+        if len(kept) == limit:
+            break
+    return kept
+
+
+class ContextBuilder:
+    """Picks which retrieved passages go into the prompt.
+
+    Passages are taken in score order. One is skipped if its word-shingle
+    Jaccard similarity to an already kept passage reaches dedup_threshold
+    (or, when embeddings are given, its cosine similarity reaches
+    embedding_threshold), or if it would overflow token_budget. The best
+    passage is always kept, cut to the budget if it alone is over. With at
+    most a few dozen candidates, exact Jaccard over shingle sets is cheaper
+    than MinHash signatures.
+    """
+
+    def __init__(self, token_budget: int = 2000, dedup_threshold: float = 0.7,
+                 embedding_threshold: float = 0.97, shingle_size: int = 3):
+        self.token_budget = token_budget
+        self.dedup_threshold = dedup_threshold
+        self.embedding_threshold = embedding_threshold
+        self.shingle_size = shingle_size
+
+    def select(self, texts: Sequence[str], scores: Sequence[float],
+               embeddings: Optional[Sequence[Sequence[float]]] = None) -> List[Tuple[int, str]]:
+        """(index, text) of the passages to use, best first; the text differs only for a cut passage"""
+        unit = None
+        if embeddings is not None:
+            import numpy as np
+
+            unit = np.asarray(embeddings, dtype=np.float32)
+            unit = unit / np.maximum(np.linalg.norm(unit, axis=1, keepdims=True), 1e-12)
+
+        kept: List[int] = []
+        kept_shingles: List[FrozenSet[int]] = []
+
+        def distinct(i: int) -> bool:
+            passage = shingles(texts[i], self.shingle_size)
+            if any(jaccard(passage, other) >= self.dedup_threshold for other in kept_shingles):
+                return False
+            if unit is not None and kept and float((unit[kept] @ unit[i]).max()) >= self.embedding_threshold:
+                return False
+            kept.append(i)
+            kept_shingles.append(passage)
+            return True
+
+        order = sorted(range(len(texts)), key=lambda i: -scores[i])
+        return select_within_budget(texts, order, self.token_budget, accept=distinct)
+
+    def build(self, candidates: Sequence[Tuple[Any, float]]) -> List[Tuple[Any, float]]:
+        """select() for (Document, score) pairs, using the stored embeddings when every row has one"""
+        if not candidates:
+            return []
+        embeddings = [getattr(doc, "embedding", None) for doc, _ in candidates]
+        if any(embedding is None for embedding in embeddings):
+            embeddings = None
+        texts = [doc.content for doc, _ in candidates]
+        return [(candidates[i][0] if text is texts[i] else Excerpt(candidates[i][0], text), candidates[i][1])
+                for i, text in self.select(texts, [score for _, score in candidates], embeddings)]
+
+
+def context_builder_from_env() -> ContextBuilder:
+    return ContextBuilder(
+        token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000")),
+        dedup_threshold=float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.7")),
+        embedding_threshold=float(os.getenv("CONTEXT_EMBEDDING_DEDUP_THRESHOLD", "0.97"))
+    )
+
+
+context_builder = context_builder_from_env()
@@ -1,8 +1,11 @@
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, JSON
+import re
+from sqlalchemy import create_engine, event, text, Column, Computed, ForeignKey, Integer, String, Text, DateTime
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import deferred, sessionmaker
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR, UUID
 from pgvector.sqlalchemy import Vector
 from datetime import datetime
 import uuid
@@ -22,6 +25,74 @@ DATABASE_URL = os.getenv(
 
 engine = create_engine(DATABASE_URL, pool_pre_ping=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def async_database_url(url: str) -> str:
+    """Rewrite a libpq URL for asyncpg, which takes ssl= instead of sslmode= and has no channel_binding"""
+    parsed = make_url(url)
+    query = dict(parsed.query)
+    sslmode = query.pop("sslmode", None)
+    query.pop("channel_binding", None)
+    if sslmode:
+        query["ssl"] = sslmode
+    return parsed.set(drivername="postgresql+asyncpg", query=query).render_as_string(hide_password=False)
+
+
+# The request path (/chat) runs on the async engine so a slow query never
+# blocks the event loop. asyncpg has no codec for pgvector's type and falls
+# back to text I/O, which is the format the Vector column type produces.
+async_engine = create_async_engine(
+    async_database_url(DATABASE_URL),
+    pool_pre_ping=True,
+    pool_size=int(os.getenv("DB_POOL_SIZE", "10"))
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+# Recall/latency trade-off of the pgvector index, applied to every new
+# connection; pick the values with `python manage_index.py bench`
+PGVECTOR_SETTINGS = {
+    name: int(value)
+    for name, value in (("hnsw.ef_search", os.getenv("PGVECTOR_EF_SEARCH")),
+                        ("ivfflat.probes", os.getenv("PGVECTOR_PROBES")))
+    if value
+}
+
+
+def _apply_pgvector_settings(dbapi_connection, connection_record):
+    if not PGVECTOR_SETTINGS:
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in PGVECTOR_SETTINGS.items():
+        cursor.execute(f"SET {name} = {value}")
+    cursor.close()
+    dbapi_connection.commit()  # A SET is undone if its transaction rolls back
+
+
+# Filtered pgvector queries keep walking the HNSW graph until enough rows pass
+# the filter (pgvector >= 0.8: strict_order or relaxed_order; empty to skip).
+# Dropped by check_pgvector_version() on an older extension, where setting it
+# would fail the query.
+PGVECTOR_ITERATIVE_SCAN = os.getenv("PGVECTOR_ITERATIVE_SCAN", "strict_order")
+_iterative_scan = PGVECTOR_ITERATIVE_SCAN
+
+
+def iterative_scan_mode() -> str:
+    return _iterative_scan
+
+
+def check_pgvector_version(conn):
+    """Turn off settings the installed pgvector doesn't have; run once at startup"""
+    global _iterative_scan
+    version = conn.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")).scalar()
+    parts = tuple(int(part) for part in re.findall(r"\d+", version or ""))
+    if _iterative_scan and parts < (0, 8):
+        print(f"⚠️ pgvector {version or '(not installed)'} has no iterative index scans; "
+              f"ignoring PGVECTOR_ITERATIVE_SCAN={PGVECTOR_ITERATIVE_SCAN}")
+        _iterative_scan = ""
+
+
+event.listen(engine, "connect", _apply_pgvector_settings)
+event.listen(async_engine.sync_engine, "connect", _apply_pgvector_settings)
 Base = declarative_base()
 
 
@@ -31,7 +102,14 @@ class Document(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     content = Column(Text, nullable=False)
     embedding = Column(Vector(384), nullable=True)  # 384 for sentence-transformers/all-MiniLM-L6-v2
-    doc_metadata = Column(JSON, nullable=True)
+    doc_metadata = Column(JSONB, nullable=True)
+    # Long documents are stored as a parent row (full text, no embedding)
+    # plus chunk rows that carry the embeddings and are what search returns
+    parent_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), nullable=True, index=True)
+    chunk_index = Column(Integer, nullable=True)
+    # Maintained by Postgres for hybrid (lexical + vector) search; deferred so
+    # ordinary queries don't load it
+    content_tsv = deferred(Column(TSVECTOR, Computed("to_tsvector('english', content)", persisted=True)))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -44,5 +122,44 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Metadata keys with their own expression index; search filters on these
+# keys touch only the matching rows
+METADATA_INDEX_KEYS = [key for key in os.getenv("METADATA_INDEX_KEYS", "crop,type,category,product_name").split(",")
+                       if re.fullmatch(r"\w+", key)]
+
+# create_all() only creates missing tables; columns added to an existing
+# table are applied here
+MIGRATIONS = [
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS parent_id UUID REFERENCES documents(id) ON DELETE CASCADE",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS chunk_index INTEGER",
+    "CREATE INDEX IF NOT EXISTS ix_documents_parent_id ON documents (parent_id)",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_tsv tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('english', content)) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_documents_content_tsv ON documents USING GIN (content_tsv)",
+    # JSON has no operators to index; rewrite the column once
+    """
+    DO $$ BEGIN
+        IF (SELECT data_type FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'documents' AND column_name = 'doc_metadata') = 'json' THEN
+            ALTER TABLE documents ALTER COLUMN doc_metadata TYPE jsonb USING doc_metadata::jsonb;
+        END IF;
+    END $$
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_documents_metadata ON documents USING GIN (doc_metadata jsonb_path_ops)",
+] + [
+    f"CREATE INDEX IF NOT EXISTS ix_documents_metadata_{key} ON documents ((doc_metadata ->> '{key}'))"
+    for key in METADATA_INDEX_KEYS
+]
+
+
 def init_db():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for statement in MIGRATIONS:
+            conn.execute(text(statement))
+        check_pgvector_version(conn)
\ No newline at end of file
@@ -0,0 +1,283 @@
+import hashlib
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from shared_state import WORKERS
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".embedding_cache.sqlite")
+
+SNAPSHOT_MAGIC = b"EMBSNAP1"
+_SNAPSHOT_HEADER = struct.Struct("<8sIII")  # magic, dim, count, model name length
+
+
+def normalize_text(text: str) -> str:
+    """Both supported models are uncased, so case and spacing don't change the vector"""
+    return " ".join(text.split()).lower()
+
+
+def cache_key(model: str, text: str) -> Tuple[str, str]:
+    return model, hashlib.sha256(normalize_text(text).encode()).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-tier embedding cache: in-process LRU in front of a SQLite file.
+
+    Entries are keyed by (model name, sha256 of normalized text), so the same
+    text is never embedded twice by the same model, across restarts too.
+    Set path to None to keep the cache in memory only.
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH, max_entries: int = 10000, max_disk_entries: int = 200000):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._db = None
+        if path:
+            try:
+                self._db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("""
+                    CREATE TABLE IF NOT EXISTS embeddings (
+                        model TEXT NOT NULL,
+                        text_hash TEXT NOT NULL,
+                        embedding BLOB NOT NULL,
+                        last_used REAL NOT NULL,
+                        PRIMARY KEY (model, text_hash)
+                    )
+                """)
+                self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Embedding cache disabled on disk: {e}")
+                self._db = None
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Look texts up in memory, then on disk; None marks a miss"""
+        keys = [cache_key(model, text) for text in texts]
+        results: List[Optional[List[float]]] = []
+        disk_lookups: Dict[Tuple[str, str], List[int]] = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                embedding = self._memory.get(key)
+                if embedding is not None:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                else:
+                    disk_lookups.setdefault(key, []).append(i)
+                results.append(embedding)
+
+            if disk_lookups and self._db is not None:
+                found = self._load(model, [key[1] for key in disk_lookups])
+                for key, positions in disk_lookups.items():
+                    embedding = found.get(key[1])
+                    if embedding is None:
+                        continue
+                    self._remember(key, embedding)
+                    for i in positions:
+                        results[i] = embedding
+                    self.hits += len(positions)
+                    self.disk_hits += len(positions)
+
+            self.misses += sum(1 for embedding in results if embedding is None)
+        return results
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        return self.get_many(model, [text])[0]
+
+    def put_many(self, model: str, texts: List[str], embeddings: List[List[float]]):
+        rows = []
+        now = time.time()
+        with self._lock:
+            for text, embedding in zip(texts, embeddings):
+                key = cache_key(model, text)
+                self._remember(key, embedding)
+                rows.append((model, key[1], array('f', embedding).tobytes(), now))
+
+            if rows and self._db is not None:
+                try:
+                    self._db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+                    self._evict_disk()
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"Embedding cache write error: {e}")
+
+    def export_snapshot(self, path: str, model: str, limit: Optional[int] = None) -> int:
+        """Write the `limit` most recently used disk entries for model as an EmbeddingSnapshot"""
+        if self._db is None:
+            raise ValueError("Snapshots are exported from the on-disk cache")
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT text_hash, embedding FROM embeddings WHERE model = ? ORDER BY last_used DESC LIMIT ?",
+                (model, limit or -1)
+            ).fetchall()
+        write_snapshot(path, model, dict(rows))
+        return len(rows)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+            }
+
+    def _remember(self, key: Tuple[str, str], embedding: List[float]):
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _load(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        try:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._db.execute(
+                    f"SELECT text_hash, embedding FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *chunk]
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = array('f', blob).tolist()
+            if found:
+                now = time.time()
+                self._db.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, text_hash) for text_hash in found]
+                )
+                self._db.commit()
+        except sqlite3.Error as e:
+            print(f"Embedding cache read error: {e}")
+        return found
+
+    def _evict_disk(self):
+        count = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count > self.max_disk_entries:
+            self._db.execute(
+                "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                (count - self.max_disk_entries,)
+            )
+
+
+class EmbeddingSnapshot:
+    """Read-only, memory-mapped export of the cache for one model.
+
+    Built ahead of time and shipped with a deployment, so a cold serverless
+    instance can answer common queries without an embedding call. Opening
+    one maps the file and reads its header; a lookup is a binary search
+    over the sorted sha256 keys. Pages are loaded on demand and shared by
+    every process mapping the file.
+
+    A file that isn't a complete snapshot (wrong magic, or a size that
+    doesn't match its header) raises ValueError.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self._map) < _SNAPSHOT_HEADER.size:
+                raise ValueError(f"Truncated embedding snapshot: {path}")
+            magic, self.dim, self.count, name_length = _SNAPSHOT_HEADER.unpack_from(self._map)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"Not an embedding snapshot: {path}")
+            start = _SNAPSHOT_HEADER.size
+            self.model = self._map[start:start + name_length].decode()  # UnicodeDecodeError is a ValueError
+            self._keys = start + name_length
+            self._vectors = self._keys + 32 * self.count
+            if (self.count and not self.dim) or len(self._map) != self._vectors + 4 * self.dim * self.count:
+                raise ValueError(f"Truncated or corrupt embedding snapshot: {path}")
+        except ValueError:
+            self._map.close()
+            raise
+
+    def __len__(self) -> int:
+        return self.count
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        if model != self.model:
+            return None
+        digest = bytes.fromhex(cache_key(model, text)[1])
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = self._keys + 32 * mid
+            if self._map[offset:offset + 32] < digest:
+                lo = mid + 1
+            else:
+                hi = mid
+        offset = self._keys + 32 * lo
+        if lo == self.count or self._map[offset:offset + 32] != digest:
+            return None
+        offset = self._vectors + 4 * self.dim * lo
+        return array('f', self._map[offset:offset + 4 * self.dim]).tolist()
+
+
+def write_snapshot(path: str, model: str, entries: Dict[str, bytes]):
+    """Write {sha256 hex: float32 bytes} (as stored in the cache) as an EmbeddingSnapshot file"""
+    keys = sorted(entries)
+    dim = len(entries[keys[0]]) // 4 if keys else 0
+    name = model.encode()
+    # Replace, don't rewrite: running instances may have the old file mapped
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, dim, len(keys), len(name)))
+        f.write(name)
+        for key in keys:
+            f.write(bytes.fromhex(key))
+        for key in keys:
+            f.write(entries[key])
+    os.replace(tmp, path)
+
+
+def cache_from_env() -> Optional[EmbeddingCache]:
+    """Build the cache configured by EMBEDDING_CACHE* environment variables"""
+    if os.getenv("EMBEDDING_CACHE", "1") != "1":
+        return None
+    path = os.getenv("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH)
+    # Every worker has its own memory tier in front of the one shared SQLite
+    # file, so by default the workers split the memory budget between them
+    return EmbeddingCache(
+        path=path if path != ":memory:" else None,
+        max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", str(max(10000 // WORKERS, 1000)))),
+        max_disk_entries=int(os.getenv("EMBEDDING_CACHE_DISK_SIZE", "200000"))
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export the on-disk embedding cache as a memory-mapped snapshot")
+    parser.add_argument("command", choices=["snapshot"])
+    parser.add_argument("output", help="e.g. ../api/embedding_snapshot.bin for the Vercel chat handler")
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"),
+                        help="api/chat.py embeds with BAAI/bge-small-en-v1.5")
+    parser.add_argument("--cache", default=os.getenv("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH))
+    parser.add_argument("--queries", help="Embed these first, one per line (EMBEDDING_API_URL must serve --model)")
+    parser.add_argument("--limit", type=int, help="Keep only the most recently used entries")
+    args = parser.parse_args()
+
+    cache = EmbeddingCache(args.cache)
+    if args.queries:
+        os.environ["EMBEDDING_MODEL"] = args.model
+        from embeddings import EmbeddingGenerator
+
+        with open(args.queries, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+        EmbeddingGenerator(cache).get_embeddings(queries)
+    count = cache.export_snapshot(args.output, args.model, args.limit)
+    print(f"✅ {count} {args.model} embeddings -> {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB)")
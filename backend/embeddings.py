@@ -1,53 +1,337 @@
+import asyncio
 import os
-import requests
-from typing import List
-import hashlib
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+from embedding_cache import EmbeddingCache, cache_from_env
+from local_embeddings import LocalEmbeddingModel
+from hash_embeddings import hash_embedder
+from shared_state import WORKERS
+import http_client
+from tracing import incr, traced
+
+DEFAULT_API_URL = "https://api-inference.huggingface.co/pipeline/feature-extraction/sentence-transformers/all-MiniLM-L6-v2"
 
 class EmbeddingGenerator:
-    def __init__(self):
+    def __init__(self, cache: Optional[EmbeddingCache] = None):
         """Use HF API instead of downloading model to save memory"""
+        self.model_name = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+        self.cache = cache
+        self.api_calls = 0
         self.hf_token = os.getenv("HUGGINGFACE_API_TOKEN")
-        self.api_url = "https://api-inference.huggingface.co/pipeline/feature-extraction/sentence-transformers/all-MiniLM-L6-v2"
-    
+        # EMBEDDING_API_URL points at any HF-compatible feature-extraction
+        # endpoint, e.g. the local fake_inference_server.py
+        self.api_url = os.getenv("EMBEDDING_API_URL", DEFAULT_API_URL)
+        self.use_api = bool(self.hf_token) or "EMBEDDING_API_URL" in os.environ
+        # EMBEDDING_BACKEND=local runs the model in-process from EMBEDDING_MODEL_DIR,
+        # EMBEDDING_BACKEND=hash uses only the hashing embedder
+        self.backend = os.getenv("EMBEDDING_BACKEND", "api")
+        if self.backend == "hash":
+            self.use_api = False
+        self.local_model = None
+        if self.backend == "local":
+            self.local_model = LocalEmbeddingModel(
+                os.getenv("EMBEDDING_MODEL_DIR", "models/all-MiniLM-L6-v2"),
+                max_length=int(os.getenv("EMBEDDING_MAX_LENGTH", "256")),
+                # Workers split the cores instead of each starting a thread per core
+                threads=max((os.cpu_count() or 1) // WORKERS, 1) if WORKERS > 1 else None
+            )
+
     def get_embedding(self, text: str) -> List[float]:
         """Same model, same quality, zero memory usage"""
-        if self.hf_token:
+        return self.get_embeddings([text])[0]
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts with a single inference request"""
+        if not texts:
+            return []
+        if self.cache is None:
+            return self._embed(texts)
+
+        embeddings, missing = self._lookup(texts)
+        if missing:
+            computed = self.embed_uncached([texts[i] for i in missing])
+            for i, embedding in zip(missing, computed):
+                embeddings[i] = embedding
+        return embeddings
+
+    async def aget_embedding(self, text: str) -> List[float]:
+        return (await self.aget_embeddings([text]))[0]
+
+    async def aget_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """get_embeddings() for the event loop: the API call goes through the shared AsyncClient"""
+        if not texts:
+            return []
+        if self.cache is None:
+            return await self._aembed(texts)
+
+        embeddings, missing = self._lookup(texts)
+        if missing:
+            computed = await self.aembed_uncached([texts[i] for i in missing])
+            for i, embedding in zip(missing, computed):
+                embeddings[i] = embedding
+        return embeddings
+
+    def embed_uncached(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts already known to miss the cache and store the results"""
+        if self.cache is None:
+            return self._embed(texts)
+        # Collapse duplicates so each distinct text is embedded once
+        unique = list(dict.fromkeys(texts))
+        computed = dict(zip(unique, self._embed(unique, cache_results=True)))
+        return [computed[text] for text in texts]
+
+    async def aembed_uncached(self, texts: List[str]) -> List[List[float]]:
+        if self.cache is None:
+            return await self._aembed(texts)
+        unique = list(dict.fromkeys(texts))
+        computed = dict(zip(unique, await self._aembed(unique, cache_results=True)))
+        return [computed[text] for text in texts]
+
+    # _embed() and _aembed() differ only in how they wait for the model or
+    # the API; building the request, parsing the response, caching and the
+    # fallback are shared below so the two paths can't drift apart
+
+    @traced("embed")
+    def _embed(self, texts: List[str], cache_results: bool = False) -> List[List[float]]:
+        embeddings = None
+        if self.local_model is not None:
+            try:
+                embeddings = self.local_model.embed(texts).tolist()
+            except Exception as e:
+                print(f"Local embedding error: {e}")
+
+        elif self.use_api:
             try:
-                headers = {"Authorization": f"Bearer {self.hf_token}"}
-                response = requests.post(
-                    self.api_url,
-                    headers=headers,
-                    json={"inputs": text},
-                    timeout=15
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    if isinstance(result, list) and len(result) > 0:
-                        if isinstance(result[0], list):
-                            return result[0][:384]  # First embedding
-                        return result[:384]
-                        
+                response = http_client.post(self.api_url, **self._api_request(texts))
+                embeddings = self._parse_response(response, len(texts))
             except Exception as e:
                 print(f"HF API error: {e}")
-        
-        # Fallback: deterministic hash-based embedding
-        return self._hash_embedding(text)
-    
-    def _hash_embedding(self, text: str) -> List[float]:
-        """Consistent fallback embedding (384-dim)"""
-        # Create deterministic embedding from text hash
-        hash_bytes = hashlib.sha256(text.encode()).digest()
-        hash_ints = [b for b in hash_bytes]
-        
-        # Extend to 384 dimensions
-        embedding = []
-        for i in range(384):
-            byte_idx = i % len(hash_ints)
-            # Normalize to [-1, 1] range
-            normalized = (hash_ints[byte_idx] - 128) / 128.0
-            embedding.append(normalized)
-            
-        return embedding
-
-embedder = EmbeddingGenerator()
\ No newline at end of file
+
+        return self._finish(texts, embeddings, cache_results)
+
+    @traced("embed")
+    async def _aembed(self, texts: List[str], cache_results: bool = False) -> List[List[float]]:
+        embeddings = None
+        if self.local_model is not None:
+            try:
+                # ONNX inference is CPU-bound; keep it off the event loop
+                embeddings = (await asyncio.to_thread(self.local_model.embed, texts)).tolist()
+            except Exception as e:
+                print(f"Local embedding error: {e}")
+
+        elif self.use_api:
+            try:
+                response = await http_client.arequest("POST", self.api_url, **self._api_request(texts))
+                embeddings = self._parse_response(response, len(texts))
+            except Exception as e:
+                print(f"HF API error: {e}")
+
+        return self._finish(texts, embeddings, cache_results)
+
+    def _lookup(self, texts: List[str]) -> Tuple[List[Optional[List[float]]], List[int]]:
+        """(cached embedding or None per text, indexes of the misses)"""
+        embeddings = self.cache.get_many(self.model_name, texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        incr("embedding_cache_hits", len(texts) - len(missing))
+        incr("embedding_cache_misses", len(missing))
+        return embeddings, missing
+
+    def _api_request(self, texts: List[str]) -> Dict[str, Any]:
+        """Keyword arguments for one batched feature-extraction request"""
+        self.api_calls += 1
+        return {
+            "headers": {"Authorization": f"Bearer {self.hf_token}"} if self.hf_token else {},
+            "json": {"inputs": texts},
+            "timeout": 15.0,
+        }
+
+    def _parse_response(self, response, expected: int) -> Optional[List[List[float]]]:
+        """Embeddings from a requests or httpx response, or None if it isn't usable"""
+        if response.status_code != 200:
+            return None
+        return self._parse_batch(response.json(), expected)
+
+    def _finish(self, texts: List[str], embeddings: Optional[List[List[float]]],
+                cache_results: bool) -> List[List[float]]:
+        if embeddings is not None:
+            if cache_results:
+                self.cache.put_many(self.model_name, texts, embeddings)
+            return embeddings
+        # Fallback: deterministic hash-based embedding (never cached, so the
+        # real vectors replace it once the API is reachable again)
+        if self.use_api or self.local_model is not None:
+            incr("embedding_fallbacks")
+        return self._hash_embeddings(texts)
+
+    def _parse_batch(self, result, expected: int) -> Optional[List[List[float]]]:
+        """Validate a batched feature-extraction response"""
+        if not isinstance(result, list) or len(result) != expected:
+            return None
+        embeddings = []
+        for item in result:
+            if not isinstance(item, list) or not item:
+                return None
+            if isinstance(item[0], list):
+                item = item[0]  # Token-level output, take the first row
+            embeddings.append(item[:384])
+        return embeddings
+
+    def _hash_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Consistent fallback embedding (384-dim) with lexical similarity"""
+        return hash_embedder.embed(texts).tolist()
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent single-text embedding calls into batched requests.
+
+    Callers block in get_embedding() while a worker thread gathers pending
+    texts until either max_batch_size texts are queued or max_wait_ms has
+    passed since the first one arrived, then embeds them with one call.
+    """
+
+    def __init__(self, generator: EmbeddingGenerator, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.generator = generator
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._pending: List[Tuple[str, Future]] = []
+        self._cond = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        self.batches = 0
+        self.texts = 0
+
+    def submit(self, text: str) -> Future:
+        future = Future()
+        with self._cond:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+            self._pending.append((text, future))
+            self._cond.notify()
+        return future
+
+    def get_embedding(self, text: str) -> List[float]:
+        if self.generator.cache is not None:
+            # Cached texts don't need to wait for a batch window
+            cached = self.generator.cache.get(self.generator.model_name, text)
+            if cached is not None:
+                return cached
+        return self.submit(text).result()
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        # Explicit batches are already batched; send them straight through
+        return self.generator.get_embeddings(texts)
+
+    def _next_batch(self) -> List[Tuple[str, Future]]:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = time.monotonic() + self.max_wait
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            texts = [text for text, _ in batch]
+            try:
+                # get_embedding() already checked the cache for these texts
+                embeddings = self.generator.embed_uncached(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.texts += len(texts)
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+
+class AsyncEmbeddingBatcher:
+    """Event-loop counterpart of EmbeddingBatcher.
+
+    Awaiting callers are gathered until max_batch_size texts are queued or
+    max_wait_ms has passed since the first one, then embedded with a single
+    non-blocking request.
+    """
+
+    def __init__(self, generator: EmbeddingGenerator, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.generator = generator
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        self.batches = 0
+        self.texts = 0
+
+    async def aget_embedding(self, text: str) -> List[float]:
+        if self.generator.cache is not None:
+            cached = self.generator.cache.get(self.generator.model_name, text)
+            if cached is not None:
+                return cached
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    async def aget_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return await self.generator.aget_embeddings(texts)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch = self._pending[:self.max_batch_size]
+        del self._pending[:self.max_batch_size]
+        if self._pending:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        if batch:
+            task = asyncio.ensure_future(self._embed_batch(batch))
+            self._tasks.add(task)  # Hold a reference until it finishes
+            task.add_done_callback(self._tasks.discard)
+
+    async def _embed_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        texts = [text for text, _ in batch]
+        try:
+            embeddings = await self.generator.aembed_uncached(texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.texts += len(texts)
+        for (_, future), embedding in zip(batch, embeddings):
+            # Callers that were cancelled (e.g. client disconnected) are skipped
+            if not future.done():
+                future.set_result(embedding)
+
+
+generator = EmbeddingGenerator(cache=cache_from_env())
+
+if os.getenv("EMBEDDING_COALESCE", "1") == "1":
+    embedder = EmbeddingBatcher(
+        generator,
+        max_batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "32")),
+        max_wait_ms=float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+    )
+    async_embedder = AsyncEmbeddingBatcher(
+        generator,
+        max_batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "32")),
+        max_wait_ms=float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+    )
+else:
+    embedder = generator
+    async_embedder = generator
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the HuggingFace feature-extraction API.
+
+Answers POST requests with deterministic 384-dim embeddings after a
+configurable delay so batching can be tested and benchmarked offline:
+
+    python fake_inference_server.py --port 8081 --latency-ms 40
+    EMBEDDING_API_URL=http://127.0.0.1:8081 python main.py
+
+Requests to a Gemini ".../models/<name>:generateContent" path get a canned
+answer after --llm-latency-ms (":streamGenerateContent" streams it one
+token per --token-ms), so GEMINI_API_BASE=http://127.0.0.1:8081 stands in
+for the LLM as well.
+"""
+import argparse
+import hashlib
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Tuple
+
+
+def fake_embedding(text: str, dim: int = 384) -> List[float]:
+    """Deterministic unit-length vector derived from the text"""
+    values = []
+    counter = 0
+    while len(values) < dim:
+        digest = hashlib.sha256(f"{counter}:{text}".encode()).digest()
+        values.extend((b - 127.5) / 127.5 for b in digest)
+        counter += 1
+    values = values[:dim]
+    norm = math.sqrt(sum(v * v for v in values)) or 1.0
+    return [v / norm for v in values]
+
+
+class FakeInferenceHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        content_length = int(self.headers.get('Content-Length', 0))
+        data = json.loads(self.rfile.read(content_length).decode('utf-8'))
+
+        if ':generateContent' in self.path:
+            self._generate(data)
+            return
+        if ':streamGenerateContent' in self.path:
+            self._stream_generate(data)
+            return
+
+        inputs = data.get('inputs', '')
+        texts = inputs if isinstance(inputs, list) else [inputs]
+
+        stats = self.server.stats
+        with stats['lock']:
+            stats['requests'] += 1
+            stats['texts'] += len(texts)
+
+        # Fixed per-request overhead plus a small per-text cost, like a real GPU batch
+        time.sleep((self.server.latency_ms + self.server.per_item_ms * len(texts)) / 1000.0)
+
+        embeddings = [fake_embedding(text) for text in texts]
+        body = embeddings if isinstance(inputs, list) else embeddings[0]
+        self._send_json(body)
+
+    def _generate(self, data):
+        prompt = ''.join(part.get('text', '') for part in data['contents'][0]['parts'])
+        stats = self.server.stats
+        with stats['lock']:
+            stats['llm_requests'] += 1
+        time.sleep(self.server.llm_latency_ms / 1000.0)
+        answer = f"Fake answer based on {len(prompt)} characters of context."
+        self._send_json({'candidates': [{'content': {'parts': [{'text': answer}], 'role': 'model'}}]})
+
+    def _stream_generate(self, data):
+        """SSE chunks like streamGenerateContent?alt=sse: first after --llm-latency-ms, then one per token"""
+        stats = self.server.stats
+        with stats['lock']:
+            stats['llm_requests'] += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        time.sleep(self.server.llm_latency_ms / 1000.0)
+        try:
+            for word in "Fake streamed answer from the retrieved context documents.".split():
+                chunk = {'candidates': [{'content': {'parts': [{'text': word + ' '}], 'role': 'model'}}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\r\n\r\n".encode())
+                self.wfile.flush()
+                time.sleep(self.server.token_ms / 1000.0)
+            with stats['lock']:
+                stats['llm_completed'] += 1
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client cancelled the generation
+
+    def do_GET(self):
+        stats = self.server.stats
+        with stats['lock']:
+            self._send_json({'requests': stats['requests'], 'texts': stats['texts'],
+                             'llm_requests': stats['llm_requests'], 'llm_completed': stats['llm_completed']})
+
+    def _send_json(self, body):
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeInferenceServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # Benchmarks open many connections at once
+
+
+def start_fake_server(port: int = 0, latency_ms: float = 20.0, per_item_ms: float = 0.2,
+                      llm_latency_ms: float = 100.0, token_ms: float = 20.0) -> Tuple[FakeInferenceServer, str]:
+    """Start the fake server on a background thread and return (server, url)"""
+    server = FakeInferenceServer(('127.0.0.1', port), FakeInferenceHandler)
+    server.latency_ms = latency_ms
+    server.per_item_ms = per_item_ms
+    server.llm_latency_ms = llm_latency_ms
+    server.token_ms = token_ms
+    server.stats = {'lock': threading.Lock(), 'requests': 0, 'texts': 0, 'llm_requests': 0, 'llm_completed': 0}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake HF feature-extraction server")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--per-item-ms", type=float, default=0.2)
+    parser.add_argument("--llm-latency-ms", type=float, default=100.0)
+    parser.add_argument("--token-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    server, url = start_fake_server(args.port, args.latency_ms, args.per_item_ms, args.llm_latency_ms, args.token_ms)
+    print(f"🧪 Fake inference server listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,148 @@
+from typing import List
+
+import numpy as np
+
+# ASCII punctuation becomes a space; letters, digits, UTF-8 bytes and the
+# \x00 text separator pass through unchanged
+_BYTE_TABLE = bytes(c if c == 0 or c >= 128 or chr(c).isalnum() else 32 for c in range(256))
+
+# Polynomial hash base and its inverse modulo 2**64, for O(1) hashes of any span
+_BASE = 0x100000001B3
+_BASE_INV = pow(_BASE, -1, 2 ** 64)
+_MIX = np.uint64(0xFF51AFD7ED558CCD)
+
+# Salts keep word, bigram and character n-gram features in separate hash families
+_WORD_SALT = np.uint64(0x9E3779B97F4A7C15)
+_BIGRAM_SALT = np.uint64(0xC2B2AE3D27D4EB4F)
+_CHAR_SALT = np.uint64(0x165667B19E3779F9)
+
+
+_power_tables = (np.ones(1, dtype=np.uint64), np.ones(1, dtype=np.uint64))
+
+
+def _powers(size: int):
+    """(BASE**i, BASE_INV**i) for i < size, grown as needed and shared by every batch"""
+    global _power_tables
+    powers, inv_powers = _power_tables
+    if len(powers) < size:
+        length = max(size, 2 * len(powers))
+        with np.errstate(over="ignore"):
+            powers = np.full(length, _BASE, dtype=np.uint64)
+            powers[0] = 1
+            np.cumprod(powers, out=powers)
+            inv_powers = np.full(length, _BASE_INV, dtype=np.uint64)
+            inv_powers[0] = 1
+            np.cumprod(inv_powers, out=inv_powers)
+        _power_tables = (powers, inv_powers)
+    return powers[:size], inv_powers[:size]
+
+
+class HashingEmbedder:
+    """Feature-hashing embedder: signed hashed words, word bigrams and char n-grams.
+
+    Works on whole batches at once: every text is normalized into one byte
+    buffer, and all n-gram hashes come from prefix sums over that buffer, so
+    there is no per-feature Python work. Texts sharing words or word pieces
+    get high cosine similarity, which keeps retrieval usable without a model.
+
+    batch_size bounds the texts per pass so the per-byte uint64 temporaries
+    stay small; 256 chunks of a few hundred characters was the fastest.
+    """
+
+    def __init__(self, dim: int = 384, char_ngrams=(3, 4, 5), word_weight: float = 1.0,
+                 bigram_weight: float = 0.7, char_weight: float = 0.35, batch_size: int = 256):
+        self.dim = dim
+        self.char_ngrams = char_ngrams
+        self.word_weight = word_weight
+        self.bigram_weight = bigram_weight
+        self.char_weight = char_weight
+        self.batch_size = batch_size
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Return an (n, dim) float32 array of L2-normalized embeddings"""
+        result = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(texts), self.batch_size):
+            result[start:start + self.batch_size] = self._embed_batch(texts[start:start + self.batch_size])
+        return result
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        # Normalize the whole batch in one pass into " text \x00 text \x00 ... "
+        # so words and char n-grams see a boundary space on both sides
+        if any("\x00" in text for text in texts):
+            texts = [text.replace("\x00", " ") for text in texts]
+        raw = (" " + " \x00 ".join(texts).lower() + " ").encode().translate(_BYTE_TABLE)
+        buf = np.frombuffer(raw, dtype=np.uint8)
+        space = buf == 32
+        buf = buf[np.concatenate(([True], ~(space[1:] & space[:-1])))]  # Collapse runs of spaces
+        size = len(buf)
+        is_separator = buf == 0
+        doc = np.cumsum(is_separator)  # Index of the text each byte belongs to
+
+        powers, inv_powers = _powers(size)
+        with np.errstate(over="ignore"):
+            prefix = np.zeros(size + 1, dtype=np.uint64)
+            np.cumsum(buf * inv_powers, out=prefix[1:])
+
+        # Each feature lands in one slot per (family, text, bucket, sign): a
+        # single unweighted bincount covers the batch, and the family weights
+        # are applied to the counts. Row len(texts) collects dropped features.
+        rows = len(texts) + 1
+        index_parts = []
+
+        def add(hashes, docs, salt, family):
+            with np.errstate(over="ignore"):
+                h = hashes ^ salt
+                t = h >> np.uint64(33)
+                h ^= t
+                h *= _MIX
+                np.right_shift(h, np.uint64(29), out=t)
+                h ^= t
+                # Top 32 bits pick the bucket, the lowest bit the sign
+                np.right_shift(h, np.uint64(32), out=t)
+                t *= np.uint64(self.dim)
+                t >>= np.uint64(32)
+            slot = docs + family * rows
+            slot *= self.dim
+            slot += t.view(np.int64)
+            slot <<= 1
+            h &= np.uint64(1)
+            slot += h.view(np.int64)
+            index_parts.append(slot)
+
+        # Words and bigrams: sum(buf[j] * BASE**(end-1-j)) over each span,
+        # which does not depend on where the span sits in the buffer
+        is_space = buf <= 32
+        starts = np.flatnonzero(~is_space[1:] & is_space[:-1]) + 1
+        ends = np.flatnonzero(~is_space[:-1] & is_space[1:]) + 1
+        if len(starts):
+            with np.errstate(over="ignore"):
+                word_hashes = (prefix[ends] - prefix[starts]) * powers[ends - 1]
+                bigram_hashes = (prefix[ends[1:]] - prefix[starts[:-1]]) * powers[ends[1:] - 1]
+            word_docs = doc[starts]
+            same_doc = word_docs[1:] == word_docs[:-1]
+            add(word_hashes, word_docs, _WORD_SALT, 0)
+            add(bigram_hashes[same_doc], word_docs[:-1][same_doc], _BIGRAM_SALT, 1)
+
+        # Character n-grams; those crossing a separator are counted in an
+        # extra row that is dropped, which is cheaper than filtering them out
+        separators_before = np.concatenate(([0], doc))
+        for n in self.char_ngrams:
+            if size < n:
+                continue
+            count = size - n + 1
+            gram_docs = doc[:count].copy()
+            gram_docs[separators_before[n:] != separators_before[:count]] = len(texts)
+            with np.errstate(over="ignore"):
+                gram_hashes = prefix[n:] - prefix[:count]
+                gram_hashes *= powers[n - 1:]
+            add(gram_hashes, gram_docs, _CHAR_SALT, 2)
+
+        slots = np.concatenate(index_parts) if index_parts else np.zeros(0, dtype=np.int64)
+        counts = np.bincount(slots, minlength=3 * rows * self.dim * 2).reshape(3, rows, self.dim, 2)
+        signed = (counts[:, :len(texts), :, 0] - counts[:, :len(texts), :, 1]).astype(np.float32)
+        vectors = self.word_weight * signed[0] + self.bigram_weight * signed[1] + self.char_weight * signed[2]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+hash_embedder = HashingEmbedder()
@@ -0,0 +1,357 @@
+import json
+import math
+import os
+import random
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Nodes expanded per step of a layer search (see HNSWIndex._search_layer)
+EXPAND = 16
+# Up to this many nodes, a new node's candidate neighbours are its exact
+# nearest ones, from one matrix product per block of inserted vectors,
+# instead of a graph search; cheaper at that size and a better graph
+EXACT_BUILD_LIMIT = int(os.getenv("HNSW_EXACT_BUILD_LIMIT", "20000"))
+EXACT_BUILD_BLOCK = 256
+
+
+class HNSWIndex:
+    """In-process HNSW graph over L2-normalized float32 vectors (cosine similarity).
+
+    Vectors live in one contiguous (capacity, dim) matrix and layer-0 links in
+    a (capacity, 2*m) int32 matrix, so both can be saved as .npy files and
+    memory-mapped by a cold worker. Upper layers hold ~1/m of the nodes and
+    are kept in a dict. Deleted documents are tombstoned, not unlinked.
+
+    Defaults give recall@10 >= 0.9 on uniformly random 384-d vectors (the
+    hardest case); clustered embeddings score higher.
+    """
+
+    def __init__(self, dim: int = 384, m: int = 24, ef_construction: int = 200, ef_search: int = 128,
+                 capacity: int = 1024, seed: int = 42):
+        self.dim = dim
+        self.m = m
+        self.m0 = 2 * m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.level_mult = 1 / math.log(m)
+        self._rng = random.Random(seed)
+        self._lock = threading.RLock()
+        self._reset(capacity)
+
+    def _reset(self, capacity: int):
+        self.vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        self.layer0 = np.full((capacity, self.m0), -1, dtype=np.int32)
+        self.levels = np.zeros(capacity, dtype=np.int8)
+        self.upper: Dict[int, np.ndarray] = {}  # node -> (level, m) links for layers 1..level
+        self.deleted = np.zeros(capacity, dtype=bool)
+        self.ids: List[str] = []
+        self.slots: Dict[str, int] = {}
+        self.count = 0
+        self.entry_point = -1
+        self.max_level = -1
+        self._visited = np.zeros(capacity, dtype=np.int32)
+        self._visit_tag = 0
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def add(self, doc_id: str, vector: Sequence[float]):
+        self.add_batch([doc_id], [vector])
+
+    def add_batch(self, doc_ids: List[str], vectors):
+        vectors = self._normalize(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim))
+        doc_ids = [str(doc_id) for doc_id in doc_ids]
+        with self._lock:
+            for start in range(0, len(vectors), EXACT_BUILD_BLOCK):
+                block = vectors[start:start + EXACT_BUILD_BLOCK]
+                sims = None
+                if self.count + len(block) <= EXACT_BUILD_LIMIT:
+                    # Row i: similarity to every node that exists when block[i] is inserted
+                    sims = block @ np.concatenate((self.vectors[:self.count], block)).T
+                for i, (doc_id, vector) in enumerate(zip(doc_ids[start:start + EXACT_BUILD_BLOCK], block)):
+                    if doc_id in self.slots:
+                        self.remove(doc_id)
+                    self._insert(doc_id, vector, None if sims is None else sims[i, :self.count])
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            slot = self.slots.pop(str(doc_id), None)
+            if slot is not None:
+                self.deleted[slot] = True
+
+    def clear(self):
+        with self._lock:
+            self._reset(1024)
+
+    def search(self, query: Sequence[float], k: int = 5, ef: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Return up to k (doc_id, cosine similarity) pairs, best first"""
+        with self._lock:
+            if not self.slots:
+                return []
+            q = self._normalize(np.asarray(query, dtype=np.float32).reshape(1, self.dim))[0]
+            ep = self.entry_point
+            for level in range(self.max_level, 0, -1):
+                ep = self._greedy(q, ep, level)
+            # Tombstones still route the search but are dropped from the results
+            ef = max(ef or self.ef_search, k)
+            tombstones = self.count - len(self.slots)
+            sims, nodes = self._search_layer(q, [ep], ef + min(tombstones, ef), 0)
+            results = [(self.ids[node], sim) for sim, node in zip(sims.tolist(), nodes.tolist())
+                       if not self.deleted[node]]
+            return results[:k]
+
+    def search_batch(self, queries, k: int = 5, ef: Optional[int] = None) -> List[List[Tuple[str, float]]]:
+        return [self.search(query, k, ef) for query in queries]
+
+    def _insert(self, doc_id: str, vector: np.ndarray, exact_sims: Optional[np.ndarray] = None):
+        node = self.count
+        if node == len(self.vectors):
+            self._grow()
+        level = min(int(-math.log(1.0 - self._rng.random()) * self.level_mult), 15)
+        self.vectors[node] = vector
+        self.levels[node] = level
+        if level > 0:
+            self.upper[node] = np.full((level, self.m), -1, dtype=np.int32)
+        self.ids.append(doc_id)
+        self.slots[doc_id] = node
+        self.count += 1
+
+        if self.entry_point < 0:
+            self.entry_point, self.max_level = node, level
+            return
+
+        if exact_sims is None:
+            ep = self.entry_point
+            for lc in range(self.max_level, level, -1):
+                ep = self._greedy(vector, ep, lc)
+            entry_points = [ep]
+
+        for lc in range(min(level, self.max_level), -1, -1):
+            if exact_sims is None:
+                sims, candidates = self._search_layer(vector, entry_points, self.ef_construction, lc)
+            else:
+                sims, candidates = self._nearest(exact_sims, lc)
+            max_links = self.m0 if lc == 0 else self.m
+            neighbors = self._select(sims, candidates, self.m)
+            self._set_links(node, lc, neighbors)
+            for neighbor in neighbors:
+                self._connect(neighbor, node, lc, max_links)
+            entry_points = candidates
+
+        if level > self.max_level:
+            self.entry_point, self.max_level = node, level
+
+    def _nearest(self, exact_sims: np.ndarray, level: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(similarities, nodes) of the ef_construction nodes on `level` closest to the new node, best first"""
+        if level == 0:
+            nodes = np.arange(len(exact_sims))
+        else:
+            nodes = np.array([n for n in self.upper if n < len(exact_sims) and self.levels[n] >= level], dtype=np.int64)
+        sims = exact_sims[nodes]
+        if len(nodes) > self.ef_construction:
+            keep = np.argpartition(-sims, self.ef_construction - 1)[:self.ef_construction]
+            nodes, sims = nodes[keep], sims[keep]
+        order = np.argsort(-sims)
+        return sims[order], nodes[order]
+
+    def _links(self, node: int, level: int) -> np.ndarray:
+        links = self.layer0[node] if level == 0 else self.upper[node][level - 1]
+        return links[links >= 0]
+
+    def _set_links(self, node: int, level: int, neighbors: List[int]):
+        row = self.layer0[node] if level == 0 else self.upper[node][level - 1]
+        row[:] = -1
+        row[:len(neighbors)] = neighbors
+
+    def _connect(self, node: int, new: int, level: int, max_links: int):
+        links = self._links(node, level)
+        row = self.layer0[node] if level == 0 else self.upper[node][level - 1]
+        if len(links) < max_links:
+            row[len(links)] = new
+            return
+        # Full: the links already passed the heuristic, so only the new node
+        # is checked, against the links closer to `node` than it is. If it
+        # isn't pruned by one of them it replaces the farthest link.
+        vectors = self.vectors[links]
+        new_sim = float(self.vectors[new] @ self.vectors[node])
+        sims = vectors @ self.vectors[node]
+        closer = sims > new_sim
+        if not closer.any() or not ((vectors[closer] @ self.vectors[new]) >= new_sim).any():
+            worst = int(np.argmin(sims))
+            if sims[worst] < new_sim:
+                row[worst] = new
+
+    def _select(self, sims: np.ndarray, nodes: np.ndarray, limit: int) -> List[int]:
+        """HNSW neighbour heuristic: skip candidates closer to a chosen neighbour than to the query.
+
+        sims/nodes are sorted best first. Each chosen neighbour prunes every
+        remaining candidate it is closer to in one vector operation, so the
+        loop runs at most `limit` times however many candidates there are.
+        """
+        if len(nodes) <= limit:
+            return nodes.tolist()
+        vectors = self.vectors[nodes]
+        alive = np.ones(len(nodes), dtype=bool)
+        chosen: List[int] = []
+        while len(chosen) < limit:
+            i = int(np.argmax(alive))  # Best candidate not yet chosen or pruned
+            if not alive[i]:
+                break
+            chosen.append(i)
+            alive &= (vectors @ vectors[i]) < sims
+            alive[i] = False
+        if len(chosen) < limit:
+            # Fill up with the closest pruned candidates to keep the graph connected
+            pruned = np.ones(len(nodes), dtype=bool)
+            pruned[chosen] = False
+            chosen.extend(np.flatnonzero(pruned)[:limit - len(chosen)].tolist())
+        return nodes[chosen].tolist()
+
+    def _greedy(self, q: np.ndarray, ep: int, level: int) -> int:
+        best, best_sim = ep, float(self.vectors[ep] @ q)
+        improved = True
+        while improved:
+            improved = False
+            links = self._links(best, level)
+            if not len(links):
+                break
+            sims = self.vectors[links] @ q
+            i = int(np.argmax(sims))
+            if sims[i] > best_sim:
+                best, best_sim = int(links[i]), float(sims[i])
+                improved = True
+        return best
+
+    def _search_layer(self, q: np.ndarray, entry_points, ef: int, level: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Best-first search of one layer; returns (similarities, nodes) of the best ef, best first.
+
+        The ef best nodes found so far are kept as arrays. Each step expands
+        the EXPAND best of them not yet expanded: their unvisited links are
+        scored with one matrix product and merged with argpartition, so the
+        Python work is per step rather than per neighbour. Nodes that fall
+        out of the best ef are never expanded, which is where the usual
+        heap-based search stops as well.
+        """
+        self._visit_tag += 1
+        if self._visit_tag == np.iinfo(np.int32).max:
+            self._visited[:] = 0
+            self._visit_tag = 1
+        tag = self._visit_tag
+        visited = self._visited
+
+        nodes = np.unique(np.asarray(entry_points, dtype=np.int64))
+        visited[nodes] = tag
+        sims = self.vectors[nodes] @ q
+        expanded = np.zeros(len(nodes), dtype=bool)
+        if len(nodes) > ef:
+            keep = np.argpartition(-sims, ef - 1)[:ef]
+            nodes, sims, expanded = nodes[keep], sims[keep], expanded[keep]
+
+        while True:
+            open_ = np.flatnonzero(~expanded)
+            if not len(open_):
+                break
+            if len(open_) > EXPAND:
+                open_ = open_[np.argpartition(-sims[open_], EXPAND - 1)[:EXPAND]]
+            expanded[open_] = True
+            if level == 0:
+                links = self.layer0[nodes[open_]].ravel()
+            else:
+                links = np.concatenate([self.upper[node][level - 1] for node in nodes[open_].tolist()])
+            links = links[links >= 0]
+            links = np.unique(links[visited[links] != tag])
+            if not len(links):
+                continue
+            visited[links] = tag
+            link_sims = self.vectors[links] @ q
+            if len(nodes) >= ef:
+                keep = link_sims > sims.min()
+                links, link_sims = links[keep], link_sims[keep]
+                if not len(links):
+                    continue
+            nodes = np.concatenate((nodes, links))
+            sims = np.concatenate((sims, link_sims))
+            expanded = np.concatenate((expanded, np.zeros(len(links), dtype=bool)))
+            if len(nodes) > ef:
+                keep = np.argpartition(-sims, ef - 1)[:ef]
+                nodes, sims, expanded = nodes[keep], sims[keep], expanded[keep]
+
+        order = np.argsort(-sims)
+        return sims[order], nodes[order]
+
+    def _grow(self):
+        capacity = max(2 * len(self.vectors), 1024)
+        self.vectors = _resized(self.vectors, capacity, 0)
+        self.layer0 = _resized(self.layer0, capacity, -1)
+        self.levels = _resized(self.levels, capacity, 0)
+        self.deleted = _resized(self.deleted, capacity, False)
+        self._visited = np.zeros(capacity, dtype=np.int32)
+        self._visit_tag = 0
+
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def save(self, path: str, fingerprint: str = ""):
+        """Write the index as .npy files that load() can memory-map"""
+        with self._lock:
+            os.makedirs(path, exist_ok=True)
+            n = self.count
+            upper_nodes = np.array(sorted(self.upper), dtype=np.int32)
+            upper_links = (np.concatenate([self.upper[node] for node in upper_nodes])
+                           if len(upper_nodes) else np.zeros((0, self.m), dtype=np.int32))
+            np.save(os.path.join(path, "vectors.npy"), self.vectors[:n])
+            np.save(os.path.join(path, "layer0.npy"), self.layer0[:n])
+            np.save(os.path.join(path, "levels.npy"), self.levels[:n])
+            np.save(os.path.join(path, "deleted.npy"), self.deleted[:n])
+            np.save(os.path.join(path, "upper_nodes.npy"), upper_nodes)
+            np.save(os.path.join(path, "upper_links.npy"), upper_links)
+            np.save(os.path.join(path, "ids.npy"), np.array(self.ids, dtype=str))
+            with open(os.path.join(path, "meta.json"), "w") as f:
+                json.dump({
+                    "dim": self.dim, "m": self.m, "ef_construction": self.ef_construction,
+                    "entry_point": self.entry_point, "max_level": self.max_level,
+                    "fingerprint": fingerprint,
+                }, f)
+
+    @classmethod
+    def load(cls, path: str, ef_search: int = 128) -> "HNSWIndex":
+        """Memory-map a saved index; pages are copied only if the index is modified"""
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        index = cls(meta["dim"], meta["m"], meta["ef_construction"], ef_search, capacity=0)
+        index.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="c")
+        index.layer0 = np.load(os.path.join(path, "layer0.npy"), mmap_mode="c")
+        index.levels = np.load(os.path.join(path, "levels.npy"))
+        index.deleted = np.load(os.path.join(path, "deleted.npy"))
+        upper_nodes = np.load(os.path.join(path, "upper_nodes.npy"))
+        upper_links = np.load(os.path.join(path, "upper_links.npy"))
+        offset = 0
+        for node in upper_nodes.tolist():
+            level = int(index.levels[node])
+            index.upper[node] = upper_links[offset:offset + level].copy()
+            offset += level
+        index.ids = np.load(os.path.join(path, "ids.npy")).tolist()
+        index.slots = {doc_id: i for i, doc_id in enumerate(index.ids) if not index.deleted[i]}
+        index.count = len(index.ids)
+        index.entry_point = meta["entry_point"]
+        index.max_level = meta["max_level"]
+        index.fingerprint = meta.get("fingerprint", "")
+        index._visited = np.zeros(index.count, dtype=np.int32)
+        return index
+
+
+def read_fingerprint(path: str) -> Optional[str]:
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            return json.load(f).get("fingerprint")
+    except (OSError, ValueError):
+        return None
+
+
+def _resized(array: np.ndarray, capacity: int, fill) -> np.ndarray:
+    grown = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
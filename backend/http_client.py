@@ -0,0 +1,324 @@
+"""
+Shared upstream HTTP clients for Hugging Face and Gemini calls.
+
+Every call site goes through request()/post() (sync, one pooled
+requests.Session) or arequest()/astream() (async, one httpx.AsyncClient per
+event loop, HTTP/2 when the h2 package is installed). Both add:
+
+- keep-alive pools capped per upstream host (HTTP_MAX_PER_HOST)
+- retries with exponential backoff and jitter on 429/502/503/504 and
+  connection errors, honouring Retry-After and Hugging Face's "model is
+  currently loading" estimated_time, within HTTP_RETRY_BUDGET seconds
+  per call
+- a per-host circuit breaker: after HTTP_CIRCUIT_THRESHOLD consecutive
+  failed calls (a call that gave up after its retries counts once) calls
+  fail fast with CircuitOpenError for HTTP_CIRCUIT_RESET seconds, then one
+  trial call decides whether it closes again
+
+requests, httpx and asyncio are imported on first use: the Vercel handlers
+only make synchronous calls, and a cold start shouldn't pay for the async
+stack (or, for a cached answer, for any HTTP stack at all).
+"""
+import json
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Optional
+from urllib.parse import urlsplit
+
+from tracing import incr
+
+if TYPE_CHECKING:
+    import asyncio
+
+    import httpx
+    import requests
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", "20"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.5"))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "20"))
+# No retry is started that would end more than this many seconds after the
+# call began. The api/ handlers run on Vercel (VERCEL=1), where the whole
+# function is cut off after 10 s, so they get a much smaller default.
+HTTP_RETRY_BUDGET = float(os.getenv("HTTP_RETRY_BUDGET", "4" if os.getenv("VERCEL") else "30"))
+HTTP_CIRCUIT_THRESHOLD = int(os.getenv("HTTP_CIRCUIT_THRESHOLD", "5"))
+HTTP_CIRCUIT_RESET = float(os.getenv("HTTP_CIRCUIT_RESET", "30"))
+
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the upstream while its circuit is open"""
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int = HTTP_CIRCUIT_THRESHOLD, reset_after: float = HTTP_CIRCUIT_RESET):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_after else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            # Exactly one caller probes the upstream; a trial that never reported
+            # back expires after reset_after, like the open state itself
+            now = time.monotonic()
+            if state == "half-open" and (self._trial_at is None or now - self._trial_at >= self.reset_after):
+                self._trial_at = now
+                return True
+            return False
+
+    def release(self):
+        """The call stopped without an answer from the upstream (cancelled, or
+        raised something that isn't a transport error): the next caller probes"""
+        with self._lock:
+            self._trial_at = None
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial_at = None
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def breaker_for(url: str) -> CircuitBreaker:
+    host = urlsplit(url).netloc
+    breaker = _breakers.get(host)
+    if breaker is None:
+        breaker = _breakers.setdefault(host, CircuitBreaker())
+    return breaker
+
+
+def retry_delay(attempt: int, status: Optional[int] = None, headers=None, body: Optional[bytes] = None) -> float:
+    """Seconds to wait before retry number attempt + 1"""
+    if headers is not None:
+        retry_after = headers.get("retry-after")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), HTTP_BACKOFF_MAX)
+    if status == 503 and body and b"loading" in body:
+        # Hugging Face cold start: {"error": "Model ... is currently loading", "estimated_time": 20.0}
+        try:
+            estimated = float(json.loads(body).get("estimated_time", 0))
+            if estimated > 0:
+                return min(estimated, HTTP_BACKOFF_MAX)
+        except (ValueError, AttributeError):
+            pass
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF * 2 ** attempt))
+
+
+def _backoff(attempt: int, retries: int, deadline: float, *hints) -> Optional[float]:
+    """retry_delay() for the next attempt, or None if the call should give up instead"""
+    if attempt >= retries:
+        return None
+    delay = retry_delay(attempt, *hints)
+    return delay if time.monotonic() + delay <= deadline else None
+
+
+def _is_failure(status: int) -> bool:
+    return status in RETRY_STATUSES or status >= 500
+
+
+_session: Optional["requests.Session"] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> "requests.Session":
+    """Process-wide keep-alive session for synchronous callers (scripts, api/ handlers)"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=16, pool_maxsize=HTTP_MAX_PER_HOST)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def request(method: str, url: str, retries: int = HTTP_RETRIES, retry_budget: float = HTTP_RETRY_BUDGET,
+            **kwargs) -> "requests.Response":
+    """requests.request() on the shared session, with retries and circuit breaking"""
+    session = get_session()
+    import requests
+
+    host = urlsplit(url).netloc
+    breaker = breaker_for(url)
+    if not breaker.allow():
+        incr("circuit_open_rejections", host=host)
+        raise CircuitOpenError(f"Circuit open for {host}")
+    deadline = time.monotonic() + retry_budget
+    for attempt in range(retries + 1):
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            delay = _backoff(attempt, retries, deadline)
+            if delay is None:
+                breaker.record_failure()
+                raise
+            incr("http_retries", host=host)
+            time.sleep(delay)
+            continue
+        except BaseException:
+            breaker.release()
+            raise
+
+        if response.status_code in RETRY_STATUSES:
+            delay = _backoff(attempt, retries, deadline, response.status_code, response.headers, response.content)
+            if delay is not None:
+                response.close()
+                incr("http_retries", host=host)
+                time.sleep(delay)
+                continue
+        if _is_failure(response.status_code):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+
+def post(url: str, **kwargs) -> "requests.Response":
+    return request("POST", url, **kwargs)
+
+
+_client: Optional["httpx.AsyncClient"] = None
+_client_loop: Optional["asyncio.AbstractEventLoop"] = None
+_host_slots: Dict[str, "asyncio.Semaphore"] = {}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_async_client() -> "httpx.AsyncClient":
+    """Shared AsyncClient for the running event loop"""
+    global _client, _client_loop, _host_slots
+    import asyncio
+
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    # A client is tied to the loop it was created on; scripts that call
+    # asyncio.run() more than once get a fresh one per loop
+    if _client is None or _client_loop is not loop or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=_http2_available(),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=30.0
+            ),
+            timeout=httpx.Timeout(30.0, connect=5.0)
+        )
+        _client_loop = loop
+        _host_slots = {}
+    return _client
+
+
+def _host_slot(url: str) -> "asyncio.Semaphore":
+    """httpx only caps connections overall; this caps requests in flight per host"""
+    import asyncio
+
+    host = urlsplit(url).netloc
+    if host not in _host_slots:
+        _host_slots[host] = asyncio.Semaphore(HTTP_MAX_PER_HOST)
+    return _host_slots[host]
+
+
+@asynccontextmanager
+async def astream(method: str, url: str, retries: int = HTTP_RETRIES, retry_budget: float = HTTP_RETRY_BUDGET,
+                  **kwargs) -> AsyncIterator["httpx.Response"]:
+    """Streaming request with retries and circuit breaking; only the response head is retried"""
+    import asyncio
+
+    import httpx
+
+    client = get_async_client()
+    host = urlsplit(url).netloc
+    breaker = breaker_for(url)
+    async with _host_slot(url):
+        if not breaker.allow():
+            incr("circuit_open_rejections", host=host)
+            raise CircuitOpenError(f"Circuit open for {host}")
+        deadline = time.monotonic() + retry_budget
+        for attempt in range(retries + 1):
+            try:
+                response = await client.send(client.build_request(method, url, **kwargs), stream=True)
+            except httpx.TransportError:
+                delay = _backoff(attempt, retries, deadline)
+                if delay is None:
+                    breaker.record_failure()
+                    raise
+                incr("http_retries", host=host)
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+
+            if response.status_code in RETRY_STATUSES and attempt < retries:
+                body = await response.aread()
+                delay = _backoff(attempt, retries, deadline, response.status_code, response.headers, body)
+                if delay is not None:
+                    await response.aclose()
+                    incr("http_retries", host=host)
+                    await asyncio.sleep(delay)
+                    continue
+            if _is_failure(response.status_code):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            try:
+                yield response
+            finally:
+                await response.aclose()
+            return
+
+
+async def arequest(method: str, url: str, **kwargs) -> "httpx.Response":
+    """Async request with retries and circuit breaking; the body is read before returning"""
+    async with astream(method, url, **kwargs) as response:
+        await response.aread()
+        return response
+
+
+async def close_async_client():
+    global _client
+    import asyncio
+
+    if _client is not None and _client_loop is asyncio.get_running_loop():
+        await _client.aclose()
+    _client = None
@@ -1,9 +1,61 @@
 from db import Document, get_db
+from chunking import chunker, iter_pieces
 from embeddings import embedder
+from search import index_document, index_documents
+from answer_cache import bump_corpus_version
 from sqlalchemy.orm import Session
-from typing import Dict, Any
+from typing import Dict, Any, List
+
+EMBEDDING_BATCH_SIZE = 32
 
 def add_document(content: str, metadata: Dict[str, Any], db: Session):
+    chunks = chunker.chunks(iter_pieces(content))
+    first = next(chunks, content)
+    second = next(chunks, None)
+    if second is None:
+        # Fits in one chunk: a single row, as before
+        return _add_single(content, metadata, db)
+    
+    parent = Document(content=content, embedding=None, doc_metadata=metadata)
+    db.add(parent)
+    db.flush()
+    
+    ids, embeddings = [], []
+    batch = [first, second]
+    index = 0
+    try:
+        for chunk in chunks:
+            if len(batch) == EMBEDDING_BATCH_SIZE:
+                index = _add_chunks(parent, batch, index, metadata, db, ids, embeddings)
+                batch = []
+            batch.append(chunk)
+        _add_chunks(parent, batch, index, metadata, db, ids, embeddings)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    index_documents(ids, embeddings)
+    bump_corpus_version()
+    return str(parent.id)
+
+def _add_chunks(parent: Document, batch: List[str], index: int, metadata: Dict[str, Any], db: Session,
+                ids: List[str], embeddings: List[List[float]]) -> int:
+    """Embed one batch of chunks and write it; rows are expunged so a large upload isn't held in the session"""
+    batch_embeddings = embedder.get_embeddings(batch)
+    rows = [
+        Document(content=chunk, embedding=embedding, doc_metadata=metadata,
+                 parent_id=parent.id, chunk_index=index + i)
+        for i, (chunk, embedding) in enumerate(zip(batch, batch_embeddings))
+    ]
+    db.add_all(rows)
+    db.flush()
+    for row in rows:
+        ids.append(str(row.id))
+        db.expunge(row)
+    embeddings.extend(batch_embeddings)
+    return index + len(rows)
+
+def _add_single(content: str, metadata: Dict[str, Any], db: Session):
     embedding = embedder.get_embedding(content)
     
     doc = Document(
@@ -15,4 +67,6 @@ def add_document(content: str, metadata: Dict[str, Any], db: Session):
     db.add(doc)
     db.commit()
     db.refresh(doc)
+    index_document(doc.id, embedding)
+    bump_corpus_version()
     return str(doc.id)
\ No newline at end of file
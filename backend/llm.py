@@ -0,0 +1,59 @@
+import json
+import os
+from typing import AsyncIterator
+from http_client import arequest, astream
+from dotenv import load_dotenv
+
+load_dotenv()
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "models/gemini-1.5-flash-latest")
+# GEMINI_API_BASE can point at a local stand-in such as fake_inference_server.py
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta")
+
+
+def _request_body(prompt: str) -> dict:
+    return {"contents": [{"parts": [{"text": prompt}]}]}
+
+
+def _response_text(result: dict) -> str:
+    candidates = result.get("candidates") or []
+    if not candidates:
+        raise ValueError("Gemini returned no candidates")
+    parts = candidates[0].get("content", {}).get("parts", [])
+    return "".join(part.get("text", "") for part in parts)
+
+
+async def generate(prompt: str) -> str:
+    """Call Gemini's generateContent REST endpoint on the shared keep-alive client"""
+    response = await arequest(
+        "POST",
+        f"{GEMINI_API_BASE}/{GEMINI_MODEL}:generateContent",
+        params={"key": GEMINI_API_KEY},
+        json=_request_body(prompt),
+        timeout=30.0
+    )
+    response.raise_for_status()
+    return _response_text(response.json())
+
+
+async def stream_generate(prompt: str) -> AsyncIterator[str]:
+    """Yield answer text as Gemini produces it (streamGenerateContent over SSE).
+
+    Closing or cancelling the generator closes the upstream response, which
+    stops the generation.
+    """
+    async with astream(
+        "POST",
+        f"{GEMINI_API_BASE}/{GEMINI_MODEL}:streamGenerateContent",
+        params={"alt": "sse", "key": GEMINI_API_KEY},
+        json=_request_body(prompt),
+        timeout=30.0
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            text = _response_text(json.loads(line[5:]))
+            if text:
+                yield text
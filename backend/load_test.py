@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Load generator for POST /chat and POST /documents: replays a query corpus,
+sweeps load and reports where the target saturates.
+
+Two ways to apply load:
+
+  --mode concurrency  closed loop: N requests in flight at all times
+                      (--levels). Shows how throughput scales with
+                      concurrency.
+  --mode rate         open loop: Poisson arrivals at a fixed rate (--rates
+                      req/s, --duration seconds each). Latency is measured
+                      from the scheduled send time, so queueing behind a
+                      saturated server counts (no coordinated omission).
+
+The saturation point is the last level that still meets the SLO: p95 under
+--slo-ms, errors under --max-error-rate, and, for rate mode, at least 90% of
+the offered rate achieved. In concurrency mode the last level must also have
+added at least 10% throughput.
+
+Offline, with the fake inference server standing in for HuggingFace and
+Gemini and a local Postgres behind the target:
+
+    python fake_inference_server.py --port 8081 --latency-ms 40 --llm-latency-ms 200
+    EMBEDDING_API_URL=http://127.0.0.1:8081 GEMINI_API_BASE=http://127.0.0.1:8081 python main.py
+    python load_test.py --url http://127.0.0.1:8000 --levels 1,4,16,64
+    python load_test.py --url http://127.0.0.1:8000 --mode rate --rates 5,10,20,40 --slo-ms 1500
+
+The Vercel handler (api/chat.py) is served locally with the same
+environment variables, then targeted with --path /api/chat:
+
+    python load_test.py serve-vercel --port 3000
+    python load_test.py --url http://127.0.0.1:3000 --path /api/chat --mode rate --rates 2,4,8
+
+--endpoint documents posts generated documents to /documents instead.
+--queries replays a corpus file (one query per line, or JSONL with a
+"query" field). --output saves every level's results as JSON.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+QUERIES = [
+    "How do I apply Navyakosh fertilizer to sugarcane?",
+    "What is the recommended dosage for wheat crops?",
+    "Which crops benefit most from organic manure?",
+    "When is the best time to apply fertilizer?",
+    "How does soil pH affect nutrient uptake?",
+    "What are the benefits of micronutrient mixtures?",
+    "Can Navyakosh be mixed with pesticides?",
+    "How should fertilizer be stored during monsoon?",
+]
+
+Body = Callable[[int], Dict[str, Any]]
+
+
+def load_queries(path: str) -> List[str]:
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            queries.append(json.loads(line)["query"] if line.startswith("{") else line)
+    return queries
+
+
+def chat_body(queries: List[str], vary: bool = True) -> Body:
+    def body(i: int) -> Dict[str, Any]:
+        query = queries[i % len(queries)]
+        # Vary the query so the embedding and answer caches don't hide the pipeline
+        return {"query": f"{query} (request {i})" if vary else query}
+    return body
+
+
+def document_body(queries: List[str]) -> Body:
+    def body(i: int) -> Dict[str, Any]:
+        return {"content": f"Load test document {i}. {queries[i % len(queries)]}",
+                "metadata": {"source": "load_test"}}
+    return body
+
+
+def _percentile(timings: List[float], fraction: float) -> float:
+    timings = sorted(timings)
+    return timings[min(int(len(timings) * fraction), len(timings) - 1)]
+
+
+def _summary(timings: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    total = len(timings) + errors
+    return {
+        "throughput": len(timings) / elapsed if elapsed else 0.0,
+        "p50": _percentile(timings, 0.5) if timings else 0.0,
+        "p95": _percentile(timings, 0.95) if timings else 0.0,
+        "p99": _percentile(timings, 0.99) if timings else 0.0,
+        "max": max(timings) if timings else 0.0,
+        "errors": errors,
+        "error_rate": errors / total if total else 0.0,
+        "timings": timings,
+    }
+
+
+async def _send(client: httpx.AsyncClient, url: str, body: Dict[str, Any]) -> None:
+    response = await client.post(url, json=body)
+    response.raise_for_status()
+
+
+async def run_level(client: httpx.AsyncClient, url: str, concurrency: int, total: int,
+                    path: str = "/chat", make_body: Optional[Body] = None) -> dict:
+    """Send `total` requests with `concurrency` in flight at any time"""
+    make_body = make_body or chat_body(QUERIES)
+    timings: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                await _send(client, f"{url}{path}", make_body(i))
+                timings.append((time.perf_counter() - start) * 1000)
+            except httpx.HTTPError:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"concurrency": concurrency, **_summary(timings, errors, time.perf_counter() - start)}
+
+
+async def run_rate(client: httpx.AsyncClient, url: str, rate: float, duration: float,
+                   path: str = "/chat", make_body: Optional[Body] = None,
+                   max_in_flight: int = 1000, seed: int = 0) -> dict:
+    """Open loop: Poisson arrivals at `rate` req/s for `duration` seconds.
+
+    Each request's latency runs from when it was scheduled, not when it was
+    actually sent. Arrivals beyond max_in_flight outstanding requests are
+    dropped and counted as errors.
+    """
+    make_body = make_body or chat_body(QUERIES)
+    rng = random.Random(seed)
+    timings: List[float] = []
+    errors = 0
+    in_flight = 0
+    tasks = set()
+
+    async def fire(i: int, scheduled: float):
+        nonlocal errors, in_flight
+        try:
+            await _send(client, f"{url}{path}", make_body(i))
+            timings.append((time.perf_counter() - scheduled) * 1000)
+        except httpx.HTTPError:
+            errors += 1
+        finally:
+            in_flight -= 1
+
+    start = time.perf_counter()
+    scheduled = start
+    i = 0
+    while True:
+        scheduled += rng.expovariate(rate)
+        if scheduled - start > duration:
+            break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if in_flight >= max_in_flight:
+            errors += 1
+        else:
+            in_flight += 1
+            task = asyncio.ensure_future(fire(i, scheduled))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        i += 1
+    await asyncio.gather(*tasks)
+    # Poisson arrivals over a short window stray from `rate`; judge against what was offered
+    return {"rate": rate, "offered": i / duration, **_summary(timings, errors, time.perf_counter() - start)}
+
+
+def meets_slo(result: Dict[str, Any], slo_ms: float, max_error_rate: float) -> bool:
+    if result["p95"] > slo_ms or result["error_rate"] > max_error_rate:
+        return False
+    return "rate" not in result or result["throughput"] >= 0.9 * result["offered"]
+
+
+def saturation_point(results: List[Dict[str, Any]], slo_ms: float, max_error_rate: float) -> Optional[Dict[str, Any]]:
+    """The last level before the SLO breaks or, for concurrency sweeps, before throughput stops growing"""
+    best = None
+    for result in results:
+        if not meets_slo(result, slo_ms, max_error_rate):
+            break
+        if best is not None and "concurrency" in result and result["throughput"] < 1.1 * best["throughput"]:
+            break
+        best = result
+    return best
+
+
+async def sweep(url: str, mode: str, levels: List[float], requests_per_level: int, duration: float,
+                path: str, make_body: Body, slo_ms: float, max_error_rate: float) -> Dict[str, Any]:
+    connections = int(max(levels)) if mode == "concurrency" else 1000
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=min(connections, 100))
+    async with httpx.AsyncClient(limits=limits, timeout=60.0) as client:
+        try:
+            await _send(client, f"{url}{path}", make_body(-1))  # Warm up pools and caches
+        except httpx.HTTPError as e:
+            print(f"⚠️ Warm-up request failed: {e}")
+
+        if mode == "concurrency":
+            print(f"{'conc':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'err %':>6} {'scaling':>8}")
+        else:
+            print(f"{'rate':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'err %':>6} {'SLO':>4}")
+        baseline = None
+        results = []
+        for level in levels:
+            if mode == "concurrency":
+                total = max(requests_per_level, int(level) * 4)
+                result = await run_level(client, url, int(level), total, path, make_body)
+                baseline = baseline or result["throughput"] or 1.0
+                tail = f"{result['throughput'] / baseline:>7.1f}x"
+            else:
+                result = await run_rate(client, url, level, duration, path, make_body)
+                tail = f"{'ok' if meets_slo(result, slo_ms, max_error_rate) else 'miss':>4}"
+            print(f"{level:>6g} {result['throughput']:>8.1f} {result['p50']:>8.0f} {result['p95']:>8.0f} "
+                  f"{result['p99']:>8.0f} {result['error_rate'] * 100:>6.1f} {tail}")
+            results.append(result)
+
+    point = saturation_point(results, slo_ms, max_error_rate)
+    if point is None:
+        print(f"\n⚠️ Even the lowest level misses the SLO (p95 < {slo_ms:.0f} ms, errors < {max_error_rate:.0%})")
+    else:
+        label = f"{point['concurrency']} concurrent" if mode == "concurrency" else f"{point['rate']:g} req/s offered"
+        print(f"\n📈 Saturation point: {label}, {point['throughput']:.1f} req/s at p95 {point['p95']:.0f} ms")
+    return {"mode": mode, "path": path, "slo_ms": slo_ms, "max_error_rate": max_error_rate,
+            "saturation": {key: value for key, value in point.items() if key != "timings"} if point else None,
+            "levels": [{key: value for key, value in result.items() if key != "timings"} for result in results]}
+
+
+def serve_vercel(port: int):
+    """Serve api/chat.py's handler at /api/chat, the way `vercel dev` would"""
+    import os
+    from http.server import ThreadingHTTPServer
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from api.chat import handler
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    print(f"🧪 api/chat.py handler listening on http://127.0.0.1:{port}/api/chat")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "serve-vercel":
+        serve_parser = argparse.ArgumentParser(description="Serve api/chat.py locally")
+        serve_parser.add_argument("--port", type=int, default=3000)
+        serve_vercel(serve_parser.parse_args(sys.argv[2:]).port)
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Load sweep against POST /chat or /documents")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", choices=["chat", "documents"], default="chat")
+    parser.add_argument("--path", help="Defaults to /chat or /documents (use /api/chat for the Vercel handler)")
+    parser.add_argument("--mode", choices=["concurrency", "rate"], default="concurrency")
+    parser.add_argument("--levels", default="1,2,4,8,16,32,64", help="Concurrency levels (closed loop)")
+    parser.add_argument("--rates", default="1,2,5,10,20,40", help="Arrival rates in req/s (open loop)")
+    parser.add_argument("--requests", type=int, default=64, help="Minimum requests per concurrency level")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per arrival rate")
+    parser.add_argument("--queries", help="Query corpus: one per line, or JSONL with a 'query' field")
+    parser.add_argument("--repeat", action="store_true", help="Send queries verbatim so caches can hit")
+    parser.add_argument("--slo-ms", type=float, default=2000.0, help="p95 latency objective")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--output", help="Save the sweep as JSON")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries) if args.queries else QUERIES
+    if args.endpoint == "documents":
+        make_body = document_body(queries)
+    else:
+        make_body = chat_body(queries, vary=not args.repeat)
+    path = args.path or f"/{args.endpoint}"
+    levels = [float(level) for level in (args.levels if args.mode == "concurrency" else args.rates).split(",")]
+
+    print(f"🏁 LOAD TEST: {args.mode} sweep against {args.url}{path}")
+    print("=" * 60)
+    report = asyncio.run(sweep(args.url, args.mode, levels, args.requests, args.duration,
+                               path, make_body, args.slo_ms, args.max_error_rate))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results saved to {args.output}")
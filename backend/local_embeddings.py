@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+In-process CPU embeddings for all-MiniLM-L6-v2 / bge-small-en-v1.5 via ONNX Runtime.
+
+The model directory holds an ONNX export plus its tokenizer:
+
+    model.onnx              (or onnx/model.onnx, as published on the HF hub)
+    tokenizer.json
+    1_Pooling/config.json   (optional, picks CLS or mean pooling)
+
+Fetch one once with:
+
+    python local_embeddings.py download BAAI/bge-small-en-v1.5 models/bge-small-en-v1.5
+"""
+import json
+import os
+import sys
+import threading
+from typing import List, Optional
+
+
+class LocalEmbeddingModel:
+    """Lazily loaded ONNX sentence embedder with batched, dynamically padded inference"""
+
+    def __init__(self, model_dir: str, pooling: Optional[str] = None, max_length: int = 256,
+                 batch_size: int = 32, threads: Optional[int] = None):
+        self.model_dir = model_dir
+        self.pooling = pooling
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.threads = threads
+        self._session = None
+        self._tokenizer = None
+        self._input_names = set()
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._session is not None:
+            return
+        with self._lock:
+            if self._session is not None:
+                return
+            try:
+                import onnxruntime as ort
+                from tokenizers import Tokenizer
+            except ImportError as e:
+                raise ImportError("Local embeddings need numpy, onnxruntime and tokenizers installed") from e
+
+            model_path = os.path.join(self.model_dir, "model.onnx")
+            if not os.path.exists(model_path):
+                model_path = os.path.join(self.model_dir, "onnx", "model.onnx")
+
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if self.threads:
+                options.intra_op_num_threads = self.threads
+            session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+            tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+            tokenizer.enable_truncation(max_length=self.max_length)
+            tokenizer.no_padding()  # We pad per batch instead
+
+            if self.pooling is None:
+                self.pooling = self._detect_pooling()
+
+            self._tokenizer = tokenizer
+            self._input_names = {i.name for i in session.get_inputs()}
+            self._session = session
+
+    def _detect_pooling(self) -> str:
+        config_path = os.path.join(self.model_dir, "1_Pooling", "config.json")
+        if os.path.exists(config_path):
+            with open(config_path) as f:
+                config = json.load(f)
+            if config.get("pooling_mode_cls_token"):
+                return "cls"
+            return "mean"
+        # bge models use the CLS token, sentence-transformers models mean-pool
+        return "cls" if "bge" in os.path.basename(os.path.normpath(self.model_dir)).lower() else "mean"
+
+    def embed(self, texts: List[str]):
+        """Return an (n, dim) float32 array of L2-normalized embeddings"""
+        import numpy as np
+
+        self._load()
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        encodings = self._tokenizer.encode_batch(texts)
+        # Sort by length so each batch pads only to its own longest text
+        order = sorted(range(len(texts)), key=lambda i: len(encodings[i].ids))
+        result = None
+
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            width = max(len(encodings[i].ids) for i in batch)
+            input_ids = np.zeros((len(batch), width), dtype=np.int64)
+            attention_mask = np.zeros((len(batch), width), dtype=np.int64)
+            for row, i in enumerate(batch):
+                ids = encodings[i].ids
+                input_ids[row, :len(ids)] = ids
+                attention_mask[row, :len(ids)] = 1
+
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self._input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+            output = self._session.run(None, feeds)[0]
+
+            if output.ndim == 2:
+                pooled = output  # Export already includes pooling
+            elif self.pooling == "cls":
+                pooled = output[:, 0]
+            else:
+                mask = attention_mask[:, :, None].astype(output.dtype)
+                pooled = (output * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+            pooled = pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            if result is None:
+                result = np.empty((len(texts), pooled.shape[1]), dtype=np.float32)
+            result[batch] = pooled
+
+        return result
+
+
+def download_model(model_id: str, target_dir: str):
+    """Fetch the ONNX export and tokenizer of a HF hub model"""
+    import requests
+
+    files = ["onnx/model.onnx", "tokenizer.json", "1_Pooling/config.json"]
+    for name in files:
+        url = f"https://huggingface.co/{model_id}/resolve/main/{name}"
+        response = requests.get(url, stream=True, timeout=60)
+        if response.status_code != 200:
+            print(f"⚠️ Skipping {name}: HTTP {response.status_code}")
+            continue
+        path = os.path.join(target_dir, "model.onnx" if name.endswith(".onnx") else name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                f.write(chunk)
+        print(f"✅ {name} -> {path}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "download":
+        download_model(sys.argv[2], sys.argv[3])
+    else:
+        print("Usage: python local_embeddings.py download <model_id> <target_dir>")
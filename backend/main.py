@@ -1,13 +1,22 @@
-from fastapi import Depends, FastAPI, HTTPException, Response, status
+import io
+from fastapi import Depends, FastAPI, File, HTTPException, Request, Response, UploadFile, status
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from fastapi.responses import RedirectResponse
-from typing import Dict, Any
+from fastapi.responses import RedirectResponse, StreamingResponse
+from typing import Dict, Any, List
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from db import get_db, init_db, Document
+from db import get_db, get_async_db, init_db, Document, SessionLocal, async_engine, engine
+from http_client import close_async_client
 from ingest import add_document
-from chat import get_rag_response
+from bulk_ingest import bulk_ingest, detect_format, iter_documents
+from embeddings import generator
+from answer_cache import bump_corpus_version
+from shared_state import WORKERS
+from tracing import render_prometheus, request_trace
+from chat import get_rag_response, stream_rag_response
+from search import SEARCH_BACKEND, asearch_similar_documents, metadata_conditions, load_vector_index, save_vector_index, clear_vector_index, index_documents
 
 app = FastAPI()
 
@@ -19,12 +28,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Pipeline endpoints get one trace (and, with TRACE_LOG=json, one log line) per request
+TRACED_PATHS = {"/chat", "/search", "/documents", "/documents/bulk"}
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    if request.url.path not in TRACED_PATHS:
+        return await call_next(request)
+    # For streamed chats this covers the time to the first byte; the
+    # generate and first_token stages cover the rest
+    with request_trace("request", method=request.method, path=request.url.path) as trace:
+        response = await call_next(request)
+        trace.fields["status"] = response.status_code
+        return response
+
 class DocumentRequest(BaseModel):
     content: str
     metadata: Dict[str, Any] = {}
 
 class ChatRequest(BaseModel):
     query: str
+    stream: bool = False
+    filters: Dict[str, Any] = {}
+
+class SearchRequest(BaseModel):
+    query: str
+    top_k: int = 5
+    filters: Dict[str, Any] = {}
 
 class DocumentResponse(BaseModel):
     document_id: str
@@ -32,9 +62,25 @@ class DocumentResponse(BaseModel):
 class ChatResponse(BaseModel):
     response: str
 
+class SearchResult(BaseModel):
+    id: str
+    score: float
+    content: str
+    metadata: Dict[str, Any]
+
 @app.on_event("startup")
 async def startup():
     init_db()
+    if SEARCH_BACKEND in ("hnsw", "numpy"):
+        with SessionLocal() as db:
+            load_vector_index(db)
+
+@app.on_event("shutdown")
+async def shutdown():
+    with SessionLocal() as db:
+        save_vector_index(db)
+    await async_engine.dispose()
+    await close_async_client()
 
 @app.get("/")
 async def root():
@@ -46,6 +92,11 @@ async def health():
     """Health check endpoint."""
     return {"status": "healthy"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Stage latency histograms and counters in Prometheus text format"""
+    return Response(render_prometheus(), media_type="text/plain; version=0.0.4")
+
 @app.get("/favicon.ico", include_in_schema=False)
 async def favicon():
     """Handles browser's request for a favicon."""
@@ -59,13 +110,61 @@ def create_document(request: DocumentRequest, db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _on_bulk_commit(doc_ids, embeddings):
+    index_documents(doc_ids, embeddings)
+    bump_corpus_version()
+
+@app.post("/documents/bulk")
+def create_documents_bulk(file: UploadFile = File(...), content_column: str = "content", method: str = "copy"):
+    """Bulk-load a JSONL or CSV upload with batched embeddings and COPY"""
+    try:
+        documents = iter_documents(
+            io.TextIOWrapper(file.file, encoding="utf-8", newline=""),
+            detect_format(file.filename or ""),
+            content_column
+        )
+        conn = engine.raw_connection()
+        try:
+            return bulk_ingest(conn, documents, generator.get_embeddings, method=method, on_commit=_on_bulk_commit)
+        finally:
+            conn.close()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest, db: Session = Depends(get_db)):
+async def chat(request: ChatRequest, db: AsyncSession = Depends(get_async_db)):
+    if request.stream:
+        try:
+            metadata_conditions(request.filters)  # Reject bad filters before the stream starts
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        # Starlette cancels the generator when the client disconnects
+        return StreamingResponse(
+            stream_rag_response(request.query, request.filters),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
     try:
-        response = await get_rag_response(request.query, db)
+        response = await get_rag_response(request.query, db, request.filters)
         return ChatResponse(response=response)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/search", response_model=List[SearchResult])
+async def search(request: SearchRequest, db: AsyncSession = Depends(get_async_db)):
+    """Retrieval only; filters restrict results to documents whose metadata matches"""
+    try:
+        results = await asearch_similar_documents(request.query, db, request.top_k, filters=request.filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return [
+        SearchResult(id=str(doc.id), score=score, content=doc.content, metadata=doc.doc_metadata or {})
+        for doc, score in results
+    ]
 
 @app.delete("/documents")
 def delete_all_documents(db: Session = Depends(get_db)):
@@ -73,6 +172,8 @@ def delete_all_documents(db: Session = Depends(get_db)):
         count = db.query(Document).count()
         db.query(Document).delete()
         db.commit()
+        clear_vector_index()
+        bump_corpus_version()
         return {"message": f"Deleted {count} documents from database"}
     except Exception as e:
         db.rollback()
@@ -82,4 +183,9 @@ if __name__ == "__main__":
     import uvicorn
     import os
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
+    if WORKERS > 1:
+        # Separate processes sharing the vector index, embedding cache and
+        # corpus version through files; see shared_state.py
+        uvicorn.run("main:app", host="0.0.0.0", port=port, workers=WORKERS, log_level="info")
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Build and tune the pgvector index on documents.embedding.
+
+    python manage_index.py build [--method hnsw|ivfflat] [--concurrently]
+    python manage_index.py bench [--k 5] [--queries 100] [--values 10,20,40]
+
+`build` runs after loading: ivfflat centroids are trained on the rows that
+exist when the index is created, so an index made on an empty table is
+useless. Parameters are sized to the row count unless given explicitly.
+
+`bench` measures recall@k against exact search and query latency for a
+range of hnsw.ef_search (or ivfflat.probes) values, using stored
+embeddings as queries. Put the chosen value in PGVECTOR_EF_SEARCH or
+PGVECTOR_PROBES; db.py applies it to every connection.
+"""
+import argparse
+import math
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_VALUES = {
+    "hnsw": [10, 20, 40, 80, 160, 320],
+    "ivfflat": [1, 2, 4, 8, 16, 32, 64],
+}
+SEARCH_SETTING = {"hnsw": "hnsw.ef_search", "ivfflat": "ivfflat.probes"}
+
+
+def ivfflat_lists(rows: int) -> int:
+    """pgvector's guidance: rows / 1000 up to 1M rows, sqrt(rows) beyond"""
+    if rows <= 1000000:
+        return max(1, rows // 1000)
+    return int(math.sqrt(rows))
+
+
+def ivfflat_probes(lists: int) -> int:
+    return max(1, round(math.sqrt(lists)))
+
+
+def hnsw_params(rows: int) -> Tuple[int, int]:
+    """(m, ef_construction): denser graphs for larger tables keep recall up at the same ef_search"""
+    if rows <= 1000000:
+        return 16, 64
+    if rows <= 10000000:
+        return 24, 128
+    return 32, 200
+
+
+def count_embedded(cursor, table: str = "documents") -> int:
+    cursor.execute(f"SELECT count(*) FROM {table} WHERE embedding IS NOT NULL")
+    return cursor.fetchone()[0]
+
+
+def vector_indexes(cursor, table: str = "documents") -> List[Tuple[str, str]]:
+    """(name, method) of every hnsw/ivfflat index on the table"""
+    cursor.execute(
+        "SELECT indexname, substring(indexdef from 'USING (hnsw|ivfflat)') FROM pg_indexes "
+        "WHERE schemaname = current_schema() AND tablename = %s AND indexdef ~ 'USING (hnsw|ivfflat)'",
+        (table,)
+    )
+    return cursor.fetchall()
+
+
+def index_options(method: str, rows: int, m: Optional[int] = None, ef_construction: Optional[int] = None,
+                  lists: Optional[int] = None) -> Dict[str, int]:
+    if method == "hnsw":
+        default_m, default_ef = hnsw_params(rows)
+        return {"m": m or default_m, "ef_construction": ef_construction or default_ef}
+    if method == "ivfflat":
+        return {"lists": lists or ivfflat_lists(rows)}
+    raise ValueError(f"Unknown index method: {method}")
+
+
+def index_statement(name: str, method: str, options: Dict[str, int], table: str = "documents",
+                    concurrently: bool = False) -> str:
+    with_clause = ", ".join(f"{key} = {int(value)}" for key, value in options.items())
+    return (f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {name} "
+            f"ON {table} USING {method} (embedding vector_cosine_ops) WITH ({with_clause})")
+
+
+def build_index(conn, method: str = "hnsw", table: str = "documents", concurrently: bool = False,
+                **params) -> Dict[str, Any]:
+    """Replace the table's vector index with one sized to the current row count.
+
+    The new index is built under a temporary name before the old one is
+    dropped, so searches stay indexed throughout; with concurrently=True
+    writes aren't blocked either. Runs in autocommit mode.
+    """
+    conn.autocommit = True
+    cursor = conn.cursor()
+    try:
+        rows = count_embedded(cursor, table)
+        options = index_options(method, rows, **params)
+        name = f"ix_{table}_embedding_{method}"
+        cursor.execute("SET maintenance_work_mem = %s", (os.getenv("INDEX_MAINTENANCE_WORK_MEM", "512MB"),))
+
+        start = time.perf_counter()
+        cursor.execute(f"DROP INDEX IF EXISTS {name}_new")
+        cursor.execute(index_statement(f"{name}_new", method, options, table, concurrently))
+        for old, _ in vector_indexes(cursor, table):
+            if old != f"{name}_new":
+                cursor.execute(f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}{old}")
+        cursor.execute(f"ALTER INDEX {name}_new RENAME TO {name}")
+        cursor.execute(f"ANALYZE {table}")
+        seconds = time.perf_counter() - start
+    finally:
+        cursor.close()
+    return {"index": name, "method": method, "rows": rows, "options": options, "seconds": round(seconds, 1)}
+
+
+def ensure_vector_index(conn, method: str = "hnsw", table: str = "documents") -> Optional[str]:
+    """Create an index sized to the loaded rows if the table has none; runs in the caller's transaction"""
+    cursor = conn.cursor()
+    try:
+        if vector_indexes(cursor, table):
+            return None
+        name = f"ix_{table}_embedding_{method}"
+        cursor.execute(index_statement(name, method, index_options(method, count_embedded(cursor, table)), table))
+        return name
+    finally:
+        cursor.close()
+
+
+def _percentiles(timings: List[float]) -> Tuple[float, float]:
+    timings = sorted(timings)
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+
+
+def benchmark(conn, k: int = 5, queries: int = 100, values: Optional[List[int]] = None,
+              table: str = "documents") -> List[Dict[str, float]]:
+    """Recall@k and latency of the indexed search for each ef_search/probes value"""
+    cursor = conn.cursor()
+    try:
+        indexes = vector_indexes(cursor, table)
+        if not indexes:
+            raise RuntimeError(f"{table} has no vector index; run `manage_index.py build` first")
+        method = indexes[0][1]
+        cursor.execute(f"SELECT embedding::text FROM {table} WHERE embedding IS NOT NULL ORDER BY random() LIMIT %s",
+                       (queries,))
+        samples = [row[0] for row in cursor.fetchall()]
+        search = f"SELECT id FROM {table} WHERE embedding IS NOT NULL ORDER BY embedding <=> %s::vector LIMIT %s"
+
+        # Ground truth: the same query with index scans disabled is an exact scan
+        cursor.execute("SET LOCAL enable_indexscan = off")
+        exact = []
+        for sample in samples:
+            cursor.execute(search, (sample, k))
+            exact.append({row[0] for row in cursor.fetchall()})
+        conn.rollback()
+
+        results = []
+        for value in values or DEFAULT_VALUES[method]:
+            cursor.execute(f"SET LOCAL {SEARCH_SETTING[method]} = %s", (value,))
+            timings, recalls = [], []
+            for sample, truth in zip(samples, exact):
+                start = time.perf_counter()
+                cursor.execute(search, (sample, k))
+                found = {row[0] for row in cursor.fetchall()}
+                timings.append((time.perf_counter() - start) * 1000)
+                recalls.append(len(found & truth) / max(len(truth), 1))
+            conn.rollback()
+            p50, p95 = _percentiles(timings)
+            results.append({"method": method, "setting": SEARCH_SETTING[method], "value": value,
+                            "recall": sum(recalls) / len(recalls), "p50_ms": p50, "p95_ms": p95})
+        return results
+    finally:
+        cursor.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and benchmark the pgvector index")
+    parser.add_argument("--table", default="documents")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="(Re)build the vector index sized to the current rows")
+    build.add_argument("--method", choices=["hnsw", "ivfflat"], default="hnsw")
+    build.add_argument("--m", type=int, help="HNSW links per node")
+    build.add_argument("--ef-construction", type=int, help="HNSW build-time candidate list")
+    build.add_argument("--lists", type=int, help="ivfflat clusters")
+    build.add_argument("--concurrently", action="store_true", help="Don't block writes while building")
+    bench = commands.add_parser("bench", help="Recall@k and latency per ef_search/probes value")
+    bench.add_argument("--k", type=int, default=5)
+    bench.add_argument("--queries", type=int, default=100)
+    bench.add_argument("--values", help="Comma-separated ef_search or probes values")
+    args = parser.parse_args()
+
+    import psycopg2
+
+    database_url = os.getenv("DATABASE_URL", os.getenv("NEON_DATABASE_URL"))
+    if not database_url:
+        sys.exit("❌ Set DATABASE_URL or NEON_DATABASE_URL")
+
+    conn = psycopg2.connect(database_url)
+    try:
+        if args.command == "build":
+            print(f"🔨 BUILD {args.method.upper()} INDEX on {args.table}")
+            print("=" * 60)
+            stats = build_index(conn, args.method, args.table, args.concurrently,
+                                m=args.m, ef_construction=args.ef_construction, lists=args.lists)
+            print(f"✅ {stats['index']} over {stats['rows']} rows {stats['options']} in {stats['seconds']} s")
+            if args.method == "ivfflat":
+                print(f"   Suggested PGVECTOR_PROBES={ivfflat_probes(stats['options']['lists'])}; "
+                      f"check with `manage_index.py bench`")
+        else:
+            values = [int(value) for value in args.values.split(",")] if args.values else None
+            results = benchmark(conn, args.k, args.queries, values, args.table)
+            print(f"🏁 VECTOR INDEX BENCHMARK ({results[0]['method']}, {args.queries} queries, recall@{args.k})")
+            print("=" * 60)
+            for result in results:
+                print(f"   {result['setting']} = {result['value']:<4}  recall {result['recall']:.3f}  "
+                      f"p50 {result['p50_ms']:6.2f} ms  p95 {result['p95_ms']:6.2f} ms")
+    finally:
+        conn.close()
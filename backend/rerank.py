@@ -0,0 +1,217 @@
+"""
+Second-stage reranking of retrieved chunks.
+
+The retriever over-fetches RERANK_CANDIDATES chunks; a reranker rescores
+them against the query and keeps the best RERANK_TOP_K that fit in
+RERANK_TOKEN_BUDGET, so the prompt carries fewer, better chunks.
+
+RERANKER picks the scorer:
+    none           - keep the retriever's order (default)
+    bm25           - blend the retrieval score with BM25 over the candidates
+    cross-encoder  - ONNX cross-encoder from RERANKER_MODEL_DIR, e.g.
+                     python local_embeddings.py download cross-encoder/ms-marco-MiniLM-L-6-v2 models/ms-marco-MiniLM-L-6-v2
+"""
+import asyncio
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from context import Excerpt, select_within_budget
+
+_WORD = re.compile(r"\w+")
+
+Candidate = Tuple[Any, float]  # (Document, retrieval score); anything with .content works
+
+
+class Reranker:
+    """Orders candidates by scores() and trims them to top_k and the token budget"""
+
+    blocking = True  # Scoring is heavy enough to move off the event loop
+
+    def __init__(self, top_k: int = 5, token_budget: int = 1500):
+        self.top_k = top_k
+        self.token_budget = token_budget
+
+    def scores(self, query: str, candidates: Sequence[Candidate]) -> np.ndarray:
+        raise NotImplementedError
+
+    def scores_batch(self, queries: Sequence[str], candidate_lists: Sequence[Sequence[Candidate]]) -> List[np.ndarray]:
+        return [self.scores(query, candidates) for query, candidates in zip(queries, candidate_lists)]
+
+    def rerank(self, query: str, candidates: Sequence[Candidate]) -> List[Candidate]:
+        if not candidates:
+            return []
+        return self._select(candidates, self.scores(query, candidates))
+
+    def rerank_batch(self, queries: Sequence[str], candidate_lists: Sequence[Sequence[Candidate]]) -> List[List[Candidate]]:
+        """Rerank several queries' candidates with one scoring pass"""
+        return [self._select(candidates, scores) if candidates else []
+                for candidates, scores in zip(candidate_lists, self.scores_batch(queries, candidate_lists))]
+
+    async def arerank(self, query: str, candidates: Sequence[Candidate]) -> List[Candidate]:
+        if self.blocking:
+            return await asyncio.to_thread(self.rerank, query, candidates)
+        return self.rerank(query, candidates)
+
+    def _select(self, candidates: Sequence[Candidate], scores: np.ndarray) -> List[Candidate]:
+        """Best first, up to top_k and token_budget; a best chunk alone over budget is cut to fit"""
+        texts = [doc.content for doc, _ in candidates]
+        order = np.argsort(-scores, kind="stable").tolist()
+        return [(candidates[i][0] if text is texts[i] else Excerpt(candidates[i][0], text), float(scores[i]))
+                for i, text in select_within_budget(texts, order, self.token_budget, self.top_k)]
+
+
+class BM25Reranker(Reranker):
+    """BM25 over the candidate set blended with the retrieval score.
+
+    Rewards chunks that contain the query's exact terms (product names,
+    "NPK", "ratoon"), which is where embeddings are weakest. Microseconds
+    per candidate, so it runs inline.
+    """
+
+    blocking = False
+
+    def __init__(self, weight: float = 0.3, k1: float = 1.5, b: float = 0.75, **kwargs):
+        super().__init__(**kwargs)
+        self.weight = weight
+        self.k1 = k1
+        self.b = b
+
+    def scores(self, query: str, candidates: Sequence[Candidate]) -> np.ndarray:
+        terms = set(_WORD.findall(query.lower()))
+        docs = [Counter(_WORD.findall(doc.content.lower())) for doc, _ in candidates]
+        lengths = np.array([sum(doc.values()) for doc in docs], dtype=np.float64)
+        avg_length = max(lengths.mean(), 1.0)
+
+        bm25 = np.zeros(len(docs))
+        for term in terms:
+            frequencies = np.array([doc[term] for doc in docs], dtype=np.float64)
+            matches = np.count_nonzero(frequencies)
+            if not matches:
+                continue
+            idf = math.log(1 + (len(docs) - matches + 0.5) / (matches + 0.5))
+            bm25 += idf * frequencies * (self.k1 + 1) / (
+                frequencies + self.k1 * (1 - self.b + self.b * lengths / avg_length))
+
+        if bm25.max() > 0:
+            bm25 /= bm25.max()
+        retrieval = np.array([score for _, score in candidates], dtype=np.float64)
+        return (1 - self.weight) * retrieval + self.weight * bm25
+
+
+class CrossEncoderReranker(Reranker):
+    """ONNX cross-encoder scoring (query, chunk) pairs jointly; scores are probabilities.
+
+    All pairs of a call, across queries for scores_batch(), go through
+    inference together, sorted by length and padded per batch.
+    """
+
+    def __init__(self, model_dir: str, max_length: int = 512, batch_size: int = 32,
+                 threads: Optional[int] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.model_dir = model_dir
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.threads = threads
+        self._session = None
+        self._tokenizer = None
+        self._input_names = set()
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._session is not None:
+            return
+        with self._lock:
+            if self._session is not None:
+                return
+            try:
+                import onnxruntime as ort
+                from tokenizers import Tokenizer
+            except ImportError as e:
+                raise ImportError("The cross-encoder reranker needs onnxruntime and tokenizers installed") from e
+
+            model_path = os.path.join(self.model_dir, "model.onnx")
+            if not os.path.exists(model_path):
+                model_path = os.path.join(self.model_dir, "onnx", "model.onnx")
+
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if self.threads:
+                options.intra_op_num_threads = self.threads
+            session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+            tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+            tokenizer.enable_truncation(max_length=self.max_length)
+            tokenizer.no_padding()
+
+            self._tokenizer = tokenizer
+            self._input_names = {i.name for i in session.get_inputs()}
+            self._session = session
+
+    def scores(self, query: str, candidates: Sequence[Candidate]) -> np.ndarray:
+        return self._score_pairs([(query, doc.content) for doc, _ in candidates])
+
+    def scores_batch(self, queries: Sequence[str], candidate_lists: Sequence[Sequence[Candidate]]) -> List[np.ndarray]:
+        pairs = [(query, doc.content) for query, candidates in zip(queries, candidate_lists) for doc, _ in candidates]
+        flat = self._score_pairs(pairs)
+        results, start = [], 0
+        for candidates in candidate_lists:
+            results.append(flat[start:start + len(candidates)])
+            start += len(candidates)
+        return results
+
+    def _score_pairs(self, pairs: List[Tuple[str, str]]) -> np.ndarray:
+        self._load()
+        scores = np.zeros(len(pairs), dtype=np.float64)
+        if not pairs:
+            return scores
+
+        encodings = self._tokenizer.encode_batch(pairs)
+        order = sorted(range(len(pairs)), key=lambda i: len(encodings[i].ids))
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            width = max(len(encodings[i].ids) for i in batch)
+            input_ids = np.zeros((len(batch), width), dtype=np.int64)
+            attention_mask = np.zeros((len(batch), width), dtype=np.int64)
+            token_type_ids = np.zeros((len(batch), width), dtype=np.int64)
+            for row, i in enumerate(batch):
+                encoding = encodings[i]
+                input_ids[row, :len(encoding.ids)] = encoding.ids
+                attention_mask[row, :len(encoding.ids)] = 1
+                token_type_ids[row, :len(encoding.ids)] = encoding.type_ids
+
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self._input_names:
+                feeds["token_type_ids"] = token_type_ids
+            logits = self._session.run(None, feeds)[0]
+
+            if logits.ndim == 2 and logits.shape[1] == 2:
+                logits = logits[:, 1] - logits[:, 0]  # Two-class head: softmax of the "relevant" class
+            scores[batch] = 1 / (1 + np.exp(-logits.reshape(len(batch))))
+        return scores
+
+
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+
+
+def reranker_from_env() -> Optional[Reranker]:
+    kind = os.getenv("RERANKER", "none")
+    options = {
+        "top_k": int(os.getenv("RERANK_TOP_K", "5")),
+        "token_budget": int(os.getenv("RERANK_TOKEN_BUDGET", "1500")),
+    }
+    if kind == "bm25":
+        return BM25Reranker(weight=float(os.getenv("RERANK_BM25_WEIGHT", "0.3")), **options)
+    if kind == "cross-encoder":
+        return CrossEncoderReranker(os.getenv("RERANKER_MODEL_DIR", "models/ms-marco-MiniLM-L-6-v2"), **options)
+    if kind != "none":
+        raise ValueError(f"Unknown RERANKER: {kind}")
+    return None
+
+
+reranker = reranker_from_env()
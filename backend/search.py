@@ -1,16 +1,384 @@
+import json
+import os
+import re
+import threading
+import uuid
+from datetime import datetime
+from sqlalchemy import Float, cast, func, literal_column, select, text
+from sqlalchemy.sql import ColumnElement, Select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from db import Document
-from embeddings import embedder
-from typing import List, Tuple
+from db import Document, SessionLocal, iterative_scan_mode
+from embeddings import embedder, async_embedder
+from answer_cache import current_corpus_version
+from hnsw_index import HNSWIndex, read_fingerprint
+from shared_state import WORKERS, current_snapshot, file_lock, mark_current, publish_snapshot
+from vector_store import VectorStore
+from tracing import traced
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-def search_similar_documents(query: str, db: Session, top_k: int = 5) -> List[Tuple[Document, float]]:
+# SEARCH_BACKEND picks the retrieval engine:
+#   pgvector - every query goes to Postgres (default)
+#   hnsw     - in-process approximate HNSW graph
+#   numpy    - in-process exact scan of a normalized matrix (VECTOR_STORE_DTYPE
+#              float32, float16 or int8)
+# The in-process engines are kept in sync with the documents table.
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "pgvector")
+# SEARCH_MODE=hybrid fuses a full-text match on content_tsv with the vector
+# ranking (reciprocal rank fusion) in a single Postgres query, which keeps
+# exact terms like product names working when embeddings are weak
+SEARCH_MODE = os.getenv("SEARCH_MODE", "vector")
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+HYBRID_MIN_SIMILARITY = float(os.getenv("HYBRID_MIN_SIMILARITY", "0.3"))
+RRF_K = 60
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".vector_index"))
+# With several workers the in-process indexes are read-only memory maps of
+# the snapshot published under VECTOR_INDEX_PATH, shared through the page
+# cache. A corpus change publishes a new snapshot this many seconds later
+# (coalescing bursts of ingests); until then searches go to pgvector.
+VECTOR_INDEX_PUBLISH_DELAY = float(os.getenv("VECTOR_INDEX_PUBLISH_DELAY", "1.0"))
+
+VectorIndex = Union[HNSWIndex, VectorStore]
+vector_indexes: Dict[str, VectorIndex] = {}
+# Corpus version each loaded index is current as of
+_index_versions: Dict[str, int] = {}
+_refresh_lock = threading.Lock()
+_publish_lock = threading.Lock()
+_publish_timer: Optional[threading.Timer] = None
+
+
+def corpus_fingerprint(db: Session) -> str:
+    """Cheap summary of the embedded rows, used to tell if a saved index is stale"""
+    count, latest = db.query(func.count(Document.id), func.max(Document.updated_at)) \
+        .filter(Document.embedding.isnot(None)) \
+        .one()
+    return f"{count}:{latest.isoformat() if latest else ''}"
+
+
+def _new_index(backend: str) -> VectorIndex:
+    if backend == "hnsw":
+        return HNSWIndex(
+            m=int(os.getenv("HNSW_M", "24")),
+            ef_construction=int(os.getenv("HNSW_EF_CONSTRUCTION", "200")),
+            ef_search=int(os.getenv("HNSW_EF_SEARCH", "128"))
+        )
+    if backend == "numpy":
+        return VectorStore(dtype=os.getenv("VECTOR_STORE_DTYPE", "float32"))
+    raise ValueError(f"Unknown in-process search backend: {backend}")
+
+
+def _open_index(backend: str, directory: str) -> VectorIndex:
+    if backend == "hnsw":
+        return HNSWIndex.load(directory, ef_search=int(os.getenv("HNSW_EF_SEARCH", "128")))
+    return VectorStore.load(directory)
+
+
+def _catch_up(db: Session, backend: str, directory: Optional[str], fingerprint: str) -> VectorIndex:
+    """The published index plus rows written since, or a full rebuild if rows were deleted"""
+    index, since = None, None
+    previous = read_fingerprint(directory) if directory else None
+    latest = previous.split(":", 1)[1] if previous else ""
+    if latest:
+        index = _open_index(backend, directory)
+        since = datetime.fromisoformat(latest)
+
+    while True:
+        if index is None:
+            index, since = _new_index(backend), None
+        rows = db.query(Document.id, Document.embedding, Document.updated_at) \
+            .filter(Document.embedding.isnot(None))
+        if since is not None:
+            rows = rows.filter(Document.updated_at >= since)
+        ids, vectors = [], []
+        for doc_id, embedding, updated_at in rows.yield_per(1000):
+            if updated_at == since and str(doc_id) in index.slots:
+                continue  # Rows at the snapshot's own timestamp that it already holds
+            ids.append(str(doc_id))
+            vectors.append(embedding)
+            if len(ids) == 1000:
+                index.add_batch(ids, vectors)
+                ids, vectors = [], []
+        if ids:
+            index.add_batch(ids, vectors)
+        if since is None or len(index.slots) == int(fingerprint.split(":", 1)[0]):
+            return index
+        index = None  # Rows were deleted since the snapshot
+
+
+def load_vector_index(db: Session, backend: str = SEARCH_BACKEND) -> VectorIndex:
+    """Memory-map the published index, first catching it up with the table if it is behind.
+
+    The first worker to get here does the catching up and publishes a new
+    snapshot; the others wait for it and map the same files.
+    """
+    base = os.path.join(VECTOR_INDEX_PATH, backend)
+    with file_lock(base + ".lock"):
+        version = current_corpus_version()
+        fingerprint = corpus_fingerprint(db)
+        directory, published = current_snapshot(base)
+        if directory is None or read_fingerprint(directory) != fingerprint:
+            index = _catch_up(db, backend, directory, fingerprint)
+            directory = publish_snapshot(base, lambda path: index.save(path, fingerprint), version)
+        elif published < version:
+            mark_current(base, directory, version)  # Unchanged rows, newer corpus version
+        index = _open_index(backend, directory)
+    with _refresh_lock:
+        vector_indexes[backend] = index
+        _index_versions[backend] = version
+    return index
+
+
+def save_vector_index(db: Session):
+    """Publish indexes that were updated in place (single worker only)"""
+    if not vector_indexes or WORKERS > 1:
+        return
+    fingerprint = corpus_fingerprint(db)
+    for backend, index in vector_indexes.items():
+        base = os.path.join(VECTOR_INDEX_PATH, backend)
+        with file_lock(base + ".lock"):
+            directory, _ = current_snapshot(base)
+            if directory is None or read_fingerprint(directory) != fingerprint:
+                publish_snapshot(base, lambda path: index.save(path, fingerprint), current_corpus_version())
+
+
+def _publish_vector_indexes():
+    global _publish_timer
+    with _publish_lock:
+        _publish_timer = None
+    try:
+        with SessionLocal() as db:
+            for backend in list(vector_indexes):
+                load_vector_index(db, backend)
+    except Exception as e:
+        print(f"Vector index publish failed, searches stay on pgvector: {e}")
+        return
+    # A change that landed while this snapshot was being built needs another
+    if min(_index_versions.values(), default=0) < current_corpus_version():
+        schedule_index_publish()
+
+
+def schedule_index_publish():
+    """Publish a snapshot of the changed corpus for every worker, coalescing bursts of changes"""
+    global _publish_timer
+    if not vector_indexes:
+        return
+    with _publish_lock:
+        if _publish_timer is None:
+            _publish_timer = threading.Timer(VECTOR_INDEX_PUBLISH_DELAY, _publish_vector_indexes)
+            _publish_timer.daemon = True
+            _publish_timer.start()
+
+
+def current_vector_index(backend: str) -> Optional[VectorIndex]:
+    """The in-process index for backend, or None to search pgvector instead.
+
+    With several workers this maps a newer snapshot once another worker has
+    published one, and returns None while the published snapshot is older
+    than the corpus. A single worker updates its index in place.
+    """
+    index = vector_indexes.get(backend)
+    if index is None or WORKERS == 1:
+        return index
+    version = current_corpus_version()
+    if _index_versions.get(backend, -1) >= version:
+        return index
+    directory, published = current_snapshot(os.path.join(VECTOR_INDEX_PATH, backend))
+    if directory is None or published < version:
+        return None
+    with _refresh_lock:
+        if _index_versions.get(backend, -1) < published:
+            try:
+                vector_indexes[backend] = _open_index(backend, directory)
+            except OSError:
+                return None  # Superseded and pruned while we were opening it
+            _index_versions[backend] = published
+        return vector_indexes[backend]
+
+
+def index_document(doc_id, embedding: List[float]):
+    if WORKERS > 1:
+        schedule_index_publish()
+        return
+    for index in vector_indexes.values():
+        index.add(str(doc_id), embedding)
+
+
+def index_documents(doc_ids: List[str], embeddings: List[List[float]]):
+    if WORKERS > 1:
+        schedule_index_publish()
+        return
+    for index in vector_indexes.values():
+        index.add_batch([str(doc_id) for doc_id in doc_ids], embeddings)
+
+
+def clear_vector_index():
+    if WORKERS > 1:
+        schedule_index_publish()
+        return
+    for index in vector_indexes.values():
+        index.clear()
+
+
+_WORD = re.compile(r"\w+")
+_ITERATIVE_SCAN = text("SELECT set_config('hnsw.iterative_scan', :mode, true)")
+
+Filters = Dict[str, Any]
+
+
+def metadata_conditions(filters: Optional[Filters]) -> List[ColumnElement]:
+    """WHERE clauses for metadata filters.
+
+    {"crop": "wheat"} matches the value exactly, {"crop": ["wheat", "rice"]}
+    matches any of them, and a nested object is matched by JSONB containment.
+    """
+    conditions = []
+    for key, value in (filters or {}).items():
+        if not _WORD.fullmatch(key):
+            raise ValueError(f"Invalid metadata filter key: {key!r}")
+        if isinstance(value, dict):
+            conditions.append(Document.doc_metadata.contains({key: value}))
+            continue
+        # The key is inlined so the planner can use the expression indexes
+        field = literal_column(f"documents.doc_metadata ->> '{key}'")
+        values = [item if isinstance(item, str) else json.dumps(item)
+                  for item in (value if isinstance(value, list) else [value])]
+        conditions.append(field == values[0] if len(values) == 1 else field.in_(values))
+    return conditions
+
+
+def lexical_query(query: str) -> str:
+    """OR together the query's words for to_tsquery(); stop words are dropped by Postgres"""
+    return " | ".join(dict.fromkeys(_WORD.findall(query.lower())))
+
+
+def hybrid_statement(query: str, query_embedding: List[float], top_k: int = 5,
+                     filters: Optional[Filters] = None,
+                     candidates: int = HYBRID_CANDIDATES,
+                     min_similarity: float = HYBRID_MIN_SIMILARITY) -> Select:
+    """Vector and full-text candidates as two CTEs, fused with reciprocal rank fusion.
+
+    The score is the fused score scaled so a document ranked first by both
+    lists gets 1.0. Vector candidates below min_similarity are left out, so
+    every result either matches a query term or is semantically close.
+    """
+    conditions = metadata_conditions(filters)
+    distance = Document.embedding.cosine_distance(query_embedding)
+    vector_hits = select(Document.id, func.row_number().over(order_by=distance).label("rank")) \
+        .where(Document.embedding.isnot(None), distance < 1 - min_similarity, *conditions) \
+        .order_by(distance) \
+        .limit(candidates) \
+        .cte("vector_hits")
+
+    tsquery = func.to_tsquery("english", lexical_query(query))
+    text_rank = func.ts_rank_cd(Document.content_tsv, tsquery)
+    lexical_hits = select(Document.id, func.row_number().over(order_by=text_rank.desc()).label("rank")) \
+        .where(Document.embedding.isnot(None), Document.content_tsv.op("@@")(tsquery), *conditions) \
+        .order_by(text_rank.desc()) \
+        .limit(candidates) \
+        .cte("lexical_hits")
+
+    def rrf(rank):
+        return func.coalesce(cast(RRF_K + 1, Float) / (RRF_K + rank), 0.0)
+
+    fused = select(
+        func.coalesce(vector_hits.c.id, lexical_hits.c.id).label("id"),
+        ((rrf(vector_hits.c.rank) + rrf(lexical_hits.c.rank)) / 2).label("score")
+    ).select_from(
+        vector_hits.join(lexical_hits, vector_hits.c.id == lexical_hits.c.id, full=True)
+    ).subquery("fused")
+
+    return select(Document, fused.c.score) \
+        .join(fused, Document.id == fused.c.id) \
+        .order_by(fused.c.score.desc()) \
+        .limit(top_k)
+
+
+def vector_statement(query_embedding: List[float], top_k: int = 5,
+                     filters: Optional[Filters] = None) -> Select:
+    """Nearest chunks by cosine distance; parent rows of chunked documents have no embedding"""
+    distance = Document.embedding.cosine_distance(query_embedding).label('distance')
+    return select(Document, distance) \
+        .where(Document.embedding.isnot(None), *metadata_conditions(filters)) \
+        .order_by(distance) \
+        .limit(top_k)
+
+
+def _fetch_hits(db: Session, hits: List[Tuple[str, float]]) -> List[Tuple[Document, float]]:
+    """Fetch the winning rows by primary key, keeping the index's ranking"""
+    if not hits:
+        return []
+    docs = db.query(Document).filter(Document.id.in_([uuid.UUID(doc_id) for doc_id, _ in hits])).all()
+    by_id = {str(doc.id): doc for doc in docs}
+    return [(by_id[doc_id], score) for doc_id, score in hits if doc_id in by_id]
+
+
+@traced("search")
+def search_similar_documents(query: str, db: Session, top_k: int = 5,
+                             backend: Optional[str] = None,
+                             mode: Optional[str] = None,
+                             filters: Optional[Filters] = None) -> List[Tuple[Document, float]]:
+    conditions = metadata_conditions(filters)
     query_embedding = embedder.get_embedding(query)
-    
+    if conditions and iterative_scan_mode():
+        db.execute(_ITERATIVE_SCAN, {"mode": iterative_scan_mode()})
+
+    if (mode or SEARCH_MODE) == "hybrid":
+        statement = hybrid_statement(query, query_embedding, top_k, filters)
+        return [(doc, score) for doc, score in db.execute(statement).all()]
+
+    # The in-process indexes can't filter; filtered searches go to pgvector
+    index = current_vector_index(backend or SEARCH_BACKEND)
+    if index is not None and not conditions:
+        return _fetch_hits(db, index.search(query_embedding, top_k))
+
     # Use vector similarity search provided by pgvector
-    similar_documents = db.query(Document, Document.embedding.cosine_distance(query_embedding).label('distance')) \
-        .order_by('distance') \
-        .limit(top_k) \
-        .all()
+    similar_documents = db.execute(vector_statement(query_embedding, top_k, filters)).all()
     
     # Invert the distance to get similarity
-    return [(doc, 1 - distance) for doc, distance in similar_documents]
\ No newline at end of file
+    return [(doc, 1 - distance) for doc, distance in similar_documents]
+
+
+def search_similar_documents_batch(queries: List[str], db: Session, top_k: int = 5,
+                                   backend: Optional[str] = None,
+                                   filters: Optional[Filters] = None) -> List[List[Tuple[Document, float]]]:
+    """Search several queries with one batched embedding call and one matrix pass"""
+    query_embeddings = embedder.get_embeddings(queries)
+
+    index = current_vector_index(backend or SEARCH_BACKEND)
+    if index is None or SEARCH_MODE == "hybrid" or filters:
+        return [search_similar_documents(query, db, top_k, backend, filters=filters) for query in queries]
+    return [_fetch_hits(db, hits) for hits in index.search_batch(query_embeddings, top_k)]
+
+
+async def _afetch_hits(db: AsyncSession, hits: List[Tuple[str, float]]) -> List[Tuple[Document, float]]:
+    if not hits:
+        return []
+    result = await db.execute(select(Document).where(Document.id.in_([uuid.UUID(doc_id) for doc_id, _ in hits])))
+    by_id = {str(doc.id): doc for doc in result.scalars()}
+    return [(by_id[doc_id], score) for doc_id, score in hits if doc_id in by_id]
+
+
+@traced("search")
+async def asearch_similar_documents(query: str, db: AsyncSession, top_k: int = 5,
+                                    backend: Optional[str] = None,
+                                    query_embedding: Optional[List[float]] = None,
+                                    mode: Optional[str] = None,
+                                    filters: Optional[Filters] = None) -> List[Tuple[Document, float]]:
+    """search_similar_documents() without blocking the event loop on the embedding call or the query"""
+    conditions = metadata_conditions(filters)
+    if query_embedding is None:
+        query_embedding = await async_embedder.aget_embedding(query)
+    if conditions and iterative_scan_mode():
+        await db.execute(_ITERATIVE_SCAN, {"mode": iterative_scan_mode()})
+
+    if (mode or SEARCH_MODE) == "hybrid":
+        result = await db.execute(hybrid_statement(query, query_embedding, top_k, filters))
+        return [(doc, score) for doc, score in result.all()]
+
+    index = current_vector_index(backend or SEARCH_BACKEND)
+    if index is not None and not conditions:
+        # In-process search is a millisecond of numpy; not worth a thread hop
+        return await _afetch_hits(db, index.search(query_embedding, top_k))
+
+    result = await db.execute(vector_statement(query_embedding, top_k, filters))
+    return [(doc, 1 - distance) for doc, distance in result.all()]
@@ -0,0 +1,142 @@
+"""
+State shared by the server workers when main.py runs several of them
+(WEB_CONCURRENCY > 1).
+
+Read-mostly state is shared through the OS page cache instead of being
+copied into every worker:
+
+  vector indexes   immutable snapshot directories under VECTOR_INDEX_PATH,
+                   memory-mapped by every worker (search.py)
+  embeddings       the SQLite tier of the embedding cache is one file
+  corpus version   an 8-byte counter in a memory-mapped file; bumping it
+                   invalidates cached answers and stale index snapshots in
+                   every worker
+
+Locks are flock()s on files next to the state, so they also work across
+unrelated processes (e.g. a sync job running beside the server).
+"""
+import fcntl
+import mmap
+import os
+import shutil
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional, Tuple
+
+WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+SHARED_STATE_DIR = os.getenv("SHARED_STATE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".shared_state"))
+# Published snapshots kept on disk: the current one and its predecessor,
+# which a worker may still be opening
+KEEP_SNAPSHOTS = 2
+
+_INT64 = struct.Struct("<q")
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive lock across processes for the duration of the block"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class SharedCounter:
+    """A counter every process can read with one memory load.
+
+    The value is an aligned int64 in a memory-mapped file; increments hold
+    an flock on it. If the file can't be created (e.g. a read-only
+    filesystem) the counter is per process, which is right for one worker.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._local = 0
+        self._fd = None
+        self._map = None
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            if os.fstat(self._fd).st_size < _INT64.size:
+                os.ftruncate(self._fd, _INT64.size)
+            self._map = mmap.mmap(self._fd, _INT64.size)
+        except OSError as e:
+            print(f"Shared counter at {path} unavailable, counting per process: {e}")
+
+    @property
+    def value(self) -> int:
+        if self._map is None:
+            return self._local
+        return _INT64.unpack_from(self._map)[0]
+
+    def bump(self) -> int:
+        with self._lock:
+            if self._map is None:
+                self._local += 1
+                return self._local
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                value = _INT64.unpack_from(self._map)[0] + 1
+                _INT64.pack_into(self._map, 0, value)
+                return value
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+# Bumped on every ingest or delete, by whichever worker made the change;
+# answers computed against an older corpus are treated as misses. Kept here
+# rather than in answer_cache.py so writers outside the server (the api/
+# ingest script) can bump it without numpy.
+_corpus_version = SharedCounter(os.path.join(SHARED_STATE_DIR, "corpus_version"))
+
+
+def bump_corpus_version() -> int:
+    return _corpus_version.bump()
+
+
+def current_corpus_version() -> int:
+    return _corpus_version.value
+
+
+def current_snapshot(base: str) -> Tuple[Optional[str], int]:
+    """(directory, corpus version) of the snapshot published under base, or (None, -1)"""
+    try:
+        with open(os.path.join(base, "CURRENT")) as f:
+            name, version = f.read().split()
+    except (OSError, ValueError):
+        return None, -1
+    return os.path.join(base, name), int(version)
+
+
+def mark_current(base: str, directory: str, version: int):
+    """Atomically point base/CURRENT at a snapshot that is up to date as of `version`"""
+    tmp = os.path.join(base, f"CURRENT.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        f.write(f"{os.path.basename(directory)} {version}\n")
+    os.replace(tmp, os.path.join(base, "CURRENT"))
+
+
+def publish_snapshot(base: str, write: Callable[[str], None], version: int) -> str:
+    """Write a new snapshot directory with write(directory), then make it current.
+
+    Snapshots are never modified once published, so a worker that has one
+    memory-mapped keeps a consistent view; deleting an old one only frees
+    its pages once the last worker has unmapped it. Callers hold
+    file_lock(base + ".lock").
+    """
+    os.makedirs(base, exist_ok=True)
+    directory = os.path.join(base, f"{time.time_ns()}-{os.getpid()}")
+    write(directory)
+    mark_current(base, directory, version)
+
+    snapshots = sorted((entry for entry in os.scandir(base) if entry.is_dir()),
+                       key=lambda entry: entry.name, reverse=True)
+    for entry in snapshots[KEEP_SNAPSHOTS:]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+    return directory
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Offline check for the RAG answer cache: exact and near-duplicate hits,
+invalidation on corpus changes, TTL expiry, LRU eviction, and lookup cost
+with a full cache.
+"""
+import time
+
+import numpy as np
+
+from answer_cache import AnswerCache, bump_corpus_version, current_corpus_version
+
+rng = np.random.default_rng(0)
+
+
+def unit(vector):
+    return vector / np.linalg.norm(vector)
+
+
+def test_exact_and_paraphrase():
+    cache = AnswerCache(max_entries=10, similarity_threshold=0.9)
+    base = unit(rng.standard_normal(384))
+    paraphrase = unit(base + 0.1 * unit(rng.standard_normal(384)))
+    unrelated = unit(rng.standard_normal(384))
+    cache.put("What is Navyakosh?", base, "An organic fertilizer.", [{"id": "1"}])
+
+    exact = cache.get("  what is NAVYAKOSH ")
+    similar = cache.get("Tell me about Navyakosh", paraphrase)
+    other = cache.get("How do I reset my password?", unrelated)
+    assert exact == ("An organic fertilizer.", [{"id": "1"}])
+    assert similar is not None and similar[0] == "An organic fertilizer."
+    assert other is None
+    assert cache.stats() == {"exact_hits": 1, "semantic_hits": 1, "misses": 1, "entries": 1}
+    print("✅ Exact (normalized) and paraphrase hits, unrelated miss")
+
+
+def test_exact_only():
+    """get_exact() answers from the text alone and leaves misses to get()"""
+    cache = AnswerCache(max_entries=10)
+    vector = unit(rng.standard_normal(384))
+    cache.put("What is Navyakosh?", vector, "An organic fertilizer.")
+    assert cache.get_exact("what is navyakosh") == ("An organic fertilizer.", [])
+    assert cache.get_exact("Tell me about Navyakosh") is None
+    assert cache.stats()["misses"] == 0
+    print("✅ Text-only lookup hits without an embedding and doesn't count misses")
+
+
+def test_scopes():
+    cache = AnswerCache(max_entries=10)
+    vector = unit(rng.standard_normal(384))
+    cache.put("dosage?", vector, "25 kg per acre", scope='{"crop": "sugarcane"}')
+    assert cache.get("dosage?", vector, scope='{"crop": "sugarcane"}') is not None
+    assert cache.get("dosage?", vector) is None
+    assert cache.get("dosage?", vector, scope='{"crop": "wheat"}') is None
+    print("✅ Answers for filtered chats only match the same filters")
+
+
+def test_invalidation():
+    cache = AnswerCache(max_entries=10)
+    vector = unit(rng.standard_normal(384))
+    cache.put("dosage", vector, "25 kg per acre")
+    stale_version = current_corpus_version()
+    bump_corpus_version()
+    # An answer generated before an ingest finished must not be stored as fresh
+    cache.put("storage", None, "Cool, dry place", version=stale_version)
+    assert cache.get("dosage", vector) is None and cache.get("storage") is None
+    print("✅ Ingest/delete invalidates cached answers")
+
+
+def test_ttl_and_lru():
+    cache = AnswerCache(max_entries=2, ttl_seconds=0.05)
+    cache.put("a", None, "A")
+    time.sleep(0.06)
+    assert cache.get("a") is None
+
+    cache = AnswerCache(max_entries=2)
+    cache.put("a", None, "A")
+    cache.put("b", None, "B")
+    cache.get("a")  # b is now least recently used
+    cache.put("c", None, "C")
+    assert cache.get("b") is None and cache.get("a") == ("A", []) and cache.get("c") == ("C", [])
+    print("✅ TTL expiry and LRU eviction")
+
+
+def test_lookup_speed(entries=1000, lookups=1000):
+    cache = AnswerCache(max_entries=entries)
+    vectors = rng.standard_normal((entries, 384)).astype(np.float32)
+    for i, vector in enumerate(vectors):
+        cache.put(f"question {i}", vector, f"answer {i}")
+    start = time.perf_counter()
+    hits = sum(cache.get(f"paraphrase {i}", vectors[i]) is not None for i in range(lookups))
+    per_lookup = (time.perf_counter() - start) / lookups * 1000
+    print(f"   {per_lookup:.3f} ms per semantic lookup over {entries} cached answers")
+    assert hits == lookups and per_lookup < 5
+    print("✅ Semantic lookup is far cheaper than retrieval + generation")
+
+
+if __name__ == "__main__":
+    print("🧪 ANSWER CACHE TEST")
+    print("=" * 40)
+    test_exact_and_paraphrase()
+    test_exact_only()
+    test_scopes()
+    test_invalidation()
+    test_ttl_and_lru()
+    test_lookup_speed()
+    print("\n🎉 All checks passed!")
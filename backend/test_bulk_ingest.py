@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Offline check for bulk_ingest.py: input parsing, the binary COPY encoding,
+commit cadence, and end-to-end throughput for 100k chunks with the hashing
+embedder and a cursor that only records what would be sent to Postgres.
+"""
+import io
+import json
+import struct
+import uuid
+
+import numpy as np
+
+from bulk_ingest import bulk_ingest, encode_copy, insert_columns, iter_documents
+from hash_embeddings import hash_embedder
+
+BACKEND_TYPES = {"id": "uuid", "content": "text", "embedding": "USER-DEFINED",
+                 "doc_metadata": "json", "created_at": "timestamp without time zone",
+                 "updated_at": "timestamp without time zone"}
+
+
+class RecordingCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchall(self):
+        return list(BACKEND_TYPES.items())
+
+    def copy_expert(self, sql, data):
+        self.conn.copied.append(data.getvalue())
+
+    def close(self):
+        pass
+
+
+class RecordingConnection:
+    def __init__(self):
+        self.copied = []
+        self.commits = 0
+
+    def cursor(self):
+        return RecordingCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+def _decode_copy(data):
+    """Minimal binary COPY reader for checking encode_copy()"""
+    assert data.startswith(b"PGCOPY\n\xff\r\n\x00")
+    offset, rows = 19, []
+    while True:
+        (fields,) = struct.unpack_from(">h", data, offset)
+        offset += 2
+        if fields == -1:
+            return rows
+        row = []
+        for _ in range(fields):
+            (length,) = struct.unpack_from(">i", data, offset)
+            row.append(data[offset + 4:offset + 4 + length])
+            offset += 4 + length
+        rows.append(row)
+
+
+def test_parsing():
+    jsonl = io.StringIO('{"content": "a", "metadata": {"crop": "wheat"}}\n\n{"content": "b", "source": "x.pdf"}\n{"content": ""}\n')
+    csv_data = io.StringIO("content,crop\nc,rice\n,skip\n")
+    docs = list(iter_documents(jsonl)) + list(iter_documents(csv_data, "csv"))
+    assert docs == [
+        {"content": "a", "metadata": {"crop": "wheat"}},
+        {"content": "b", "metadata": {"source": "x.pdf"}},
+        {"content": "c", "metadata": {"crop": "rice"}},
+    ]
+    print("✅ JSONL and CSV parsing (empty rows skipped)")
+
+
+def test_copy_encoding():
+    columns = insert_columns(BACKEND_TYPES)
+    doc_id = uuid.uuid4()
+    vector = np.linspace(-1, 1, 384).astype(np.float32)
+    row = {"id": doc_id, "content": "héllo", "metadata": {"crop": "wheat"}, "timestamp": 1_000_000}
+    fields = _decode_copy(encode_copy(columns, BACKEND_TYPES, [row], vector[None, :]))[0]
+
+    dim, _ = struct.unpack(">HH", fields[2][:4])
+    decoded = np.frombuffer(fields[2][4:], dtype=">f4")
+    jsonb = encode_copy(columns, dict(BACKEND_TYPES, doc_metadata="jsonb"), [row], vector[None, :])
+    assert columns == ["id", "content", "embedding", "doc_metadata", "created_at", "updated_at"]
+    assert uuid.UUID(bytes=fields[0]) == doc_id
+    assert fields[1].decode() == "héllo"
+    assert dim == 384 and np.array_equal(decoded, vector)
+    assert json.loads(fields[3]) == {"crop": "wheat"}
+    assert struct.unpack(">q", fields[4])[0] == 1_000_000
+    assert _decode_copy(jsonb)[0][3][:1] == b"\x01"
+    print("✅ Binary COPY rows decode back to the input")
+
+
+def test_throughput(count=100000):
+    docs = ({"content": f"Navyakosh chunk {i}: apply 25 kg per acre before irrigation.", "metadata": {"i": i}}
+            for i in range(count))
+    conn = RecordingConnection()
+    committed = []
+    stats = bulk_ingest(conn, docs, lambda texts: hash_embedder.embed(texts),
+                        batch_size=512, commit_every=20000,
+                        on_commit=lambda ids, embeddings: committed.extend(ids))
+    rows = sum(len(_decode_copy(data)) for data in conn.copied[:3])
+    print(f"   {count} chunks in {stats['seconds']} s ({stats['docs_per_second']} docs/s, "
+          f"{sum(map(len, conn.copied)) / 2**20:.0f} MB of COPY data, {conn.commits} commits)")
+    assert stats["documents"] == count and len(committed) == count
+    assert conn.commits == 5 and rows == 3 * 512
+    print("✅ Bulk pipeline with hashing embeddings")
+
+
+if __name__ == "__main__":
+    print("🧪 BULK INGEST TEST")
+    print("=" * 40)
+    test_parsing()
+    test_copy_encoding()
+    test_throughput()
+    print("\n🎉 All checks passed!")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Offline check for the streaming chunker: token limits, sentence boundaries,
+overlap, identical output for streamed and whole input, and bounded memory
+on a multi-megabyte document.
+"""
+import random
+import time
+import tracemalloc
+
+from chunking import Chunker, count_tokens, iter_pieces, iter_sentences
+
+SENTENCES = [
+    "Navyakosh is a specialized organic fertilizer designed for sugarcane cultivation.",
+    "Apply 25-30 kg per acre during planting season!",
+    "Does it work with drip irrigation?",
+    "Store in a cool, dry place away from direct sunlight and use within two years of manufacture.",
+    "Micronutrients such as zinc, boron and manganese improve cane quality.",
+]
+
+
+def make_document(sentences, seed=0):
+    rng = random.Random(seed)
+    paragraphs = []
+    for _ in range(sentences // 5):
+        paragraphs.append(" ".join(rng.choice(SENTENCES) for _ in range(5)))
+    return "\n\n".join(paragraphs)
+
+
+def test_limits_and_overlap():
+    chunker = Chunker(max_tokens=64, overlap_tokens=16)
+    chunks = list(chunker.chunks([make_document(200)]))
+    within = all(count_tokens(chunk) <= 64 for chunk in chunks)
+    # Chunks end on sentence boundaries, and a last sentence that fits in the
+    # overlap budget is repeated at the start of the next chunk
+    boundaries = all(chunk.rstrip()[-1] in ".!?" for chunk in chunks)
+    carried = expected = 0
+    for a, b in zip(chunks, chunks[1:]):
+        last = list(iter_sentences([a]))[-1]
+        if count_tokens(last) <= 16:
+            expected += 1
+            carried += b.startswith(last)
+    print(f"   {len(chunks)} chunks, max {max(map(count_tokens, chunks))} tokens, {carried}/{expected} overlaps carried")
+    assert within and boundaries and expected > 0 and carried == expected
+    print("✅ Token limit, sentence boundaries and overlap")
+
+
+def test_long_sentences():
+    chunker = Chunker(max_tokens=32, overlap_tokens=8)
+    text = "word " * 500 + "x" * 5000 + " " + ",".join(["a"] * 2000)
+    chunks = list(chunker.chunks([text]))
+    assert all(count_tokens(chunk) <= 32 for chunk in chunks) and "".join(chunks).count("x") == 5000
+    print("✅ Sentences and tokens longer than a chunk are split")
+
+
+def test_streaming_matches_whole():
+    chunker = Chunker(max_tokens=128, overlap_tokens=24)
+    text = make_document(500, seed=1)
+    whole = list(chunker.chunks([text]))
+    rng = random.Random(2)
+    pieces, start = [], 0
+    while start < len(text):
+        size = rng.randint(1, 300)
+        pieces.append(text[start:start + size])
+        start += size
+    assert list(chunker.chunks(pieces)) == whole
+    print("✅ Chunks are identical however the input is split into pieces")
+
+
+def test_memory():
+    """A 5 MB document streamed from disk-sized pieces never holds all chunks at once"""
+    chunker = Chunker(max_tokens=256, overlap_tokens=32)
+    text = make_document(50000, seed=3)
+    size_mb = len(text) / 2**20
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = sum(1 for _ in chunker.chunks(iter_pieces(text)))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"   {size_mb:.1f} MB -> {count} chunks in {elapsed:.2f} s, peak {peak / 2**10:.0f} KB allocated")
+    assert peak < len(text) / 10
+    print("✅ Streaming keeps memory bounded")
+
+
+if __name__ == "__main__":
+    print("🧪 CHUNKING TEST")
+    print("=" * 40)
+    test_limits_and_overlap()
+    test_long_sentences()
+    test_streaming_matches_whole()
+    test_memory()
+    print("\n🎉 All checks passed!")
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Offline check for the context builder: score order, near-duplicate removal
+(by text and by embedding), and the prompt token budget.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from chunking import count_tokens
+from context import ContextBuilder
+
+Doc = namedtuple("Doc", "content embedding")
+
+STORAGE = "Navyakosh storage: Store in a cool, dry place away from direct sunlight. Use within 2 years of manufacturing date."
+RATE = "Apply 25-30 kg per acre during planting. For ratoon crops, apply 20-25 kg per acre after each harvest."
+NPK = "Navyakosh contains balanced NPK nutrients along with micronutrients that improve soil structure."
+
+
+def test_dedup_and_order():
+    candidates = [
+        (Doc(STORAGE, None), 0.71),
+        (Doc(RATE, None), 0.80),
+        (Doc(STORAGE.replace("Navyakosh storage:", "Storage -"), None), 0.70),  # Re-ingested copy
+        (Doc(NPK, None), 0.65),
+    ]
+    kept = ContextBuilder().build(candidates)
+    assert [doc.content for doc, _ in kept] == [RATE, STORAGE, NPK]
+    print("✅ Best first, near-duplicate copy dropped, distinct passages kept")
+
+
+def test_embedding_dedup():
+    rng = np.random.default_rng(0)
+    vector = rng.standard_normal(384)
+    candidates = [
+        (Doc(STORAGE, vector), 0.71),
+        (Doc("Keep the bags somewhere cool and dry, out of the sun, and use them within two years.",
+             vector + 0.01 * rng.standard_normal(384)), 0.69),  # Paraphrase: few shared words
+        (Doc(RATE, rng.standard_normal(384)), 0.60),
+    ]
+    kept = ContextBuilder().build(candidates)
+    assert [doc.content for doc, _ in kept] == [STORAGE, RATE]
+    print("✅ Paraphrased duplicates dropped when embeddings are available")
+
+
+def test_budget():
+    passages = [f"Passage {i}: " + " ".join(f"word{i}x{j}" for j in range(60)) for i in range(20)]
+    scores = [1 - i / 100 for i in range(20)]
+    builder = ContextBuilder(token_budget=500)
+    kept = [i for i, _ in builder.select(passages, scores)]
+    total = sum(count_tokens(passages[i]) for i in kept)
+    print(f"   {len(kept)}/{len(passages)} passages, {total} of {sum(map(count_tokens, passages))} tokens")
+    assert kept == sorted(kept) and 0 < total <= 500
+    print("✅ Context stays within the token budget")
+
+
+def test_oversized_passage():
+    """A best passage over the whole budget is cut at a sentence boundary, not sent whole"""
+    long_doc = Doc(" ".join([RATE] * 20), None)
+    kept = ContextBuilder(token_budget=50).build([(long_doc, 0.9), (Doc(NPK, None), 0.5)])
+    doc, score = kept[0]
+    print(f"   {count_tokens(long_doc.content)} tokens cut to {count_tokens(doc.content)}")
+    assert len(kept) == 1 and score == 0.9
+    assert count_tokens(doc.content) <= 50 and doc.content.endswith(".")
+    assert long_doc.content.startswith(doc.content)
+    print("✅ An oversized best passage is truncated to the budget")
+
+
+if __name__ == "__main__":
+    print("🧪 CONTEXT BUILDER TEST")
+    print("=" * 40)
+    test_dedup_and_order()
+    test_embedding_dedup()
+    test_budget()
+    test_oversized_passage()
+    print("\n🎉 All checks passed!")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Offline check and benchmark for batched embeddings and request coalescing.
+Runs against fake_inference_server.py, no network or API token needed.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_inference_server import start_fake_server
+
+server, url = start_fake_server(latency_ms=20.0, per_item_ms=0.2)
+os.environ["EMBEDDING_API_URL"] = url
+
+from embeddings import EmbeddingGenerator, EmbeddingBatcher
+
+QUERIES = [f"How to apply Navyakosh fertilizer, question {i}?" for i in range(128)]
+CONCURRENCY = 32
+
+
+def _reset_stats():
+    with server.stats['lock']:
+        server.stats['requests'] = 0
+        server.stats['texts'] = 0
+
+
+def _generator():
+    """A generator for this module's fake server (other test modules start their own)"""
+    generator = EmbeddingGenerator()
+    generator.api_url = url
+    return generator
+
+
+def test_batch_api():
+    """get_embeddings returns one 384-dim vector per text in a single request"""
+    _reset_stats()
+    embeddings = _generator().get_embeddings(QUERIES[:10])
+    assert len(embeddings) == 10 and all(len(e) == 384 for e in embeddings)
+    assert server.stats['requests'] == 1
+    print(f"✅ Batch API: {len(embeddings)} embeddings in {server.stats['requests']} request(s)")
+
+
+def _run_concurrent(embed):
+    _reset_stats()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        results = list(pool.map(embed, QUERIES))
+    return results, time.perf_counter() - start, server.stats['requests']
+
+
+def test_coalescing():
+    """Concurrent single-text calls share batched requests and match direct results"""
+    generator = _generator()
+    batcher = EmbeddingBatcher(generator, max_batch_size=32, max_wait_ms=5)
+
+    direct, direct_time, direct_requests = _run_concurrent(generator.get_embedding)
+    coalesced, coalesced_time, coalesced_requests = _run_concurrent(batcher.get_embedding)
+
+    print(f"   Direct:    {direct_requests} requests, {direct_time * 1000:.0f} ms")
+    print(f"   Coalesced: {coalesced_requests} requests, {coalesced_time * 1000:.0f} ms "
+          f"(avg batch {batcher.texts / max(batcher.batches, 1):.1f})")
+    print(f"   Speedup:   {direct_time / coalesced_time:.1f}x wall clock, "
+          f"{direct_requests / max(coalesced_requests, 1):.1f}x fewer requests")
+
+    assert coalesced == direct
+    assert coalesced_requests < direct_requests
+    print("✅ Coalescing")
+
+
+if __name__ == "__main__":
+    print("🧪 EMBEDDING BATCHING TEST")
+    print("=" * 40)
+    try:
+        test_batch_api()
+        test_coalescing()
+    finally:
+        server.shutdown()
+    print("\n🎉 All checks passed!")
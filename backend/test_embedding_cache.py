@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Offline check for the two-tier embedding cache, using fake_inference_server.py.
+"""
+import os
+import tempfile
+
+from fake_inference_server import start_fake_server
+
+server, url = start_fake_server(latency_ms=5.0)
+os.environ["EMBEDDING_API_URL"] = url
+
+from embedding_cache import EmbeddingCache, EmbeddingSnapshot
+from embeddings import EmbeddingGenerator
+
+CORPUS = [f"Navyakosh document {i}: apply 25-30 kg per acre." for i in range(50)]
+
+
+def test_repeat_queries():
+    """The same FAQ query, however it is cased or spaced, is embedded once"""
+    generator = EmbeddingGenerator(cache=EmbeddingCache(path=None))
+    for query in ["How to apply Navyakosh?", "how to apply navyakosh?", "  How to  apply Navyakosh? "] * 10:
+        generator.get_embedding(query)
+    stats = generator.cache.stats()
+    assert generator.api_calls == 1 and stats["hits"] == 29
+    print(f"✅ Repeat queries: {generator.api_calls} API call(s), {stats}")
+
+
+def test_persistent_reingest():
+    """Re-ingesting an unchanged corpus in a fresh process makes zero API calls"""
+    path = os.path.join(tempfile.mkdtemp(), "cache.sqlite")
+
+    first = EmbeddingGenerator(cache=EmbeddingCache(path=path))
+    first.get_embeddings(CORPUS)
+
+    # A new cache object has an empty LRU, like a restarted process
+    second = EmbeddingGenerator(cache=EmbeddingCache(path=path))
+    embeddings = second.get_embeddings(CORPUS)
+
+    assert first.api_calls == 1 and second.api_calls == 0 and len(embeddings) == len(CORPUS)
+    print(f"✅ Re-ingest after restart: {second.api_calls} API call(s), {second.cache.stats()}")
+
+
+def test_size_limits():
+    """Memory and disk tiers both stay within their limits"""
+    path = os.path.join(tempfile.mkdtemp(), "cache.sqlite")
+    cache = EmbeddingCache(path=path, max_entries=10, max_disk_entries=20)
+    generator = EmbeddingGenerator(cache=cache)
+    generator.get_embeddings(CORPUS)
+
+    disk_entries = cache._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    assert cache.stats()["memory_entries"] == 10 and disk_entries == 20
+    print(f"✅ Size limits: {cache.stats()['memory_entries']} in memory, {disk_entries} on disk")
+
+
+def test_snapshot():
+    """An exported snapshot serves the cached vectors without the cache or the API"""
+    directory = tempfile.mkdtemp()
+    cache = EmbeddingCache(path=os.path.join(directory, "cache.sqlite"))
+    generator = EmbeddingGenerator(cache=cache)
+    embeddings = generator.get_embeddings(CORPUS)
+    count = cache.export_snapshot(os.path.join(directory, "snapshot.bin"), generator.model_name)
+
+    snapshot = EmbeddingSnapshot(os.path.join(directory, "snapshot.bin"))
+    found = [snapshot.get(generator.model_name, f"  {text.upper()} ") for text in CORPUS]
+    assert (count == len(CORPUS) == len(snapshot)
+            and all(max(abs(a - b) for a, b in zip(got, want)) < 1e-6 for got, want in zip(found, embeddings))
+            and snapshot.get(generator.model_name, "not in the corpus") is None
+            and snapshot.get("another/model", CORPUS[0]) is None)
+    print(f"✅ Snapshot: {len(snapshot)} entries, normalized lookups match the cache")
+
+
+if __name__ == "__main__":
+    print("🧪 EMBEDDING CACHE TEST")
+    print("=" * 40)
+    try:
+        test_repeat_queries()
+        test_persistent_reingest()
+        test_size_limits()
+        test_snapshot()
+    finally:
+        server.shutdown()
+    print("\n🎉 All checks passed!")
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Offline check for the in-process HNSW index: recall against exact search,
+ef/latency trade-off, sync operations and the memory-mapped round trip.
+"""
+import functools
+import tempfile
+import time
+
+import numpy as np
+
+from hnsw_index import HNSWIndex
+
+rng = np.random.default_rng(0)
+centers = rng.standard_normal((50, 384)).astype(np.float32)
+corpus = (centers[rng.integers(0, 50, 3000)] + 0.8 * rng.standard_normal((3000, 384))).astype(np.float32)
+queries = (centers[rng.integers(0, 50, 100)] + 0.8 * rng.standard_normal((100, 384))).astype(np.float32)
+
+
+def _unit(x):
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def _exact(corpus, queries):
+    return np.argsort(-(_unit(queries) @ _unit(corpus).T), axis=1)[:, :10]
+
+
+exact = _exact(corpus, queries)
+
+
+def _recall(index, ef, queries=queries, exact=exact):
+    found, start = 0, time.perf_counter()
+    for query, truth in zip(queries, exact):
+        hits = {int(doc_id) for doc_id, _ in index.search(query, 10, ef=ef)}
+        found += len(hits & set(truth.tolist()))
+    return found / exact.size, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+@functools.lru_cache(maxsize=None)
+def _index():
+    index = HNSWIndex()
+    start = time.perf_counter()
+    index.add_batch([str(i) for i in range(len(corpus))], corpus)
+    print(f"   Built {len(index)} vectors in {time.perf_counter() - start:.1f} s")
+    return index
+
+
+def test_recall():
+    index = _index()
+    for ef in (10, 50, index.ef_search):
+        recall, latency = _recall(index, ef)
+        print(f"   ef={ef:<4} recall@10 {recall:.3f}  {latency:.2f} ms/query")
+    assert _recall(index, None)[0] >= 0.95
+    print("✅ Recall against exact search")
+
+
+def test_recall_random():
+    """Unclustered vectors are the hard case; the defaults must still reach 0.9"""
+    data = np.random.default_rng(1).standard_normal((2000, 384)).astype(np.float32)
+    probes = np.random.default_rng(2).standard_normal((50, 384)).astype(np.float32)
+    index = HNSWIndex()
+    index.add_batch([str(i) for i in range(len(data))], data)
+    recall, latency = _recall(index, None, probes, _exact(data, probes))
+    print(f"   random data, default ef recall@10 {recall:.3f}  {latency:.2f} ms/query")
+    assert recall >= 0.9
+    print("✅ Recall on random vectors at the default ef")
+
+
+def test_sync():
+    """Removed ids disappear from results; re-added ids come back"""
+    index = _index()
+    top = str(exact[0][0])
+    index.remove(top)
+    assert top not in {doc_id for doc_id, _ in index.search(queries[0], 10)}
+    index.add(top, corpus[int(top)])
+    assert index.search(corpus[int(top)], 1)[0][0] == top
+    print("✅ Sync: remove hides the row, add restores it")
+
+
+def test_mmap_round_trip():
+    index = _index()
+    path = tempfile.mkdtemp()
+    index.save(path, fingerprint="test")
+    loaded = HNSWIndex.load(path)
+    assert isinstance(loaded.vectors, np.memmap)
+    assert _recall(loaded, 50)[0] == _recall(index, 50)[0]
+    print("✅ Saved index loads memory-mapped with identical results")
+
+
+if __name__ == "__main__":
+    print("🧪 HNSW INDEX TEST")
+    print("=" * 40)
+    test_recall()
+    test_recall_random()
+    test_sync()
+    test_mmap_round_trip()
+    print("\n🎉 All checks passed!")
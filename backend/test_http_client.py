@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Check http_client's retries, backoff hints and circuit breaker against a
+local mock upstream (no network needed).
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault("HTTP_BACKOFF", "0.01")
+os.environ.setdefault("HTTP_CIRCUIT_RESET", "0.3")
+
+import http_client
+from http_client import CircuitOpenError, retry_delay
+
+# path -> responses to play in order; the last one repeats
+SCRIPTS = {
+    "/loading": [(503, {}, {"error": "Model BAAI/bge-small-en-v1.5 is currently loading", "estimated_time": 0.05}),
+                 (200, {}, [[0.1, 0.2]])],
+    "/limited": [(429, {"Retry-After": "0"}, {"error": "Rate limit reached"}), (200, {}, {"ok": True})],
+    "/stream": [(503, {}, {"error": "overloaded"}), (200, {}, None)],
+    "/down": [(500, {}, {"error": "boom"})],
+    "/slow": [(200, {}, {"ok": True})],
+    "/busy": [(503, {}, {"error": "overloaded"})],
+    "/throttled": [(429, {"Retry-After": "2"}, {"error": "Rate limit reached"})],
+}
+hits = {}
+
+
+class MockUpstream(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        count = hits[self.path] = hits.get(self.path, 0) + 1
+        script = SCRIPTS[self.path]
+        if self.path == "/slow":
+            time.sleep(0.5)
+        status, headers, body = script[min(count, len(script)) - 1]
+        payload = b"data: one\n\ndata: two\n\n" if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except BrokenPipeError:
+            pass  # The caller of /slow gave up
+
+    def log_message(self, *args):
+        pass
+
+
+def check_retries(base):
+    response = http_client.post(f"{base}/loading", json={"inputs": ["hi"]}, timeout=5)
+    limited = http_client.post(f"{base}/limited", json={}, timeout=5)
+    hinted = retry_delay(0, 503, {}, b'{"error": "Model x is currently loading", "estimated_time": 7.5}')
+    assert response.status_code == 200 and hits["/loading"] == 2
+    assert limited.status_code == 200 and hits["/limited"] == 2 and hinted == 7.5
+    print("✅ HF 'model loading' 503 and 429 are retried (estimated_time honoured)")
+
+
+def check_async(base):
+    async def run():
+        response = await http_client.arequest("POST", f"{base}/limited", json={}, timeout=5)
+        async with http_client.astream("POST", f"{base}/stream", json={}, timeout=5) as stream:
+            lines = [line async for line in stream.aiter_lines() if line]
+        await http_client.close_async_client()
+        return response, lines
+
+    hits.pop("/limited", None)
+    response, lines = asyncio.run(run())
+    assert response.status_code == 200 and response.json() == {"ok": True} and lines == ["data: one", "data: two"]
+    print("✅ Async requests and streams retry before the body is consumed")
+
+
+def check_retry_budget(base):
+    """A call stops retrying rather than wait past its budget, and counts as one breaker failure"""
+    breaker = http_client.breaker_for(f"{base}/busy")
+    exhausted = http_client.post(f"{base}/busy", json={}, timeout=5, retries=3).status_code
+    failures = breaker.failures
+    start = time.perf_counter()
+    throttled = http_client.post(f"{base}/throttled", json={}, timeout=5, retries=3, retry_budget=1).status_code
+    elapsed = time.perf_counter() - start
+    breaker.record_success()
+    assert exhausted == 503 and hits["/busy"] == 4 and failures == 1
+    assert throttled == 429 and hits["/throttled"] == 1 and elapsed < 1
+    print("✅ Retries stay within the retry budget; an exhausted call is one failure")
+
+
+def check_circuit_breaker(base):
+    url = f"{base}/down"
+    breaker = http_client.breaker_for(url)
+    statuses = [http_client.post(url, json={}, timeout=5).status_code for _ in range(breaker.threshold)]
+    calls = hits["/down"]
+    try:
+        http_client.post(url, json={}, timeout=5)
+        failed_fast = False
+    except CircuitOpenError:
+        failed_fast = hits["/down"] == calls
+    time.sleep(breaker.reset_after)
+    SCRIPTS["/down"] = [(200, {}, {"ok": True})]
+    recovered = http_client.post(url, json={}, timeout=5).status_code == 200 and breaker.state == "closed"
+    assert statuses == [500] * breaker.threshold and failed_fast and recovered
+    print(f"✅ Circuit opens after {breaker.threshold} failures, fails fast, then recovers")
+
+
+def check_abandoned_trial(base):
+    # localhost rather than 127.0.0.1: a breaker of its own
+    url = base.replace("127.0.0.1", "localhost") + "/slow"
+    breaker = http_client.breaker_for(url)
+
+    def half_open():
+        breaker.opened_at = time.monotonic() - breaker.reset_after
+
+    def raise_in_hook(response, *args, **kwargs):
+        raise RuntimeError("hook failed")
+
+    half_open()
+    try:
+        http_client.post(url, json={}, timeout=5, hooks={"response": raise_in_hook})
+    except RuntimeError:
+        pass
+    after_raise = breaker.allow()  # The next caller gets the trial...
+    breaker.release()  # ...and hands it back for the async case
+
+    async def cancelled_trial():
+        try:
+            await asyncio.wait_for(http_client.arequest("POST", url, json={}, timeout=5), 0.1)
+        except asyncio.TimeoutError:
+            pass
+        await http_client.close_async_client()
+
+    half_open()
+    asyncio.run(cancelled_trial())
+    recovered = http_client.post(url, json={}, timeout=5).status_code == 200 and breaker.state == "closed"
+    assert after_raise and recovered
+    print("✅ A trial call that raises or is cancelled doesn't leave the circuit stuck")
+
+
+def test_lazy_imports():
+    """A sync-only cold start (the Vercel handlers) doesn't load the async stack"""
+    code = "import sys, http_client; print(sorted({'asyncio', 'httpx', 'requests'} & set(sys.modules)))"
+    loaded = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True).stdout.strip()
+    assert loaded == "[]"
+    print(f"✅ Importing http_client loads no HTTP library ({loaded})")
+
+
+if __name__ == "__main__":
+    print("🧪 HTTP CLIENT TEST")
+    print("=" * 40)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockUpstream)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    try:
+        check_retries(base)
+        check_async(base)
+        check_retry_budget(base)
+        check_circuit_breaker(base)
+        check_abandoned_trial(base)
+        test_lazy_imports()
+    finally:
+        server.shutdown()
+    print("\n🎉 All checks passed!")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Offline check for load_test.py against a local server that can only work
+on two requests at a time, 50 ms each (~40 req/s): the rate sweep must find
+saturation below that, latency must include queueing, and the closed-loop
+sweep must see throughput stop growing just past two in flight.
+"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import load_test
+
+SERVICE_S = 0.05
+WORKERS = 2
+
+
+class CapacityLimitedHandler(BaseHTTPRequestHandler):
+    slots = threading.Semaphore(WORKERS)
+    received = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        with self.slots:
+            time.sleep(SERVICE_S)
+        self.received.append(body)
+        payload = json.dumps({"response": "ok", "sources": 1}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CapacityLimitedHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def check_rate_sweep(url):
+    report = asyncio.run(load_test.sweep(url, "rate", [10, 20, 80], 0, 2.0, "/chat",
+                                         load_test.chat_body(load_test.QUERIES), 250, 0.01))
+    by_rate = {level["rate"]: level for level in report["levels"]}
+    saturation = report["saturation"]
+    assert saturation is not None and saturation["rate"] in (10, 20)
+    assert by_rate[80]["throughput"] < 0.9 * 80 and by_rate[80]["p95"] > 250
+    assert by_rate[10]["p50"] < 150
+    print(f"✅ Rate sweep finds saturation below the server's {WORKERS / SERVICE_S:.0f} req/s")
+
+
+def check_concurrency_sweep(url):
+    report = asyncio.run(load_test.sweep(url, "concurrency", [1, 2, 4, 16], 40, 0, "/chat",
+                                         load_test.chat_body(load_test.QUERIES), 5000, 0.01))
+    saturation = report["saturation"]
+    assert saturation is not None and saturation["concurrency"] in (2, 4)
+    print(f"✅ Closed-loop sweep stops scaling just past {WORKERS} in flight")
+
+
+def check_documents_body(url):
+    CapacityLimitedHandler.received.clear()
+    result = asyncio.run(_one_level(url))
+    body = CapacityLimitedHandler.received[-1]
+    assert result["errors"] == 0 and body["metadata"] == {"source": "load_test"}
+    assert body["content"].startswith("Load test document")
+    print("✅ --endpoint documents posts content and metadata")
+
+
+async def _one_level(url):
+    import httpx
+
+    async with httpx.AsyncClient() as client:
+        return await load_test.run_level(client, url, 2, 4, "/documents", load_test.document_body(load_test.QUERIES))
+
+
+if __name__ == "__main__":
+    print("🧪 LOAD TEST HARNESS TEST")
+    print("=" * 40)
+    server, url = start_server()
+    try:
+        check_rate_sweep(url)
+        check_concurrency_sweep(url)
+        check_documents_body(url)
+    finally:
+        server.shutdown()
+    print("\n🎉 All checks passed!")
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Offline check for the local ONNX embedding backend.
+
+Builds a tiny ONNX model and tokenizer on the fly (needs the onnx package),
+so it runs on a CPU-only box without network. Set EMBEDDING_MODEL_DIR to
+an exported all-MiniLM / bge-small model to also measure real latency.
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from local_embeddings import LocalEmbeddingModel
+
+TEXTS = [
+    "How to apply Navyakosh?",
+    "Navyakosh fertilizer application rate for sugarcane ratoon crops",
+    "Storage instructions",
+]
+
+
+def build_tiny_model(model_dir: str, dim: int = 8):
+    """Embedding-lookup 'transformer' with the same inputs and outputs as a BERT export"""
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+    from tokenizers import Tokenizer, models, pre_tokenizers
+
+    words = sorted({w for text in TEXTS for w in text.lower().replace("?", " ").split()})
+    vocab = {"[PAD]": 0, "[UNK]": 1, **{w: i + 2 for i, w in enumerate(words)}}
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.save(os.path.join(model_dir, "tokenizer.json"))
+
+    table = np.random.default_rng(0).standard_normal((len(vocab), dim)).astype(np.float32)
+    graph = helper.make_graph(
+        [helper.make_node("Gather", ["table", "input_ids"], ["last_hidden_state"])],
+        "tiny",
+        [helper.make_tensor_value_info(name, TensorProto.INT64, ["batch", "seq"])
+         for name in ("input_ids", "attention_mask", "token_type_ids")],
+        [helper.make_tensor_value_info("last_hidden_state", TensorProto.FLOAT, ["batch", "seq", dim])],
+        [numpy_helper.from_array(table, "table")],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)], ir_version=8)
+    onnx.save(model, os.path.join(model_dir, "model.onnx"))
+
+
+def test_tiny_model():
+    """Lazy loading, normalization and padding-independent results"""
+    model_dir = tempfile.mkdtemp()
+    build_tiny_model(model_dir)
+    model = LocalEmbeddingModel(model_dir, batch_size=2)
+
+    lazy = model._session is None
+    batch = model.embed(TEXTS)
+    single = np.vstack([model.embed([text]) for text in TEXTS])
+
+    assert lazy
+    assert batch.shape == (3, 8)
+    assert np.allclose(np.linalg.norm(batch, axis=1), 1.0)
+    assert np.allclose(batch, single, atol=1e-6)
+    print(f"✅ Tiny model: shape {batch.shape}, lazy load {lazy}, batch matches singles")
+
+
+def test_real_model():
+    """Latency of the exported model in EMBEDDING_MODEL_DIR, if one is available"""
+    model_dir = os.getenv("EMBEDDING_MODEL_DIR")
+    if not model_dir:
+        print("⏭️  Real model: set EMBEDDING_MODEL_DIR to benchmark an exported model")
+        return
+
+    model = LocalEmbeddingModel(model_dir)
+    model.embed(["warm up"])
+
+    timings = []
+    for i in range(200):
+        start = time.perf_counter()
+        model.embed([f"How to apply Navyakosh fertilizer for sugarcane? ({i})"])
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+
+    start = time.perf_counter()
+    embeddings = model.embed([f"Navyakosh document {i} about sugarcane" for i in range(256)])
+    batch_ms = (time.perf_counter() - start) * 1000
+
+    assert embeddings.shape[1] == 384
+    print(f"✅ Real model: dim {embeddings.shape[1]}, single query p50 {timings[100]:.1f} ms, "
+          f"p99 {timings[198]:.1f} ms, 256-text batch {batch_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    print("🧪 LOCAL EMBEDDING BACKEND TEST")
+    print("=" * 40)
+    test_tiny_model()
+    test_real_model()
+    print("\n🎉 All checks passed!")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Offline check for manage_index.py: index parameters sized to the row count,
+and the statements build_index() / ensure_vector_index() send, recorded by a
+stand-in connection.
+"""
+from manage_index import build_index, ensure_vector_index, hnsw_params, ivfflat_lists, ivfflat_probes
+
+
+class RecordingConnection:
+    def __init__(self, rows, indexes):
+        self.rows = rows
+        self.indexes = indexes
+        self.statements = []
+        self.autocommit = False
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+
+    def fetchone(self):
+        return (self.rows,)
+
+    def fetchall(self):
+        return list(self.indexes)
+
+    def close(self):
+        pass
+
+
+def test_sizing():
+    assert ivfflat_lists(0) == 1 and ivfflat_lists(50000) == 50 and ivfflat_lists(1000000) == 1000
+    assert ivfflat_lists(4000000) == 2000 and ivfflat_probes(1000) == 32
+    assert hnsw_params(100000) == (16, 64) and hnsw_params(5000000) == (24, 128)
+    print("✅ lists, probes, m and ef_construction follow the row count")
+
+
+def test_build_replaces_old_index():
+    conn = RecordingConnection(250000, [("documents_embedding_idx", "ivfflat")])
+    stats = build_index(conn, "ivfflat", concurrently=True)
+    creates = [sql for sql in conn.statements if sql.startswith("CREATE INDEX")]
+    order = [i for i, sql in enumerate(conn.statements)
+             if sql.startswith(("CREATE INDEX", "DROP INDEX CONCURRENTLY documents_embedding_idx", "ALTER INDEX"))]
+    assert conn.autocommit
+    assert stats["options"] == {"lists": 250}
+    assert creates == ["CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_embedding_ivfflat_new ON documents "
+                       "USING ivfflat (embedding vector_cosine_ops) WITH (lists = 250)"]
+    assert order == sorted(order) and len(order) == 3
+    print("✅ New index is built before the old one is dropped")
+
+
+def test_ensure():
+    existing = RecordingConnection(8, [("ix_documents_embedding_hnsw", "hnsw")])
+    empty = RecordingConnection(8, [])
+    assert ensure_vector_index(existing) is None
+    assert not any(sql.startswith("CREATE") for sql in existing.statements)
+    assert ensure_vector_index(empty) == "ix_documents_embedding_hnsw"
+    assert empty.statements[-1].endswith("WITH (m = 16, ef_construction = 64)")
+    print("✅ ensure_vector_index only creates a missing index")
+
+
+if __name__ == "__main__":
+    print("🧪 VECTOR INDEX MANAGEMENT TEST")
+    print("=" * 40)
+    test_sizing()
+    test_build_replaces_old_index()
+    test_ensure()
+    print("\n🎉 All checks passed!")
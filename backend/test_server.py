@@ -53,13 +53,12 @@ if __name__ == "__main__":
     # Start server in background
     print("Starting FastAPI server...")
     
-    # Activate virtual environment and start server
-    os.chdir("/home/harshit/rag-chatbot-project/backend")
+    # Run from this directory with the current interpreter (and its virtualenv, if any)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
     
     # Start server
     process = subprocess.Popen([
-        "bash", "-c", 
-        "source venv/bin/activate && uvicorn main:app --host 0.0.0.0 --port 8000"
+        sys.executable, "-m", "uvicorn", "main:app", "--host", "0.0.0.0", "--port", "8000"
     ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     
     # Wait for server to start
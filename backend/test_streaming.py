@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Offline check for streamed Gemini answers against fake_inference_server.py:
+tokens arrive as they are generated, and abandoning the stream (what a
+client disconnect does) stops the upstream generation.
+"""
+import asyncio
+import os
+import time
+
+from fake_inference_server import start_fake_server
+
+server, url = start_fake_server(llm_latency_ms=100.0, token_ms=50.0)
+os.environ["GEMINI_API_BASE"] = url
+os.environ.setdefault("GEMINI_API_KEY", "test")
+
+from llm import generate, stream_generate
+
+
+async def check_time_to_first_token():
+    start = time.perf_counter()
+    arrivals = []
+    async for text in stream_generate("What is Navyakosh?"):
+        arrivals.append(time.perf_counter() - start)
+    first, total = arrivals[0], time.perf_counter() - start
+    full = await generate("What is Navyakosh?")
+
+    print(f"   First token {first * 1000:.0f} ms, full answer {total * 1000:.0f} ms ({len(arrivals)} chunks)")
+    # Chunks come 50 ms apart upstream; a buffered response would arrive all at once
+    assert len(arrivals) > 1 and arrivals[-1] - first >= 0.025 * (len(arrivals) - 1)
+    assert full
+    print("✅ Tokens stream as they are generated")
+
+
+async def check_cancel_stops_upstream():
+    with server.stats['lock']:
+        server.stats['llm_completed'] = 0
+
+    async def consume():
+        async for _ in stream_generate("What is Navyakosh?"):
+            pass
+
+    task = asyncio.ensure_future(consume())
+    await asyncio.sleep(0.2)  # First tokens are in flight
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    await asyncio.sleep(1.0)  # Long enough for the fake server to have finished
+
+    assert server.stats['llm_completed'] == 0
+    print("✅ Cancelling the stream stops generation upstream")
+
+
+async def main():
+    await check_time_to_first_token()
+    await check_cancel_stops_upstream()
+
+
+if __name__ == "__main__":
+    print("🧪 STREAMING TEST")
+    print("=" * 40)
+    asyncio.run(main())
+    print("\n🎉 All checks passed!")
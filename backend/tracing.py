@@ -0,0 +1,205 @@
+"""
+Lightweight tracing: per-stage latency histograms and counters, exported as
+Prometheus text (GET /metrics in main.py) or, for the Vercel handlers where
+nothing scrapes a process, as one JSON log line per request (TRACE_LOG=json).
+
+    with span("embed"):
+        ...
+    incr("answer_cache_hits")
+    incr("prompt_tokens", count_tokens(prompt))
+
+A span is a perf_counter() pair, a bisect into fixed log-linear buckets and
+a few adds, well under a few microseconds. Stdlib only, so api/ can use it.
+"""
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+TRACE_LOG = os.getenv("TRACE_LOG", "text")  # text | json
+
+# HDR-style buckets: 4 per power of two from ~1 us to ~67 s, so every
+# bucket is within 19% of its neighbours at any scale
+SUB_BUCKETS = 4
+BOUNDS: List[float] = [2.0 ** (e + s / SUB_BUCKETS) for e in range(-20, 6) for s in range(1, SUB_BUCKETS + 1)]
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count", "_lock")
+
+    def __init__(self):
+        self.counts = [0] * (len(BOUNDS) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        i = bisect_left(BOUNDS, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th percentile (0-100), in seconds"""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return BOUNDS[i] if i < len(BOUNDS) else float("inf")
+        return float("inf")
+
+
+_stages: Dict[str, Histogram] = {}
+_counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+_counters_lock = threading.Lock()
+_request: ContextVar[Optional[Dict[str, float]]] = ContextVar("trace_request", default=None)
+
+
+def observe(stage: str, seconds: float):
+    histogram = _stages.get(stage)
+    if histogram is None:
+        histogram = _stages.setdefault(stage, Histogram())
+    histogram.record(seconds)
+    timings = _request.get()
+    if timings is not None:
+        key = f"{stage}_ms"
+        timings[key] = timings.get(key, 0.0) + seconds * 1000
+
+
+class span:
+    """Time a block into the stage histogram (and the current request's timings)"""
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+def traced(stage: str):
+    """Decorator: span(stage) around every call of a function or coroutine function"""
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def incr(name: str, value: float = 1, **labels: str):
+    key = (name, tuple(sorted(labels.items())) if labels else ())
+    with _counters_lock:
+        _counters[key] = _counters.get(key, 0) + value
+    timings = _request.get()
+    if timings is not None and not labels:
+        timings[name] = timings.get(name, 0) + value
+
+
+class request_trace:
+    """Collect the spans and counters of one request; logs them as one line on exit"""
+
+    def __init__(self, name: str, **fields):
+        self.name = name
+        self.fields = fields
+        self.timings: Dict[str, float] = {}
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self._token = _request.set(self.timings)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _request.reset(self._token)
+        total = time.perf_counter() - self.start
+        observe(self.name, total)
+        if exc_type is not None:
+            self.fields["error"] = exc_type.__name__
+        log_event(self.name, total_ms=round(total * 1000, 1),
+                  **{key: round(value, 1) for key, value in self.timings.items()}, **self.fields)
+        return False
+
+
+def log_event(event: str, **fields):
+    """One log line: JSON (for Vercel's log drains) or readable key=value text"""
+    if TRACE_LOG == "json":
+        line = json.dumps({"ts": round(time.time(), 3), "event": event, **fields}, default=str)
+    else:
+        line = f"{event} " + " ".join(f"{key}={value}" for key, value in fields.items())
+    print(line, file=sys.stdout, flush=True)
+
+
+def _labels(pairs) -> str:
+    return ",".join(f'{key}="{value}"' for key, value in pairs)
+
+
+def _number(value: float) -> str:
+    """Exact sample value: counts are never rounded into exponent form"""
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def render_prometheus(prefix: str = "rag") -> str:
+    """Prometheus text exposition format (version 0.0.4)"""
+    lines = [f"# HELP {prefix}_stage_seconds Latency of each pipeline stage",
+             f"# TYPE {prefix}_stage_seconds histogram"]
+    for stage, histogram in sorted(_stages.items()):
+        with histogram._lock:
+            counts, total, count = list(histogram.counts), histogram.sum, histogram.count
+        cumulative = 0
+        for bound, n in zip(BOUNDS, counts):
+            cumulative += n
+            lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound:.6g}"}} {cumulative}')
+        lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+        lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+        lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {count}')
+
+    with _counters_lock:
+        counters = sorted(_counters.items())
+    seen = set()
+    for (name, labels), value in counters:
+        metric = f"{prefix}_{name}_total"
+        if metric not in seen:
+            seen.add(metric)
+            lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{{{_labels(labels)}}} {_number(value)}" if labels else f"{metric} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def summary() -> Dict[str, Dict[str, float]]:
+    """p50/p95/p99 in ms per stage, for logs and benchmarks"""
+    return {
+        stage: {"count": h.count, "p50": h.percentile(50) * 1000, "p95": h.percentile(95) * 1000,
+                "p99": h.percentile(99) * 1000}
+        for stage, h in sorted(_stages.items())
+    }
+
+
+def reset():
+    _stages.clear()
+    with _counters_lock:
+        _counters.clear()
@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+class VectorStore:
+    """Exact top-k search over a pre-normalized embedding matrix.
+
+    One matmul plus argpartition per cache-sized block of rows. dtype="float16"
+    halves and dtype="int8" (per-row scaled) quarters the memory of the stored
+    matrix; each block is widened to float32 before the matmul, which costs
+    latency, and scores become approximate to ~1e-3 and ~1e-2 respectively.
+    """
+
+    def __init__(self, dim: int = 384, dtype: str = "float32", capacity: int = 1024, block_rows: int = 4096):
+        if dtype not in ("float32", "float16", "int8"):
+            raise ValueError(f"Unsupported VectorStore dtype: {dtype}")
+        self.dim = dim
+        self.dtype = dtype
+        self.block_rows = block_rows
+        self._lock = threading.RLock()
+        self._reset(capacity)
+
+    def _reset(self, capacity: int):
+        self.matrix = np.zeros((capacity, self.dim), dtype=np.dtype(self.dtype))
+        self.scales = np.ones(capacity, dtype=np.float32)  # int8 only: row = matrix * scale
+        self.ids: List[str] = []
+        self.slots: Dict[str, int] = {}
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def nbytes(self) -> int:
+        return self.count * self.dim * self.matrix.itemsize + (self.count * 4 if self.dtype == "int8" else 0)
+
+    def add(self, doc_id: str, vector: Sequence[float]):
+        self.add_batch([doc_id], [vector])
+
+    def add_batch(self, doc_ids: List[str], vectors):
+        encoded, scales = self._encode(_normalize(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)))
+        with self._lock:
+            for doc_id, row, scale in zip(doc_ids, encoded, scales):
+                doc_id = str(doc_id)
+                slot = self.slots.get(doc_id)
+                if slot is None:
+                    slot = self.count
+                    if slot == len(self.matrix):
+                        self._grow()
+                    self.ids.append(doc_id)
+                    self.slots[doc_id] = slot
+                    self.count += 1
+                self.matrix[slot] = row
+                self.scales[slot] = scale
+
+    def remove(self, doc_id: str):
+        """Swap the last row into the removed slot so the matrix stays dense"""
+        with self._lock:
+            slot = self.slots.pop(str(doc_id), None)
+            if slot is None:
+                return
+            last = self.count - 1
+            if slot != last:
+                self.matrix[slot] = self.matrix[last]
+                self.scales[slot] = self.scales[last]
+                self.ids[slot] = self.ids[last]
+                self.slots[self.ids[slot]] = slot
+            self.ids.pop()
+            self.count -= 1
+
+    def clear(self):
+        with self._lock:
+            self._reset(1024)
+
+    def search(self, query: Sequence[float], k: int = 5) -> List[Tuple[str, float]]:
+        return self.search_batch([query], k)[0]
+
+    def search_batch(self, queries, k: int = 5) -> List[List[Tuple[str, float]]]:
+        """Exact top-k for several queries with one pass over the matrix"""
+        q = _normalize(np.asarray(queries, dtype=np.float32).reshape(-1, self.dim))
+        with self._lock:
+            n = self.count
+            if n == 0:
+                return [[] for _ in range(len(q))]
+            k = min(k, n)
+            best_scores = np.full((len(q), 0), -np.inf, dtype=np.float32)
+            best_slots = np.zeros((len(q), 0), dtype=np.int64)
+
+            for start in range(0, n, self.block_rows):
+                end = min(start + self.block_rows, n)
+                scores = q @ self.matrix[start:end].astype(np.float32, copy=False).T
+                if self.dtype == "int8":
+                    scores *= self.scales[start:end]
+                kk = min(k, scores.shape[1])
+                top = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+                best_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+                best_slots = np.concatenate([best_slots, top + start], axis=1)
+                if best_scores.shape[1] > k:
+                    keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                    best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                    best_slots = np.take_along_axis(best_slots, keep, axis=1)
+
+            order = np.argsort(-best_scores, axis=1)
+            best_scores = np.take_along_axis(best_scores, order, axis=1)
+            best_slots = np.take_along_axis(best_slots, order, axis=1)
+            return [
+                [(self.ids[slot], float(score)) for slot, score in zip(slots, scores)]
+                for slots, scores in zip(best_slots.tolist(), best_scores.tolist())
+            ]
+
+    def _encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if self.dtype == "int8":
+            scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+            return np.rint(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+        return vectors.astype(self.dtype), np.ones(len(vectors), dtype=np.float32)
+
+    def _grow(self):
+        capacity = max(2 * len(self.matrix), 1024)
+        grown = np.zeros((capacity, self.dim), dtype=self.matrix.dtype)
+        grown[:self.count] = self.matrix[:self.count]
+        scales = np.ones(capacity, dtype=np.float32)
+        scales[:self.count] = self.scales[:self.count]
+        self.matrix, self.scales = grown, scales
+
+    def save(self, path: str, fingerprint: str = ""):
+        """Write the matrix as .npy so load() can memory-map it"""
+        with self._lock:
+            os.makedirs(path, exist_ok=True)
+            np.save(os.path.join(path, "matrix.npy"), self.matrix[:self.count])
+            np.save(os.path.join(path, "scales.npy"), self.scales[:self.count])
+            np.save(os.path.join(path, "ids.npy"), np.array(self.ids, dtype=str))
+            with open(os.path.join(path, "meta.json"), "w") as f:
+                json.dump({"dim": self.dim, "dtype": self.dtype, "fingerprint": fingerprint}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "VectorStore":
+        """Memory-map a saved store; pages are copied only if the store is modified"""
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        store = cls(meta["dim"], meta["dtype"], capacity=0)
+        store.matrix = np.load(os.path.join(path, "matrix.npy"), mmap_mode="c")
+        store.scales = np.load(os.path.join(path, "scales.npy"))
+        store.ids = np.load(os.path.join(path, "ids.npy")).tolist()
+        store.slots = {doc_id: i for i, doc_id in enumerate(store.ids)}
+        store.count = len(store.ids)
+        return store
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
@@ -1,22 +1,40 @@
 import os
+import sys
+import argparse
 import json
-import requests
+import hashlib
 import psycopg2
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
+from psycopg2.extras import execute_values
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from answer_cache import bump_corpus_version
+from embedding_cache import cache_from_env
+from manage_index import ensure_vector_index
+import http_client
 
 # Database connection
 NEON_URL = os.getenv("NEON_DATABASE_URL")
 HF_TOKEN = os.getenv("HUGGINGFACE_API_TOKEN")
+EMBEDDING_MODEL = "BAAI/bge-small-en-v1.5"
+
+# Re-running the ingest over an unchanged corpus is served from this cache
+embedding_cache = cache_from_env()
 
 def get_embedding(text: str) -> List[float]:
     """Generate embedding using BAAI/bge-small-en-v1.5 model"""
+    if embedding_cache is not None:
+        cached = embedding_cache.get(EMBEDDING_MODEL, text)
+        if cached is not None:
+            return cached
+
     headers = {
         "Authorization": f"Bearer {HF_TOKEN}",
         "Content-Type": "application/json"
     }
     
     try:
-        response = requests.post(
+        response = http_client.post(
             "https://api-inference.huggingface.co/models/BAAI/bge-small-en-v1.5",
             headers=headers,
             json={"inputs": text},
@@ -26,7 +44,10 @@ def get_embedding(text: str) -> List[float]:
         if response.status_code == 200:
             result = response.json()
             embedding = result[0] if isinstance(result[0], list) else result
-            return embedding[:384]  # Ensure 384 dimensions
+            embedding = embedding[:384]  # Ensure 384 dimensions
+            if embedding_cache is not None:
+                embedding_cache.put_many(EMBEDDING_MODEL, [text], [embedding])
+            return embedding
         else:
             print(f"❌ Embedding API error: {response.status_code}")
             print(f"Response: {response.text}")
@@ -36,6 +57,32 @@ def get_embedding(text: str) -> List[float]:
         print(f"❌ Embedding error: {e}")
         return None
 
+def get_embeddings(texts: List[str]) -> List[List[float]]:
+    """Embed a batch of texts with one API request; repeats come from the cache"""
+    if embedding_cache is not None:
+        embeddings = embedding_cache.get_many(EMBEDDING_MODEL, texts)
+    else:
+        embeddings = [None] * len(texts)
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if not missing:
+        return embeddings
+
+    response = http_client.post(
+        "https://api-inference.huggingface.co/models/BAAI/bge-small-en-v1.5",
+        headers={"Authorization": f"Bearer {HF_TOKEN}", "Content-Type": "application/json"},
+        json={"inputs": [texts[i] for i in missing]},
+        timeout=60
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"Embedding API error {response.status_code}: {response.text}")
+
+    computed = [(item[0] if isinstance(item[0], list) else item)[:384] for item in response.json()]
+    if embedding_cache is not None:
+        embedding_cache.put_many(EMBEDDING_MODEL, [texts[i] for i in missing], computed)
+    for i, embedding in zip(missing, computed):
+        embeddings[i] = embedding
+    return embeddings
+
 def setup_database():
     """Create database table if not exists"""
     try:
@@ -54,8 +101,10 @@ def setup_database():
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
             
-            CREATE INDEX IF NOT EXISTS idx_documents_embedding 
-            ON documents USING ivfflat (embedding vector_cosine_ops);
+            -- Incremental sync: stable key per source document plus a hash of what was embedded
+            ALTER TABLE documents ADD COLUMN IF NOT EXISTS source_key TEXT;
+            ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash TEXT;
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_source_key ON documents (source_key);
         """)
         
         conn.commit()
@@ -77,6 +126,7 @@ def clear_existing_data():
         
         cursor.close()
         conn.close()
+        bump_corpus_version()
         print("✅ Existing data cleared")
         
     except Exception as e:
@@ -109,55 +159,155 @@ def add_document(content: str, metadata: Dict[str, Any] = None):
         conn.commit()
         cursor.close()
         conn.close()
+        bump_corpus_version()
         
         print(f"✅ Added: {content[:50]}...")
         
     except Exception as e:
         print(f"❌ Error adding document: {e}")
 
-def ingest_navyakosh_data():
-    """Ingest Navyakosh fertilizer data"""
+def content_hash(doc: Dict[str, Any]) -> str:
+    """Hash of everything stored for a document, so metadata edits are picked up too"""
+    payload = json.dumps({"content": doc["content"], "metadata": doc.get("metadata") or {}}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def diff_documents(docs: List[Dict[str, Any]], existing: Dict[str, str]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Split the source set into (new or changed documents, keys to delete) given {source_key: content_hash}"""
+    keys = set()
+    changed = []
+    for doc in docs:
+        if doc["key"] in keys:
+            raise ValueError(f"Duplicate document key: {doc['key']}")
+        keys.add(doc["key"])
+        if existing.get(doc["key"]) != content_hash(doc):
+            changed.append(doc)
+    removed = [key for key in existing if key not in keys]
+    return changed, removed
+
+def sync_documents(conn, docs: List[Dict[str, Any]], embed=None, batch_size: int = 64,
+                   purge_legacy: bool = False) -> Dict[str, int]:
+    """Make the documents table match `docs` in one transaction: embed and upsert
+    only new or changed rows, delete rows whose key left the source set.
+    
+    Rows without a source_key (api/ingest.py, /documents, /documents/bulk)
+    aren't owned by the sync and are left alone unless purge_legacy is set.
+    """
+    embed = embed or get_embeddings
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT source_key, content_hash FROM documents WHERE source_key IS NOT NULL")
+        existing = dict(cursor.fetchall())
+        changed, removed = diff_documents(docs, existing)
+        
+        # One-off cleanup of the copies written by clear-and-reload runs of this
+        # script from before keys existed; the keyed rows replace them
+        legacy = 0
+        if purge_legacy:
+            cursor.execute("DELETE FROM documents WHERE source_key IS NULL")
+            legacy = cursor.rowcount
+        
+        for start in range(0, len(changed), batch_size):
+            batch = changed[start:start + batch_size]
+            embeddings = embed([doc["content"] for doc in batch])
+            execute_values(cursor, """
+                INSERT INTO documents (source_key, content_hash, content, embedding, doc_metadata)
+                VALUES %s
+                ON CONFLICT (source_key) DO UPDATE SET
+                    content_hash = EXCLUDED.content_hash,
+                    content = EXCLUDED.content,
+                    embedding = EXCLUDED.embedding,
+                    doc_metadata = EXCLUDED.doc_metadata
+            """, [
+                (doc["key"], content_hash(doc), doc["content"],
+                 "[" + ",".join(map(str, embedding)) + "]", json.dumps(doc.get("metadata") or {}))
+                for doc, embedding in zip(batch, embeddings)
+            ], template="(%s, %s, %s, %s::vector, %s)")
+        
+        if removed:
+            cursor.execute("DELETE FROM documents WHERE source_key = ANY(%s)", (removed,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    if changed or removed or legacy:
+        bump_corpus_version()  # Cached answers were built from the old rows
+    
+    return {
+        "added": sum(1 for doc in changed if doc["key"] not in existing),
+        "updated": sum(1 for doc in changed if doc["key"] in existing),
+        "deleted": len(removed) + legacy,
+        "unchanged": len(docs) - len(changed),
+    }
+
+def ingest_navyakosh_data(purge_legacy: bool = False):
+    """Sync the Navyakosh fertilizer data into the database"""
     
     navyakosh_docs = [
         {
+            "key": "navyakosh/fertilizer_info",
             "content": "Navyakosh is a specialized organic fertilizer designed specifically for sugarcane cultivation. It provides essential nutrients and improves soil health through natural organic matter.",
             "metadata": {"category": "fertilizer_info", "crop": "sugarcane", "type": "organic"}
         },
         {
+            "key": "navyakosh/application_rate",
             "content": "Navyakosh fertilizer application rate: Apply 25-30 kg per acre during planting season. For established sugarcane fields, apply 20-25 kg per acre before irrigation.",
             "metadata": {"category": "application_rate", "crop": "sugarcane", "season": "planting"}
         },
         {
+            "key": "navyakosh/composition",
             "content": "Navyakosh contains balanced NPK nutrients along with essential micronutrients. The organic composition helps improve soil structure and water retention capacity.",
             "metadata": {"category": "composition", "nutrients": "NPK", "benefits": "soil_health"}
         },
         {
+            "key": "navyakosh/timing",
             "content": "Best time to apply Navyakosh fertilizer for sugarcane: Apply during land preparation 15-20 days before planting. Second application can be done 45-60 days after planting.",
             "metadata": {"category": "timing", "crop": "sugarcane", "application_schedule": "multiple"}
         },
         {
+            "key": "navyakosh/benefits",
             "content": "Navyakosh fertilizer benefits for sugarcane: Increases cane yield by 15-20%, improves sugar content, enhances root development, and reduces chemical fertilizer dependency.",
             "metadata": {"category": "benefits", "crop": "sugarcane", "yield_increase": "15-20%"}
         },
         {
+            "key": "navyakosh/application_method",
             "content": "Mix Navyakosh fertilizer with soil or compost before application. Ensure proper moisture in soil during application. Do not apply during heavy rainfall periods.",
             "metadata": {"category": "application_method", "precautions": "moisture_rainfall"}
         },
         {
+            "key": "navyakosh/compatibility",
             "content": "Navyakosh is compatible with other organic fertilizers and bio-fertilizers. Can be used alongside vermicompost, neem cake, and beneficial microorganisms.",
             "metadata": {"category": "compatibility", "type": "organic_mix"}
         },
         {
+            "key": "navyakosh/storage",
             "content": "Storage instructions for Navyakosh: Store in cool, dry place away from direct sunlight. Use within 2 years of manufacture date for best results.",
             "metadata": {"category": "storage", "shelf_life": "2_years"}
         }
     ]
     
-    print(f"📊 Starting ingestion of {len(navyakosh_docs)} Navyakosh documents...")
+    print(f"📊 Syncing {len(navyakosh_docs)} Navyakosh documents...")
     
-    for i, doc in enumerate(navyakosh_docs, 1):
-        print(f"\n📝 Processing document {i}/{len(navyakosh_docs)}")
-        add_document(doc["content"], doc["metadata"])
+    # Only new or changed documents are embedded; the table stays queryable
+    # throughout because everything lands in a single transaction
+    try:
+        conn = psycopg2.connect(NEON_URL)
+        try:
+            stats = sync_documents(conn, navyakosh_docs, purge_legacy=purge_legacy)
+            # Built once the rows exist, so it is sized to them
+            if ensure_vector_index(conn):
+                conn.commit()
+        finally:
+            conn.close()
+        print(f"✅ {stats['added']} added, {stats['updated']} updated, "
+              f"{stats['deleted']} deleted, {stats['unchanged']} unchanged")
+    except Exception as e:
+        print(f"❌ Sync error: {e}")
+
+    if embedding_cache is not None:
+        stats = embedding_cache.stats()
+        print(f"\n💾 Embedding cache: {stats['hits']} hits, {stats['misses']} misses")
 
 def test_search():
     """Test the search functionality"""
@@ -203,19 +353,21 @@ def test_search():
         print(f"❌ Search test error: {e}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync the Navyakosh documents into Postgres")
+    parser.add_argument("--purge-legacy", action="store_true",
+                        help="Also delete every row without a source_key (one-time cleanup after "
+                             "clear-and-reload runs; removes documents added through the API too)")
+    args = parser.parse_args()
+    
     print("🚀 NAVYAKOSH DATA INGESTION - BAAI/bge-small-en-v1.5")
     print("=" * 60)
     
     # Setup database
     setup_database()
     
-    # Clear existing data
-    print("\n🗑️ Clearing existing data...")
-    clear_existing_data()
-    
-    # Ingest new data
-    print("\n📥 Ingesting Navyakosh data...")
-    ingest_navyakosh_data()
+    # Sync data: unchanged documents are left alone
+    print("\n📥 Syncing Navyakosh data...")
+    ingest_navyakosh_data(purge_legacy=args.purge_legacy)
     
     # Test search
     print("\n🧪 Testing search functionality...")
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Test the api/chat.py retrieval pipeline against a stub database and a slow
+stub embedder: the connection checkout and full-text search overlap the
+embedding call, and full-text hits are merged in. No network or database
+needed.
+"""
+import json
+import os
+import tempfile
+import time
+from array import array
+
+import api._db as db
+import api.chat as chat
+from api._db import ConnectionPool
+
+chat.use_backend()
+from embedding_cache import EmbeddingSnapshot, cache_key, write_snapshot
+
+EMBED_S = 0.15
+CONNECT_S = 0.1
+LEXICAL_S = 0.05
+VECTOR_S = 0.02
+
+QUERY_EMBEDDING = [1.0, 0.0, 0.0]
+VECTOR_ROWS = [
+    {'id': 1, 'content': 'Apply 25-30 kg per acre during planting.', 'doc_metadata': {'product_name': 'Navyakosh'},
+     'similarity': 0.82},
+]
+LEXICAL_ROWS = [
+    {'id': 1, 'content': VECTOR_ROWS[0]['content'], 'doc_metadata': {}, 'embedding': '[1,0,0]'},
+    {'id': 7, 'content': 'For ratoon crops, apply 20-25 kg per acre after each harvest.',
+     'doc_metadata': {'product_name': 'Navyakosh'}, 'embedding': '[0.6,0.8,0]'},
+]
+
+
+class StubCursor:
+    lexical_params = None
+
+    def __init__(self):
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        if 'to_tsquery' in sql:
+            StubCursor.lexical_params = params
+            time.sleep(LEXICAL_S)
+            self.rows = LEXICAL_ROWS
+        elif '<=>' in sql:
+            time.sleep(VECTOR_S)
+            self.rows = VECTOR_ROWS
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class StubConnection:
+    closed = 0
+
+    def cursor(self, cursor_factory=None):
+        return StubCursor()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+def slow_connect(dsn, **kwargs):
+    time.sleep(CONNECT_S)
+    return StubConnection()
+
+
+class StubHandler(chat.handler):
+    def __init__(self):
+        self.embed_calls = 0  # BaseHTTPRequestHandler.__init__ would serve a socket
+
+    def get_embedding(self, text):
+        self.embed_calls += 1
+        time.sleep(EMBED_S)
+        return QUERY_EMBEDDING
+
+
+def test_overlap():
+    db._pool = ConnectionPool('stub', connect=slow_connect)
+    chat.answer_cache = None
+    timings = {}
+    start = time.perf_counter()
+    cached, docs = StubHandler().retrieve('How much Navyakosh for ratoon crops?', {}, timings)
+    elapsed = (time.perf_counter() - start) * 1000
+    serial = (EMBED_S + CONNECT_S + LEXICAL_S + VECTOR_S) * 1000
+    print(f"   stages (ms): {json.dumps(timings)}")
+    assert cached is None and {'embed', 'db_connect', 'lexical_search', 'vector_search'} <= set(timings)
+    assert elapsed < serial - 0.8 * CONNECT_S * 1000
+    print(f"✅ Retrieval took {elapsed:.0f} ms vs {serial:.0f} ms run serially")
+
+
+def test_lexical_merge():
+    db._pool = ConnectionPool('stub', connect=slow_connect)
+    chat.answer_cache = None
+    _, docs = StubHandler().retrieve('Ratoon crops? (25-30 kg)', {}, {})
+    assert [doc['id'] for doc in docs] == [1, 7] and abs(docs[1]['similarity'] - 0.6) < 1e-9
+    assert StubCursor.lexical_params[0] == 'ratoon or crops or 25 or 30 or kg'
+    print("✅ Full-text hit missed by the vector index is merged with its cosine similarity")
+
+
+def test_cache_hit():
+    chat.answer_cache = chat.AnswerCache()
+    response = {'response': 'Apply 20-25 kg per acre.', 'sources': 2, 'model': 'BAAI/bge-small-en-v1.5'}
+    chat.answer_cache.put('How much for ratoon?', {}, response)
+    handler = StubHandler()
+    timings = {}
+    cached, _ = handler.retrieve('how much for RATOON', {}, timings)
+    miss, _ = handler.retrieve('how much for ratoon', {'crop': 'wheat'}, {})
+    assert cached == response and handler.embed_calls == 1 and miss is None and 'embed' not in timings
+    print("✅ Cached answers skip embedding and search; filters are part of the key")
+
+
+def test_embedding_snapshot():
+    path = os.path.join(tempfile.mkdtemp(), 'snapshot.bin')
+    vector = [0.5] * 384
+    write_snapshot(path, chat.EMBEDDING_MODEL,
+                   {cache_key(chat.EMBEDDING_MODEL, 'What is Navyakosh?')[1]: array('f', vector).tobytes()})
+    chat._embedding_snapshot = EmbeddingSnapshot(path)
+    calls = []
+    post, chat.http_client.post = chat.http_client.post, lambda *args, **kwargs: calls.append(args)
+    try:
+        hit = chat.handler.get_embedding(StubHandler(), 'what is  NAVYAKOSH?')
+        miss = chat.handler.get_embedding(StubHandler(), 'Something else')
+    finally:
+        chat.http_client.post = post
+        chat._embedding_snapshot = None
+    assert hit == vector and miss is None and len(calls) == 1
+    print("✅ Queries in the shipped embedding snapshot skip the embedding API")
+
+
+def test_bad_embedding_snapshot():
+    directory = tempfile.mkdtemp()
+    good = os.path.join(directory, 'good.bin')
+    write_snapshot(good, chat.EMBEDDING_MODEL, {cache_key(chat.EMBEDDING_MODEL, f'query {i}')[1]: array('f', [0.5] * 384).tobytes()
+                                                for i in range(3)})
+    with open(good, 'rb') as f:
+        data = f.read()
+    bad = {
+        'empty': b'',
+        'short header': data[:10],
+        'cut in the keys': data[:60],
+        'cut in the vectors': data[:-1],
+        'not a snapshot': b'x' * len(data),
+        'count past the end': data[:12] + (4).to_bytes(4, 'little') + data[16:],
+    }
+    path = chat.EMBEDDING_SNAPSHOT_PATH
+    try:
+        for name, content in bad.items():
+            chat.EMBEDDING_SNAPSHOT_PATH = os.path.join(directory, 'bad.bin')
+            with open(chat.EMBEDDING_SNAPSHOT_PATH, 'wb') as f:
+                f.write(content)
+            chat._embedding_snapshot = None
+            assert chat.get_embedding_snapshot() is False, name
+        chat.EMBEDDING_SNAPSHOT_PATH, chat._embedding_snapshot = good, None
+        assert len(chat.get_embedding_snapshot()) == 3
+    finally:
+        chat.EMBEDDING_SNAPSHOT_PATH, chat._embedding_snapshot = path, None
+    print("✅ Truncated or corrupt snapshot files are treated as no snapshot")
+
+
+if __name__ == "__main__":
+    print("🧪 CHAT PIPELINE TEST")
+    print("=" * 40)
+    test_overlap()
+    test_lexical_merge()
+    test_cache_hit()
+    test_embedding_snapshot()
+    test_bad_embedding_snapshot()
+    print("\n🎉 All checks passed!")
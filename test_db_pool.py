@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test the api/ connection pool against a stub driver that counts connects.
+No database needed.
+"""
+import threading
+import time
+
+import psycopg2
+
+from api._db import ConnectionPool
+
+
+class StubConnection:
+    """Just enough of a psycopg2 connection for the pool"""
+
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, params=None):
+        if self.broken:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+    def fetchone(self):
+        return (1,)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+class StubDriver:
+    def __init__(self):
+        self.connects = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, dsn, **kwargs):
+        with self.lock:
+            self.connects += 1
+        return StubConnection()
+
+
+def test_reuse():
+    """Many sequential checkouts share one connection"""
+    driver = StubDriver()
+    pool = ConnectionPool("stub", connect=driver)
+    for _ in range(100):
+        with pool.connection() as conn:
+            conn.cursor().execute("SELECT 1")
+    assert driver.connects == 1
+    print(f"✅ 100 checkouts opened {driver.connects} connection(s)")
+
+
+def test_cap():
+    """Concurrent handlers never open more than max_size connections"""
+    driver = StubDriver()
+    pool = ConnectionPool("stub", max_size=3, connect=driver)
+    in_use, peak = [0], [0]
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(20):
+            with pool.connection():
+                with lock:
+                    in_use[0] += 1
+                    peak[0] = max(peak[0], in_use[0])
+                time.sleep(0.001)
+                with lock:
+                    in_use[0] -= 1
+
+    threads = [threading.Thread(target=worker) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert driver.connects <= 3 and peak[0] <= 3
+    print(f"✅ 10 threads x 20 checkouts: {driver.connects} connects, peak {peak[0]} in use (cap 3)")
+
+
+def test_exhausted():
+    """A checkout waits at most `timeout` when every connection is busy"""
+    pool = ConnectionPool("stub", max_size=1, timeout=0.05, connect=StubDriver())
+    conn = pool.getconn()
+    try:
+        pool.getconn()
+    except psycopg2.OperationalError:
+        pass
+    else:
+        raise AssertionError("getconn() opened a connection past maxconn")
+    finally:
+        pool.putconn(conn)
+    print("✅ Exhausted pool raises instead of opening extra connections")
+
+
+def test_replaces_dead_connections():
+    """Closed, broken and stale connections are swapped for fresh ones"""
+    driver = StubDriver()
+    pool = ConnectionPool("stub", check_after=0.0, connect=driver)
+
+    with pool.connection() as conn:
+        first = conn
+    first.closed = 1
+    with pool.connection() as conn:
+        second = conn
+
+    # Dropped by the server while idle: only the ping notices
+    second.broken = True
+    with pool.connection() as conn:
+        third = conn
+
+    # Error mid-transaction discards the connection
+    try:
+        with pool.connection() as conn:
+            conn.broken = True
+            conn.cursor().execute("SELECT 1")
+    except psycopg2.OperationalError:
+        pass
+    with pool.connection() as conn:
+        fourth = conn
+
+    assert (len({id(first), id(second), id(third), id(fourth)}) == 4
+            and driver.connects == 4 and pool._open == 1)
+    print(f"✅ Dead connections replaced: {driver.connects} connects, {pool._open} open")
+
+
+if __name__ == "__main__":
+    print("🧪 DB CONNECTION POOL TEST")
+    print("=" * 40)
+    test_reuse()
+    test_cap()
+    test_exhausted()
+    test_replaces_dead_connections()
+    print("\n🎉 All checks passed!")
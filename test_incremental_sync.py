@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Test the incremental sync in ingest_data.py against an in-memory stand-in
+for the documents table. No database or embedding API needed.
+"""
+import os
+import time
+
+os.environ["EMBEDDING_CACHE"] = "0"
+
+from ingest_data import content_hash, sync_documents
+from answer_cache import AnswerCache
+
+
+class FakeTable:
+    """Just enough of a psycopg2 connection/cursor to run sync_documents"""
+
+    encoding = "UTF8"
+
+    def __init__(self):
+        self.rows = {None: [{"content": "legacy row"}]}  # source_key -> row
+        self.commits = 0
+        self.writes = 0
+        self._pending = []
+        self._result = []
+        self.rowcount = 0
+        self.connection = self
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=None):
+        sql = sql.decode() if isinstance(sql, bytes) else sql
+        if sql.startswith("SELECT source_key"):
+            self._result = [(key, row["hash"]) for key, row in self.rows.items() if key is not None]
+        elif "source_key IS NULL" in sql:
+            self.writes += 1
+            self.rowcount = len(self.rows.pop(None, []))
+        elif sql.startswith("DELETE"):
+            self.writes += 1
+            for key in params[0]:
+                self.rows.pop(key, None)
+        else:
+            self.writes += 1
+            for key, digest, content, _, _ in self._pending:
+                self.rows[key] = {"hash": digest, "content": content}
+            self._pending = []
+
+    def mogrify(self, template, args):
+        self._pending.append(args)
+        return b"(...)"
+
+    def fetchall(self):
+        return self._result
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.texts = 0
+
+    def __call__(self, texts):
+        self.texts += len(texts)
+        return [[0.1] * 384 for _ in texts]
+
+
+DOCS = [{"key": f"doc/{i}", "content": f"Document {i}", "metadata": {"i": i}} for i in range(20)]
+
+
+def _synced():
+    table = FakeTable()
+    sync_documents(table, DOCS, CountingEmbedder())
+    return table
+
+
+def test_first_sync():
+    table, embed = FakeTable(), CountingEmbedder()
+    stats = sync_documents(table, DOCS, embed)
+    assert stats == {"added": 20, "updated": 0, "deleted": 0, "unchanged": 0}
+    assert embed.texts == 20 and table.commits == 1 and table.rows[None] == [{"content": "legacy row"}]
+    print(f"✅ First sync embeds everything and keeps rows without a source_key: {stats}")
+
+
+def test_purge_legacy():
+    table = FakeTable()
+    stats = sync_documents(table, DOCS, CountingEmbedder(), purge_legacy=True)
+    assert stats["deleted"] == 1 and None not in table.rows and len(table.rows) == 20
+    print(f"✅ purge_legacy deletes the unkeyed rows: {stats}")
+
+
+def test_unchanged_resync():
+    table, embed = _synced(), CountingEmbedder()
+    writes = table.writes
+    start = time.perf_counter()
+    stats = sync_documents(table, DOCS, embed)
+    elapsed = (time.perf_counter() - start) * 1000
+    assert stats["unchanged"] == 20 and embed.texts == 0 and table.writes == writes
+    print(f"✅ Unchanged re-run: no embeddings, no writes ({elapsed:.1f} ms)")
+
+
+def test_incremental_changes():
+    table = _synced()
+    docs = [dict(doc) for doc in DOCS[1:]]  # doc/0 removed
+    docs[0]["content"] = "Document 1, revised"  # content changed
+    docs[1]["metadata"] = {"i": 2, "crop": "wheat"}  # metadata changed
+    docs.append({"key": "doc/new", "content": "A new document", "metadata": {}})
+    embed = CountingEmbedder()
+    stats = sync_documents(table, docs, embed)
+    assert stats == {"added": 1, "updated": 2, "deleted": 1, "unchanged": 17}
+    assert embed.texts == 3
+    assert "doc/0" not in table.rows and None in table.rows
+    assert table.rows["doc/1"]["content"] == "Document 1, revised"
+    assert all(table.rows[doc["key"]]["hash"] == content_hash(doc) for doc in docs)
+    print(f"✅ Only new/changed rows are re-embedded, removed keys deleted: {stats}")
+
+
+def test_sync_invalidates_answers():
+    """A sync that writes rows makes cached answers miss; one that doesn't keeps them"""
+    table, cache = FakeTable(), AnswerCache(max_entries=10)
+    sync_documents(table, DOCS, CountingEmbedder())
+    cache.put("What is document 1?", None, "Document 1")
+    sync_documents(table, DOCS, CountingEmbedder())
+    kept = cache.get("What is document 1?") is not None
+    sync_documents(table, DOCS[1:], CountingEmbedder())
+    assert kept and cache.get("What is document 1?") is None
+    print("✅ Cached answers survive a no-op sync and miss after a changing one")
+
+
+if __name__ == "__main__":
+    print("🧪 INCREMENTAL SYNC TEST")
+    print("=" * 40)
+    test_first_sync()
+    test_unchanged_resync()
+    test_incremental_changes()
+    test_purge_legacy()
+    test_sync_invalidates_answers()
+    print("\n🎉 All checks passed!")
@@ -4,9 +4,10 @@ Test script for the cleaned RAG system
 """
 import sys
 import os
-sys.path.append(os.path.join(os.path.dirname(__file__), 'api'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from ingest import get_embedding, setup_database, ingest_navyakosh_data
+# Through the api package: a bare "ingest" can resolve to backend/ingest.py
+from api.ingest import get_embedding, setup_database, ingest_navyakosh_data
 import requests
 
 def test_embedding():